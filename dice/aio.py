@@ -0,0 +1,156 @@
+"""
+Asyncio execution core.
+
+An event loop runs in a daemon thread, commands are sent with redis.asyncio
+connections on it: commands to the same node are pipelined, and different
+nodes are queried at the same time, the caller only waits for the slowest
+node instead of all of them one by one.
+"""
+
+import asyncio
+import logging
+import threading
+
+from redis.exceptions import ResponseError
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncCore:
+    def __init__(self, connection_factory):
+        """
+        :param connection_factory: ``connection_factory(node)`` returns a
+            redis.asyncio connection, ``node`` is ``(host, port)`` of a cluster
+            node, or None for the server the client connected to.
+        """
+        self.connection_factory = connection_factory
+        self.connections = {}
+        self.locks = {}
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(
+            target=self.loop.run_forever, name="dice-async-core", daemon=True
+        )
+        self.thread.start()
+
+    def run(self, coroutine):
+        """Run ``coroutine`` on the event loop, block until it is done."""
+        future = asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+        try:
+            return future.result()
+        except KeyboardInterrupt:
+            future.cancel()
+            raise
+
+    def submit(self, coroutine):
+        """
+        Schedule ``coroutine`` on the event loop without waiting for it,
+        return a ``concurrent.futures.Future``.
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def get_connection(self, node):
+        connection = self.connections.get(node)
+        if connection is None:
+            connection = self.connections[node] = self.connection_factory(node)
+            self.locks[node] = asyncio.Lock()
+        return connection
+
+    async def execute_on_node(self, node, commands):
+        """
+        Send ``commands`` to ``node`` in one pipeline, return their responses,
+        error responses are returned instead of raised.
+        """
+        connection = self.get_connection(node)
+        # one connection can only have one pipeline in flight
+        async with self.locks[node]:
+            try:
+                await connection.send_packed_command(
+                    connection.pack_commands(commands), check_health=False
+                )
+                responses = []
+                for _ in commands:
+                    try:
+                        responses.append(await connection.read_response())
+                    except ResponseError as e:
+                        responses.append(e)
+            except BaseException:
+                # responses left unread (or cancelled), can't reuse it
+                await connection.disconnect()
+                raise
+        return responses
+
+    async def execute_many(self, commands_by_node):
+        """
+        :param commands_by_node: ``{node: [command args, ...]}``
+        :return: ``{node: [response, ...]}``
+        """
+        nodes = list(commands_by_node)
+        logger.debug(f"[AsyncCore] execute on {len(nodes)} nodes.")
+        responses = await asyncio.gather(
+            *(self.execute_on_node(node, commands_by_node[node]) for node in nodes)
+        )
+        return dict(zip(nodes, responses))
+
+    def scan_nodes(self, nodes, scan_args):
+        """
+        SCAN all ``nodes`` at the same time, one connection for each node,
+        yield (node, keys) of every SCAN call in the order they arrive. It is
+        a generator for the caller's thread, at most two batches of each node
+        are waiting to be consumed.
+
+        :param scan_args: ``scan_args(cursor)`` returns the SCAN command args.
+        """
+        queue = self.run(self._create_queue(2 * len(nodes)))
+
+        async def scan(node):
+            cursor = 0
+            while True:
+                (response,) = await self.execute_on_node(node, [scan_args(cursor)])
+                if isinstance(response, ResponseError):
+                    raise response
+                cursor, keys = response
+                await queue.put((node, keys))
+                if int(cursor) == 0:
+                    return
+
+        async def scan_all():
+            try:
+                await asyncio.gather(*(scan(node) for node in nodes))
+            except Exception as e:
+                await queue.put(e)
+            else:
+                await queue.put(None)
+
+        task = self.submit(scan_all())
+        try:
+            while True:
+                item = self.run(queue.get())
+                if item is None:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            task.cancel()
+
+    async def _create_queue(self, maxsize):
+        # created in the loop's thread
+        return asyncio.Queue(maxsize)
+
+    async def _disconnect(self):
+        for connection in self.connections.values():
+            await connection.disconnect()
+        self.connections.clear()
+        self.locks.clear()
+
+    def reset(self):
+        """
+        Disconnect all connections, they will be created again on next use,
+        eg. when the client's db or password changed.
+        """
+        self.run(self._disconnect())
+
+    def close(self):
+        self.reset()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
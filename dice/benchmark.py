@@ -0,0 +1,245 @@
+"""
+dice-benchmark, a load generator like redis-benchmark built on dice's client.
+
+Clients are spread over worker processes to get past the GIL, clients of one
+process run on an asyncio loop, each with its own connection created by
+``Client.create_connection``: TLS, unix socket and DSN aliases work the same
+as in dice. Latencies of all processes are merged into one histogram.
+"""
+
+import os
+import sys
+import time
+import random
+import asyncio
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+import click
+from redis.exceptions import ResponseError
+
+from .config import config, load_config_files
+from .entry import create_client, setup_log
+from .latency import LatencyHistogram, ms
+
+logger = logging.getLogger(__name__)
+
+# every workload returns the commands of one request for a random key
+WORKLOADS = {
+    "get": lambda key, value: [("GET", f"key:{key}")],
+    "set": lambda key, value: [("SET", f"key:{key}", value)],
+    "incr": lambda key, value: [("INCR", f"counter:{key}")],
+    "lpush": lambda key, value: [("LPUSH", f"list:{key}", value)],
+    "zadd": lambda key, value: [("ZADD", f"zset:{key}", key, value)],
+    # register a query watch and remove it
+    "q.watch": lambda key, value: [
+        ("Q.WATCH", f"SELECT $key, $value WHERE $key like 'key:{key}'"),
+        ("Q.UNWATCH", f"SELECT $key, $value WHERE $key like 'key:{key}'"),
+    ],
+}
+REPORT_PERCENTILES = [50, 95, 99, 99.9]
+
+
+class BenchmarkResult:
+    def __init__(self):
+        self.histogram = LatencyHistogram()
+        self.errors = 0
+        # seconds the clients ran, without starting worker processes
+        self.elapsed = 0
+
+    def merge(self, other):
+        self.histogram.merge(other.histogram)
+        self.errors += other.errors
+        self.elapsed = max(self.elapsed, other.elapsed)
+
+
+async def run_clients(client, workload, clients, pipeline, keyspace, value, duration):
+    """Run ``clients`` connections sending ``workload`` for ``duration`` seconds."""
+    result = BenchmarkResult()
+    started = time.monotonic()
+    deadline = started + duration
+
+    async def run_client():
+        connection = client.create_async_connection(None)
+        await connection.connect()
+        try:
+            while time.monotonic() < deadline:
+                commands = []
+                for _ in range(pipeline):
+                    commands.extend(workload(random.randrange(keyspace), value))
+                start = time.perf_counter()
+                await connection.send_packed_command(
+                    connection.pack_commands(commands), check_health=False
+                )
+                for _ in commands:
+                    try:
+                        await connection.read_response()
+                    except ResponseError as e:
+                        logger.debug(f"[Benchmark] {e}")
+                        result.errors += 1
+                # requests of a pipeline are all done when the last one is
+                latency = (time.perf_counter() - start) * 1e6
+                result.histogram.record(latency, pipeline)
+        finally:
+            await connection.disconnect()
+
+    await asyncio.gather(*(run_client() for _ in range(clients)))
+    result.elapsed = time.monotonic() - started
+    return result
+
+
+def run_worker(params, test, clients, pipeline, keyspace, data_size, duration):
+    """Entry of a worker process, return its BenchmarkResult."""
+    load_config_files(params["dicerc"])
+    config.no_info = True
+    client = create_client(params)
+    value = b"x" * data_size
+    return asyncio.run(
+        run_clients(
+            client, WORKLOADS[test], clients, pipeline, keyspace, value, duration
+        )
+    )
+
+
+def split_clients(clients, processes):
+    """Spread clients over processes as even as possible."""
+    processes = min(processes, clients)
+    return [
+        clients // processes + (index < clients % processes)
+        for index in range(processes)
+    ]
+
+
+def run_test(params, test, options):
+    clients_of_workers = split_clients(options["clients"], options["processes"])
+    result = BenchmarkResult()
+    with ProcessPoolExecutor(len(clients_of_workers)) as executor:
+        futures = [
+            executor.submit(
+                run_worker,
+                params,
+                test,
+                clients,
+                options["pipeline"],
+                options["keyspace"],
+                options["data_size"],
+                options["duration"],
+            )
+            for clients in clients_of_workers
+        ]
+        for future in futures:
+            result.merge(future.result())
+    return result
+
+
+def report(test, result, options):
+    histogram = result.histogram
+    elapsed = result.elapsed or 1
+    lines = [
+        f"====== {test.upper()} ======",
+        f"  {histogram.count} requests completed in {elapsed:.2f} seconds",
+        f"  {options['clients']} parallel clients in"
+        f" {len(split_clients(options['clients'], options['processes']))}"
+        f" processes, pipeline {options['pipeline']},"
+        f" {options['data_size']} bytes payload, keyspace {options['keyspace']}",
+    ]
+    if result.errors:
+        lines.append(f"  {result.errors} errors")
+    lines.append(f"  {histogram.count / elapsed:.2f} requests per second")
+    percentiles = ", ".join(
+        f"p{percentile}: {ms(histogram.percentile(percentile))}"
+        for percentile in REPORT_PERCENTILES
+    )
+    lines.append(
+        f"  latency (ms): min: {ms(histogram.min or 0)}, avg: {ms(histogram.avg)},"
+        f" {percentiles}, max: {ms(histogram.max or 0)}"
+    )
+    return "\n".join(lines)
+
+
+TESTS_HELP = f"""
+Comma separated workloads to run, default to get,set. Available: \
+{", ".join(WORKLOADS)}.
+"""
+
+
+@click.command()
+@click.option("-h", help="Server hostname (default: 127.0.0.1).", default="127.0.0.1")
+@click.option("-p", help="Server port (default: 7379).", default="7379")
+@click.option(
+    "-s", "--socket", default=None, help="Server socket (overrides hostname and port)."
+)
+@click.option("-n", help="Database number.(overwrites dsn/url's db number)", default=0)
+@click.option("-u", "--username", help="User name used to auth.")
+@click.option("-a", "--password", help="Password to use when connecting to the server.")
+@click.option("--url", default=None, envvar="dice_URL", help="Server url.")
+@click.option("-d", "--dsn", default=None, envvar="dice_DSN", help="DSN in dicerc.")
+@click.option("--dicerc", default="~/.dicerc", help="Config file for dsn aliases.")
+@click.option(
+    "--verify-ssl",
+    default=None,
+    type=click.Choice(["none", "optional", "required"]),
+    help="Set the TLS certificate verification strategy",
+)
+@click.option(
+    "-c", "--clients", default=50, type=click.IntRange(min=1), help="Parallel clients."
+)
+@click.option(
+    "-P",
+    "--pipeline",
+    default=1,
+    type=click.IntRange(min=1),
+    help="Requests sent in one pipeline by every client, default to 1.",
+)
+@click.option(
+    "-r",
+    "--keyspace",
+    default=10000,
+    type=click.IntRange(min=1),
+    help="Number of random keys requests use, default to 10000.",
+)
+@click.option(
+    "--data-size",
+    default=3,
+    type=click.IntRange(min=0),
+    help="Bytes of values of SET, LPUSH and ZADD, default to 3.",
+)
+@click.option(
+    "--duration",
+    default=10.0,
+    type=click.FloatRange(min=0),
+    help="Seconds every workload runs, default to 10.",
+)
+@click.option("-t", "--tests", default="get,set", help=TESTS_HELP)
+@click.option(
+    "--processes",
+    default=os.cpu_count() or 1,
+    type=click.IntRange(min=1),
+    help="Worker processes clients are spread over, default to number of CPUs.",
+)
+def main(**options):
+    """
+    dice-benchmark: load generator for DiceDB and Redis.
+
+    \b
+    Examples:
+      - dice-benchmark -t get,set -c 100 -P 16
+      - dice-benchmark -d dsn --duration 30 -t incr
+    """
+    load_config_files(options["dicerc"])
+    setup_log()
+    tests = [test.strip().lower() for test in options["tests"].split(",")]
+    unknown = [test for test in tests if test not in WORKLOADS]
+    if unknown:
+        raise click.BadParameter(f"unknown workloads: {', '.join(unknown)}")
+
+    params = dict(options, client_name="dice-benchmark", prompt=None)
+    # fail fast if server can't be connected
+    config.no_info = True
+    create_client(params).connection.disconnect()
+
+    for test in tests:
+        result = run_test(params, test, options)
+        click.echo(report(test, result, options))
+        click.echo()
+    sys.exit(0)
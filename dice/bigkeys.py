@@ -0,0 +1,216 @@
+"""
+Keyspace scanner, like ``redis-cli --bigkeys`` and ``redis-cli --memkeys``.
+
+Keys are iterated with SCAN, the types and sizes (or memory usage) of every
+batch are queried in pipelines. Only the top keys and a histogram of sizes are
+kept for each type, memory won't grow with the keyspace.
+"""
+
+import time
+import heapq
+import logging
+
+from redis.exceptions import ResponseError
+
+from .client import PEEK_SIZE_COMMANDS
+from .config import config
+from .renders import NEWLINE_TUPLE
+from .utils import (
+    FormattedText,
+    convert_formatted_text_to_bytes,
+    ensure_str,
+    nativestr,
+)
+
+logger = logging.getLogger(__name__)
+
+SIZE_UNITS = {
+    "string": "bytes",
+    "list": "items",
+    "set": "members",
+    "zset": "members",
+    "hash": "fields",
+    "stream": "entries",
+}
+
+
+class TypeStats:
+    __slots__ = ("count", "total", "biggest", "top", "distribution")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.biggest = -1
+        # min-heap of (size, key)
+        self.top = []
+        # size.bit_length() -> number of keys
+        self.distribution = {}
+
+
+class KeyspaceStats:
+    def __init__(self, top=5, unit=None):
+        """
+        :param top: how many biggest keys to keep for each type.
+        :param unit: unit of sizes, default to the unit of each type.
+        """
+        self.top = top
+        self.unit = unit
+        self.types = {}
+        self.keys = 0
+        self.key_length = 0
+
+    def unit_of(self, key_type):
+        return self.unit or SIZE_UNITS.get(key_type, "")
+
+    def add(self, key, key_type, size):
+        """Record a key, return True if it's the biggest of its type so far."""
+        stats = self.types.get(key_type)
+        if stats is None:
+            stats = self.types[key_type] = TypeStats()
+        self.keys += 1
+        self.key_length += len(key)
+        stats.count += 1
+        stats.total += size
+        bucket = size.bit_length()
+        stats.distribution[bucket] = stats.distribution.get(bucket, 0) + 1
+
+        if len(stats.top) < self.top:
+            heapq.heappush(stats.top, (size, key))
+        elif size > stats.top[0][0]:
+            heapq.heapreplace(stats.top, (size, key))
+        if size > stats.biggest:
+            stats.biggest = size
+            return True
+        return False
+
+    def report(self):
+        lines = [
+            [("class:dockey", "-------- summary -------")],
+            [],
+            [("", f"Sampled {self.keys} keys in the keyspace!")],
+        ]
+        if self.keys:
+            lines.append(
+                [
+                    (
+                        "",
+                        f"Total key length in bytes is {self.key_length}"
+                        f" (avg len {self.key_length / self.keys:.2f})",
+                    )
+                ]
+            )
+        for key_type, stats in sorted(self.types.items()):
+            unit = self.unit_of(key_type)
+            lines.append([])
+            lines.append(
+                [
+                    ("class:dockey", f"{key_type}: "),
+                    (
+                        "",
+                        f"{stats.count} keys with {stats.total} {unit}"
+                        f" ({stats.count / self.keys:.2%} of keys,"
+                        f" avg size {stats.total / stats.count:.2f})",
+                    ),
+                ]
+            )
+            lines.append([("class:dockey", "  biggest:")])
+            biggest = sorted(stats.top, reverse=True)
+            for index, (size, key) in enumerate(biggest, 1):
+                lines.append(
+                    [
+                        ("", f"  {index:>3}) "),
+                        ("class:key", f'"{ensure_str(key)}"'),
+                        ("", f" {size} {unit}"),
+                    ]
+                )
+            lines.append([("class:dockey", "  distribution:")])
+            for bucket, count in sorted(stats.distribution.items()):
+                if bucket <= 1:
+                    size_range = str(bucket)
+                else:
+                    size_range = f"{2 ** (bucket - 1)}~{2 ** bucket - 1}"
+                lines.append([("", f"  {size_range:>15} {unit}: {count}")])
+
+        report = []
+        for index, line in enumerate(lines):
+            if index:
+                report.append(NEWLINE_TUPLE)
+            report.extend(line)
+        if config.raw:
+            return convert_formatted_text_to_bytes(report)
+        return FormattedText(report)
+
+
+class BigKeys:
+    """
+    Scan the keyspace, find the biggest keys of every type, by number of
+    elements, or by memory usage if ``memkeys``.
+
+    :param interval: seconds to sleep after every SCAN batch, not to hurt a
+        busy server.
+    """
+
+    def __init__(self, client, memkeys=False, top=5, interval=0, count=100):
+        self.client = client
+        self.memkeys = memkeys
+        self.interval = interval
+        self.count = count
+        self.stats = KeyspaceStats(top, unit="bytes" if memkeys else None)
+        # where to resume from after the keys recorded
+        self.cursor = 0
+
+    def scan(self, cursor=0):
+        """
+        Scan from ``cursor``, yield progress messages when a bigger key
+        found, results are collected in ``self.stats``.
+        """
+        self.cursor = cursor
+        total_keys = self.client.dbsize()
+        for next_cursor, keys in self.client.scan_batches(
+            count=self.count, cursor=cursor
+        ):
+            for key, key_type, size in self.measure(keys):
+                if self.stats.add(key, key_type, size):
+                    progress = self.stats.keys / max(total_keys, self.stats.keys)
+                    yield (
+                        f"[{progress:7.2%}] Biggest {key_type:<6} found so far"
+                        f' "{ensure_str(key)}" with {size}'
+                        f" {self.stats.unit_of(key_type)}"
+                    )
+            self.cursor = next_cursor
+            if self.interval:
+                time.sleep(self.interval)
+
+    def measure(self, keys):
+        """Yield (key, type, size) of keys, with two pipelines at most."""
+        if not keys:
+            return
+        if self.memkeys:
+            commands = []
+            for key in keys:
+                commands.extend([("TYPE", key), ("MEMORY USAGE", key)])
+            responses = self.client.execute_many(commands)
+            types, sizes = responses[::2], responses[1::2]
+        else:
+            types = self.client.execute_many([("TYPE", key) for key in keys])
+            types = [
+                None if isinstance(key_type, ResponseError) else nativestr(key_type)
+                for key_type in types
+            ]
+            size_commands = [
+                (PEEK_SIZE_COMMANDS.get(key_type), key)
+                for key, key_type in zip(keys, types)
+            ]
+            sizes = iter(
+                self.client.execute_many(
+                    [command for command in size_commands if command[0]]
+                )
+            )
+            sizes = [next(sizes) if command else None for command, _ in size_commands]
+
+        for key, key_type, size in zip(keys, types, sizes):
+            # deleted after scanned, or a module type without size command
+            if isinstance(key_type, ResponseError) or not isinstance(size, int):
+                logger.debug(f"[BigKeys] skip {key}: {key_type} {size}")
+                continue
+            yield key, nativestr(key_type), size
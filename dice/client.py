@@ -7,14 +7,18 @@ import os
 import sys
 import codecs
 import logging
+import secrets
+import threading
+from functools import partial
+from itertools import chain
+from typing import TYPE_CHECKING
 from subprocess import run
 from importlib.resources import read_text
-from packaging.version import parse as version_parse
+from packaging.version import InvalidVersion, parse as version_parse
 
 import redis
-from prompt_toolkit.shortcuts import clear
-from prompt_toolkit.formatted_text import FormattedText
-from redis.connection import Connection, SSLConnection, UnixDomainSocketConnection
+import redis.asyncio
+from redis.crc import key_slot
 from redis.exceptions import (
     AuthenticationError,
     ConnectionError,
@@ -22,31 +26,80 @@ from redis.exceptions import (
     ResponseError,
 )
 
-from . import markdown, renders
+from . import renders
 from .data import commands as commands_data
 from .commands import (
     command2callback,
     commands_summary,
     command2syntax,
+    first_key,
     groups,
     split_command_args,
     split_unknown_args,
 )
-from .completers import diceCompleter
 from .config import config
 from .exceptions import NotRedisCommand, InvalidArguments, AmbiguousCommand, NotSupport
 from .renders import OutputRender
+from .aio import AsyncCore
 from .utils import (
+    FormattedText,
     compose_command_syntax,
     nativestr,
     exit,
     convert_formatted_text_to_bytes,
+    ensure_str,
+    log_preview,
     parse_url,
+    RecentSet,
 )
 from .warning import confirm_dangerous_command
 
+if TYPE_CHECKING:
+    # completers pull in prompt_toolkit, which non-interactive runs don't need
+    from .completers import diceCompleter
+
 logger = logging.getLogger(__name__)
 CLIENT_COMMANDS = groups["dice"]
+# bytes read from stdin and written to socket at once in --pipe mode
+PIPE_CHUNK_SIZE = 64 * 1024
+# --pipe gives up if no reply arrives in this many seconds, like redis-cli
+PIPE_TIMEOUT = 30
+# keys scanned and peeked in one batch by `PEEK pattern`
+PEEK_BATCH_SIZE = 100
+PEEK_SIZE_COMMANDS = {
+    "string": "STRLEN",
+    "list": "LLEN",
+    "set": "SCARD",
+    "zset": "ZCARD",
+    "hash": "HLEN",
+    "stream": "XLEN",
+}
+glob_pattern = re.compile(r"[*?\[]")
+# SCANALL commands: (SCAN command, command for number of elements)
+SCANALL_COMMANDS = {
+    "SCANALL": ("SCAN", "DBSIZE"),
+    "HSCANALL": ("HSCAN", "HLEN"),
+    "SSCANALL": ("SSCAN", "SCARD"),
+    "ZSCANALL": ("ZSCAN", "ZCARD"),
+}
+# SCANALL drops duplicates among this many recent elements
+SCANALL_DEDUP_SIZE = 100000
+# COUNT of the SCAN for key completion
+COMPLETION_SCAN_COUNT = 1000
+# commands that change client state or read a stream of responses, they can
+# not be pipelined with other commands
+PIPELINE_BARRIER_COMMANDS = {
+    "AUTH",
+    "SELECT",
+    "MULTI",
+    "EXEC",
+    "DISCARD",
+    "HELLO",
+    "MONITOR",
+    "SUBSCRIBE",
+    "PSUBSCRIBE",
+    "Q.WATCH",
+}
 
 
 class Client:
@@ -88,6 +141,17 @@ class Client:
         self.client_id = None
         self.client_addr = None
 
+        # redis cluster: (host, port) -> connection of nodes we were redirected
+        # to, and slot -> (host, port) of the node serving it
+        self.node_connections = {}
+        self.cluster_slots = {}
+        self.cluster_enabled = False
+        self._node_dsns = None
+        # created on first use, see ``execute_many``, also by the completion
+        # thread for key completion
+        self.async_core = None
+        self.async_core_lock = threading.Lock()
+
         self.build_connection()
 
         # all command upper case
@@ -108,6 +172,12 @@ class Client:
         else:
             config.no_version_reason = "--no-info flag activated"
 
+        if self.cluster_enabled:
+            try:
+                self.refresh_cluster_slots()
+            except Exception as e:
+                logger.warning(f"[After Connection] {str(e)}")
+
         if self.prompt and "client_addr" in self.prompt:
             self.client_addr = ":".join(
                 str(x) for x in self.connection._sock.getsockname()
@@ -133,6 +203,8 @@ class Client:
             self.verify_ssl,
             client_name=self.client_name,
         )
+        if self.scheme in ("redis", "rediss"):
+            self.node_connections[(self.host, int(self.port))] = self.connection
 
     def create_connection(
         self,
@@ -145,7 +217,16 @@ class Client:
         username=None,
         verify_ssl=None,
         client_name=None,
+        async_connection=False,
     ):
+        """
+        Create a connection, a redis.asyncio one if ``async_connection``.
+        """
+        if async_connection:
+            connection_module = redis.asyncio.connection
+        else:
+            connection_module = redis.connection
+
         if scheme in ("redis", "rediss"):
             connection_kwargs = {
                 "host": host,
@@ -162,9 +243,9 @@ class Client:
 
             if scheme == "rediss":
                 connection_kwargs["ssl_cert_reqs"] = verify_ssl
-                connection_class = SSLConnection
+                connection_class = connection_module.SSLConnection
             else:
-                connection_class = Connection
+                connection_class = connection_module.Connection
         else:
             connection_kwargs = {
                 "db": db,
@@ -173,7 +254,7 @@ class Client:
                 "client_name": client_name,
                 "username": username,
             }
-            connection_class = UnixDomainSocketConnection
+            connection_class = connection_module.UnixDomainSocketConnection
 
         if config.decode:
             connection_kwargs["encoding"] = config.decode
@@ -221,6 +302,7 @@ class Client:
         version = re.findall(r"redis_version:(.+)\r\n", info_resp)[0]
         logger.debug(f"[Redis Version] {version}")
         config.version = version
+        self.cluster_enabled = "cluster_enabled:1" in info_resp
 
     def __str__(self):
         if self.prompt:  # not None and not empty
@@ -245,13 +327,23 @@ class Client:
 
         return f"{prompt}> "
 
-    def client_execute_command(self, command_name, *args):
+    def client_execute_command(self, command_name, *args, completer=None):
         command = command_name.upper()
         if command == "HELP":
             yield self.do_help(*args)
         if command == "PEEK":
-            yield from self.do_peek(*args)
+            # a key named like a pattern, e.g. `a[1]`, is peeked as a key
+            if len(args) > 1 or (
+                glob_pattern.search(args[0]) and not self.execute("EXISTS", args[0])
+            ):
+                yield from self.do_peek_pattern(*args)
+            else:
+                yield from self.do_peek(*args)
+        if command in SCANALL_COMMANDS:
+            yield from self.do_scanall(command, *args, completer=completer)
         if command == "CLEAR":
+            from prompt_toolkit.shortcuts import clear
+
             clear()
         if command == "EXIT":
             exit()
@@ -260,7 +352,127 @@ class Client:
         logger.info(
             f"execute: connection={self.connection} args={args}, kwargs={kwargs}"
         )
-        return self.execute_by_connection(self.connection, *args, **kwargs)
+        connection = self.connection
+        # commands in a transaction must be queued on the same connection
+        if self.cluster_slots and not config.transaction:
+            connection = self.get_slot_connection(*args)
+        return self.execute_by_connection(connection, *args, **kwargs)
+
+    def get_slot_connection(self, command_name, *args):
+        """
+        For redis cluster, return the connection to the node serving the
+        slot of command's first key, so it won't be redirected by MOVED.
+        Return ``self.connection`` if the command has no key or the node is
+        unknown.
+        """
+        node = self.get_command_node(command_name, *args)
+        if node is None:
+            return self.connection
+        return self.get_node_connection(*node)
+
+    def get_command_node(self, command_name, *args):
+        """
+        Return (host, port) of the cluster node serving command's first key,
+        None if it should be sent to the connected server.
+        """
+        if not self.cluster_slots or config.transaction:
+            return None
+        key = first_key(command_name, args)
+        if key is None:
+            return None
+        if isinstance(key, str):
+            key = key.encode(config.decode or "utf-8")
+        return self.cluster_slots.get(key_slot(key))
+
+    def execute_many(self, commands):
+        """
+        Execute commands, return their responses in the same order, error
+        responses are returned as ``ResponseError`` instead of raised.
+
+        Commands to the same node are pipelined in one round trip. When
+        ``config.async_core`` is on, they are sent by the asyncio core, and
+        cluster nodes are queried at the same time; otherwise nodes are
+        queried one by one with blocking connections.
+
+        :param commands: list of command args, eg: ``[("TYPE", "foo")]``
+        """
+        commands_by_node = {}
+        for index, command in enumerate(commands):
+            node = self.get_command_node(*command)
+            commands_by_node.setdefault(node, []).append((index, command))
+        to_send = {
+            node: [command for _, command in indexed]
+            for node, indexed in commands_by_node.items()
+        }
+        logger.info(f"execute many: {len(commands)} commands on {len(to_send)} nodes")
+
+        if config.async_core:
+            async_core = self.get_async_core()
+            responses_by_node = async_core.run(async_core.execute_many(to_send))
+        else:
+            responses_by_node = {
+                node: self.execute_pipeline(
+                    self.get_node_connection(*node) if node else self.connection,
+                    node_commands,
+                )
+                for node, node_commands in to_send.items()
+            }
+
+        responses = [None] * len(commands)
+        for node, indexed in commands_by_node.items():
+            for (index, command), response in zip(indexed, responses_by_node[node]):
+                if not isinstance(response, ResponseError):
+                    responses[index] = response
+                    continue
+                response_message = str(response)
+                if response_message.startswith(("MOVED ", "ASK ")):
+                    try:
+                        response = self.reissue_with_redirect(
+                            response_message, *command
+                        )
+                    except ResponseError as e:
+                        response = e
+                responses[index] = response
+        return responses
+
+    def execute_pipeline(self, connection, commands):
+        """
+        Send commands in one pipeline with a blocking connection, return the
+        responses, error responses are returned instead of raised.
+        """
+        connection.send_packed_command(
+            connection.pack_commands(commands), check_health=False
+        )
+        responses = list(self._read_pipeline_responses(len(commands), connection))
+        if len(responses) < len(commands):
+            raise ConnectionError(f"Connection to {connection} lost when pipelining.")
+        return responses
+
+    def get_async_core(self):
+        with self.async_core_lock:
+            if self.async_core is None:
+                self.async_core = AsyncCore(self.create_async_connection)
+            return self.async_core
+
+    def create_async_connection(self, node):
+        """
+        Create a redis.asyncio connection for ``AsyncCore``, to the cluster
+        node ``(host, port)``, or the connected server if node is None.
+        """
+        if node is None:
+            return self.create_connection(
+                self.host,
+                self.port,
+                self.db,
+                self.connection.password,
+                self.path,
+                self.scheme,
+                self.username,
+                self.verify_ssl,
+                client_name=self.client_name,
+                async_connection=True,
+            )
+        return self.create_node_connection(*node, async_connection=True)
 
     def execute_by_connection(self, connection, command_name, *args, **options):
         """Execute a command and return a parsed response
@@ -300,7 +512,7 @@ class Client:
                 raise
             except ResponseError as e:
                 response_message = str(e)
-                if response_message.startswith("MOVED"):
+                if response_message.startswith(("MOVED ", "ASK ")):
                     return self.reissue_with_redirect(
                         response_message, command_name, *args, **options
                     )
@@ -322,54 +534,109 @@ class Client:
 
     def reissue_with_redirect(self, response, *args, **kwargs):
         """
-        For redis cluster, when server response a "MOVE ..." response, we auto-
-        redirect to the target node, reissue the original command.
+        For redis cluster, when server response a "MOVED ..." or "ASK ..."
+        response, we auto-redirect to the target node, reissue the original
+        command.
+
+        MOVED means the slots have been changed, ``self.cluster_slots`` is
+        refreshed; ASK only redirects this command, which must be sent after
+        ASKING.
 
         This feature is not supported for unix socket connection.
         """
         # Redis Cluster only supports database zero.
-        _, _, ip_port = response.split(" ")
-        ip, port = ip_port.split(":")
+        redirect, slot, ip_port = response.split(" ")
+        ip, port = ip_port.rsplit(":", 1)
         port = int(port)
 
         print(response, file=sys.stderr)
 
-        connection = self.create_connection(
-            ip,
+        connection = self.get_node_connection(ip, port)
+        if redirect == "ASK":
+            self.execute_by_connection(connection, "ASKING")
+        else:
+            try:
+                self.refresh_cluster_slots()
+            except ResponseError as e:
+                logger.warning(f"[Cluster] can not refresh slots: {e}")
+            self.cluster_slots[int(slot)] = (ip, port)
+        return self.execute_by_connection(connection, *args, **kwargs)
+
+    def get_node_connection(self, host, port):
+        """
+        Return the connection to a cluster node, it is created on first use
+        and kept in ``self.node_connections``, so following redirects to the
+        same node don't connect again.
+        """
+        node = (host, port)
+        connection = self.node_connections.get(node)
+        if connection is not None:
+            return connection
+        connection = self.create_node_connection(host, port)
+        connection.connect()
+        self.node_connections[node] = connection
+        return connection
+
+    def create_node_connection(self, host, port, async_connection=False):
+        # if user sets dsn for dest node
+        # use username and password from dsn settings
+        node_dsn = self.get_node_dsn(host, port)
+        if node_dsn:
+            dsn_name, dsn = node_dsn
+            print(
+                f"Connect {host}:{port} via dns settings of {dsn_name}",
+                file=sys.stderr,
+            )
+            return self.create_connection(
+                dsn.host,
+                dsn.port,
+                dsn.db,
+                dsn.password,
+                dsn.path,
+                dsn.scheme,
+                dsn.username,
+                async_connection=async_connection,
+            )
+        return self.create_connection(
+            host,
             port,
             username=self.username,
             password=self.password,
             path=self.path,
             scheme=self.scheme,
             client_name=self.client_name,
+            async_connection=async_connection,
         )
-        # if user sets dsn for dest node
-        # use username and password from dsn settings
-        if config.alias_dsn:
-            for dsn_name, dsn_url in config.alias_dsn.items():
+
+    def get_node_dsn(self, host, port):
+        """
+        Find the (dsn_name, dsn) in ``alias_dsn`` settings for a node, the
+        urls are only parsed once.
+        """
+        if self._node_dsns is None:
+            self._node_dsns = {}
+            for dsn_name, dsn_url in (config.alias_dsn or {}).items():
                 dsn = parse_url(dsn_url)
-                if dsn.host == ip and dsn.port == port:
-                    print(
-                        f"Connect {ip}:{port} via dns settings of {dsn_name}",
-                        file=sys.stderr,
-                    )
-                    connection = self.create_connection(
-                        dsn.host,
-                        dsn.port,
-                        dsn.db,
-                        dsn.password,
-                        dsn.path,
-                        dsn.scheme,
-                        dsn.username,
-                    )
-                    break
+                self._node_dsns.setdefault((dsn.host, dsn.port), (dsn_name, dsn))
+        return self._node_dsns.get((host, port))
 
-        connection.connect()
-        return self.execute_by_connection(connection, *args, **kwargs)
+    def refresh_cluster_slots(self):
+        """
+        Learn which node serves every slot from ``CLUSTER SLOTS``, it is
+        loaded on connecting to a cluster and reloaded on MOVED replies.
+        """
+        cluster_slots = {}
+        for start, end, master, *_ in self.execute("CLUSTER SLOTS"):
+            # empty host means the node we are connected to
+            host = nativestr(master[0]) or self.host
+            node = (host, int(master[1]))
+            for slot in range(start, end + 1):
+                cluster_slots[slot] = node
+        self.cluster_slots = cluster_slots
 
     def render_response(self, response, command_name):
         "Parses a response from the Redis server"
-        logger.info(f"[Redis-Server] Response: {response}")
+        logger.info(f"[Redis-Server] Response: {log_preview(response)}")
         if config.raw:
             callback = OutputRender.render_raw
         # if in transaction, use queue render first
@@ -378,7 +645,7 @@ class Client:
         else:
             callback = OutputRender.get_render(command_name=command_name)
         rendered = callback(response)
-        logger.info(f"[render result] {rendered}")
+        logger.info(f"[render result] {log_preview(rendered)}")
         return rendered
 
     def monitor(self):
@@ -413,7 +680,7 @@ class Client:
         yield OutputRender.render_raw(response)
 
         
-    def split_command_and_pipeline(self, rawinput, completer: diceCompleter):
+    def split_command_and_pipeline(self, rawinput, completer: "diceCompleter"):
         """
         split user raw input to redis command and shell pipeline.
         eg:
@@ -433,6 +700,19 @@ class Client:
             return redis_command, shell_command
         return rawinput, None
 
+    def split_command(self, redis_command):
+        """
+        Split redis_command into command name and args, unknown commands are
+        split by whitespace so they can be sent to redis-server anyway.
+        """
+        try:
+            return split_command_args(redis_command)
+        except (InvalidArguments, AmbiguousCommand):
+            logger.warn(
+                "This is not a dice known command, send to redis-server anyway..."
+            )
+            return split_unknown_args(redis_command)
+
     def send_command(self, raw_command, completer=None):  # noqa
         """
         Send raw_command to redis-server, return parsed response.
@@ -450,13 +730,7 @@ class Client:
             )
         logger.info(f"[Prepare command] Redis: {redis_command}, Shell: {shell_command}")
         try:
-            try:
-                command_name, args = split_command_args(redis_command)
-            except (InvalidArguments, AmbiguousCommand):
-                logger.warn(
-                    "This is not a dice known command, send to redis-server anyway..."
-                )
-                command_name, args = split_unknown_args(redis_command)
+            command_name, args = self.split_command(redis_command)
 
             logger.info(f"[Split command] command: {command_name}, args: {args}")
             input_command_upper = command_name.upper()
@@ -474,7 +748,9 @@ class Client:
             # if raw_command is not supposed to send to server
             if input_command_upper in CLIENT_COMMANDS:
                 logger.info(f"{input_command_upper} is an dice command.")
-                yield from self.client_execute_command(command_name, *args)
+                yield from self.client_execute_command(
+                    command_name, *args, completer=completer
+                )
                 return
 
             redis_resp = self.execute(command_name, *args)
@@ -483,6 +759,8 @@ class Client:
             if shell_command and config.shell:
                 # pass the raw response of redis to shell command
                 stdin = OutputRender.render_raw(redis_resp)
+                if isinstance(stdin, renders.RawStream):
+                    stdin = b"".join(stdin)
                 run(shell_command, input=stdin, shell=True)
                 return
 
@@ -515,6 +793,187 @@ class Client:
         finally:
             config.withscores = False
 
+    def send_commands(self, raw_commands, window=None):
+        """
+        Send many raw commands (not in a tty) to redis-server using pipelining,
+        yield rendered responses in order, like ``send_command`` does for each.
+
+        Commands are sent in windows of ``window`` commands, then their
+        responses are read back. Commands that change the client's state or
+        can't be pipelined (see ``PIPELINE_BARRIER_COMMANDS``) flush the
+        current window and run alone via ``send_command``.
+
+        :param raw_commands: iterable of raw command text, can be a stream.
+        :param window: max commands in flight, default is
+            ``config.pipeline_window``.
+        """
+        window = window or config.pipeline_window or 1
+        pending = []
+        for raw_command in raw_commands:
+            logger.debug(f"[Command stdin] {raw_command}")
+            try:
+                command_name, args = self.split_command(raw_command)
+                input_command_upper = " ".join(command_name.split()).upper()
+                if (
+                    input_command_upper in CLIENT_COMMANDS
+                    or input_command_upper in PIPELINE_BARRIER_COMMANDS
+                ):
+                    yield from self._flush_pipeline(pending)
+                    pending = []
+                    yield from self.send_command(raw_command, None)
+                    continue
+                self.pre_hook(raw_command, command_name, args, None)
+            except Exception as e:
+                logger.exception(e)
+                pending.append((raw_command, None, None, False, e))
+            else:
+                pending.append(
+                    (raw_command, command_name, args, config.withscores, None)
+                )
+            finally:
+                config.withscores = False
+
+            if len(pending) >= window:
+                yield from self._flush_pipeline(pending)
+                pending = []
+        yield from self._flush_pipeline(pending)
+
+    def _flush_pipeline(self, pending):
+        """
+        Write all commands of a window in one packet, then read and render
+        responses in order. If the packet can't be sent, the commands are
+        executed one by one with ``execute``'s retry. If connection breaks
+        after it was sent, commands without responses are reported as errors
+        instead, the server may have run them, running them again is not
+        safe for commands like INCR.
+        """
+        to_send = [(name, *args) for _, name, args, _, error in pending if not error]
+        sent = False
+        if not to_send:
+            responses = iter(())
+        else:
+            try:
+                packed = self.connection.pack_commands(to_send)
+                self.connection.send_packed_command(packed)
+                sent = True
+                responses = self._read_pipeline_responses(len(to_send))
+            except (ConnectionError, TimeoutError) as e:
+                logger.warning(f"Connection Error when pipelining, got {e}.")
+                responses = iter(())
+
+        for raw_command, command_name, args, withscores, error in pending:
+            config.withscores = withscores
+            try:
+                if error:
+                    raise error
+                try:
+                    response = next(responses)
+                except StopIteration:
+                    if sent:
+                        raise ConnectionError(
+                            "Connection lost before the reply,"
+                            " the command may or may not have run."
+                        )
+                    response = self.execute(command_name, *args)
+                if isinstance(response, ResponseError):
+                    response_message = str(response)
+                    if not response_message.startswith(("MOVED ", "ASK ")):
+                        raise response
+                    response = self.reissue_with_redirect(
+                        response_message, command_name, *args
+                    )
+                self.after_hook(raw_command, command_name, args, None, response)
+                yield self.render_response(response, command_name)
+            except Exception as e:
+                logger.exception(e)
+                if config.raw:
+                    render_callback = OutputRender.render_raw
+                else:
+                    render_callback = OutputRender.render_error
+                yield render_callback(f"ERROR {str(e)}".encode())
+            finally:
+                config.withscores = False
+
+    def _read_pipeline_responses(self, count, connection=None):
+        """
+        Read ``count`` responses, error responses are returned instead of
+        raised, stop reading if connection breaks.
+        """
+        connection = connection or self.connection
+        for _ in range(count):
+            try:
+                yield connection.read_response()
+            except ResponseError as e:
+                yield e
+            except (ConnectionError, TimeoutError) as e:
+                logger.warning(f"Connection Error when pipelining, got {e}.")
+                connection.disconnect()
+                return
+
+    def pipe(self, stream, chunk_size=PIPE_CHUNK_SIZE, timeout=PIPE_TIMEOUT):
+        """
+        Mass insertion like ``redis-cli --pipe``: write the raw protocol
+        (RESP or inline commands) read from ``stream`` to server as it is,
+        while a reader thread counts replies and errors.
+
+        An ``ECHO`` with random content is sent after all data, when its reply
+        is read, all replies are received.
+
+        :param stream: binary file-like object, eg: ``sys.stdin.buffer``
+        :param timeout: raise ``TimeoutError`` if no reply arrives in this
+            many seconds after all data sent.
+        :return: (errors, replies)
+        """
+        eof_mark = secrets.token_hex(10)
+        counter = {"errors": 0, "replies": 0}
+        reader = threading.Thread(
+            target=self._read_pipe_replies, args=(eof_mark, counter), daemon=True
+        )
+        self.connection.connect()
+        reader.start()
+        last_byte = b"\n"
+        for chunk in iter(partial(stream.read, chunk_size), b""):
+            self.connection.send_packed_command([chunk], check_health=False)
+            last_byte = chunk[-1:]
+        # end the last inline command, or ECHO would be its arguments
+        if last_byte != b"\n":
+            self.connection.send_packed_command([b"\r\n"], check_health=False)
+        self.connection.send_packed_command(
+            self.connection.pack_command("ECHO", eof_mark), check_health=False
+        )
+        print("All data transferred. Waiting for the last reply...", file=sys.stderr)
+        replies = counter["replies"]
+        while True:
+            reader.join(timeout)
+            if not reader.is_alive():
+                break
+            if counter["replies"] == replies:
+                raise TimeoutError(f"No replies for {timeout} seconds: exiting.")
+            replies = counter["replies"]
+        if "exception" in counter:
+            raise counter["exception"]
+        print("Last reply received from server.", file=sys.stderr)
+        return counter["errors"], counter["replies"]
+
+    def _read_pipe_replies(self, eof_mark, counter):
+        while True:
+            try:
+                response = self.connection.read_response()
+            except ResponseError as e:
+                print(str(e), file=sys.stderr)
+                counter["errors"] += 1
+            except Exception as e:
+                logger.exception(e)
+                counter["exception"] = e
+                return
+            else:
+                if (
+                    isinstance(response, (bytes, str))
+                    and nativestr(response) == eof_mark
+                ):
+                    return
+            counter["replies"] += 1
+
     def after_hook(self, command, command_name, args, completer, response):
         # === After hook ===
         # SELECT db on AUTH
@@ -525,11 +984,15 @@ class Client:
                     raise ConnectionError("Invalid Database")
             # When the connection is TimeoutError or ConnectionError, reconnect the connection will use it
             self.connection.password = args[0]
+            if self.async_core:
+                self.async_core.reset()
         elif command_name.upper() == "SELECT":
             logger.debug("[After hook] Command is SELECT, change self.db.")
             self.db = int(args[0])
             # When the connection is TimeoutError or ConnectionError, reconnect the connection will use it
             self.connection.db = self.db
+            if self.async_core:
+                self.async_core.reset()
         elif command_name.upper() == "MULTI":
             logger.debug("[After hook] Command is MULTI, start transaction.")
             config.transaction = True
@@ -537,7 +1000,7 @@ class Client:
         if completer:
             completer.update_completer_for_response(command_name, args, response)
 
-    def pre_hook(self, command, command_name, args, completer: diceCompleter):
+    def pre_hook(self, command, command_name, args, completer: "diceCompleter"):
         """
         Before execute command, patch completers first.
         Eg: When user run `GET foo`, key completer need to
@@ -590,6 +1053,9 @@ class Client:
             raise NotRedisCommand(
                 f"{command_summary_name} is not a valid Redis command."
             )
+        # mistune is only needed here, import it on demand
+        from . import markdown
+
         rendered_detail = markdown.render(doc)
         summary_dict = commands_summary[command_summary_name]
 
@@ -640,6 +1106,356 @@ class Client:
             return convert_formatted_text_to_bytes(to_render)
         return to_render
 
+    def support_memory_usage(self):
+        # use `memory usage` to get memory, this command available from redis4.0
+        try:
+            return bool(config.version) and (
+                version_parse(config.version) >= version_parse("4.0.0")
+            )
+        except InvalidVersion:
+            return False
+
+    def do_peek_pattern(self, pattern, *options):
+        """
+        ``PEEK pattern [COUNT count]`` implementation.
+
+        Scan keys matching the pattern, show every key's type, encoding,
+        size, memory and ttl in a table, at most ``count`` keys if given.
+
+        Keys are handled in batches of ``PEEK_BATCH_SIZE``, each batch takes
+        two pipelines and is rendered once done, so memory won't grow with the
+        number of keys. Tables of all batches are yielded as one streamed
+        result, so it's paged once.
+        """
+        limit = None
+        if options:
+            if len(options) != 2 or options[0].upper() != "COUNT":
+                raise InvalidArguments("Usage: PEEK pattern [COUNT count]")
+            try:
+                limit = int(options[1])
+            except ValueError:
+                raise InvalidArguments("COUNT must be a positive integer.")
+            if limit <= 0:
+                raise InvalidArguments("COUNT must be a positive integer.")
+
+        tables = self._peek_tables(pattern, limit)
+        first_table = next(tables, None)
+        if first_table is None:
+            yield f"No keys match {pattern}."
+            return
+        yield renders.stream_pages(chain([first_table], tables), config.raw)
+
+    def _peek_tables(self, pattern, limit):
+        with_memory = self.support_memory_usage()
+        total = 0
+        for keys in self._scan_batches(pattern, PEEK_BATCH_SIZE, limit):
+            rows = self._peek_rows(keys, with_memory)
+            table = self._render_peek_rows(rows, with_header=total == 0)
+            total += len(keys)
+            if config.raw:
+                yield convert_formatted_text_to_bytes(table)
+            else:
+                yield FormattedText(table)
+
+    def do_scanall(self, command, *args, completer=None):
+        """
+        ``SCANALL [MATCH pattern] [COUNT count] [TYPE type]`` and
+        ``HSCANALL|SSCANALL|ZSCANALL key [MATCH pattern] [COUNT count]``
+        implementation.
+
+        Drive the cursor to the end, the elements of every call are rendered
+        as they arrive, numbered as one list, and touched in completers. All
+        of them are yielded as one streamed result, so it's paged once.
+        Duplicates SCAN may return are dropped if seen in the last
+        ``SCANALL_DEDUP_SIZE`` elements.
+        """
+        scan_command, size_command = SCANALL_COMMANDS[command]
+        options = {"MATCH": None, "COUNT": 100}
+        if scan_command == "SCAN":
+            usage = f"Usage: {command} [MATCH pattern] [COUNT count] [TYPE type]"
+            options["TYPE"] = None
+            key = None
+        else:
+            usage = f"Usage: {command} key [MATCH pattern] [COUNT count]"
+            if not args:
+                raise InvalidArguments(usage)
+            key, *args = args
+        if len(args) % 2:
+            raise InvalidArguments(usage)
+        for name, value in zip(args[::2], args[1::2]):
+            if name.upper() not in options:
+                raise InvalidArguments(usage)
+            options[name.upper()] = value
+        try:
+            count = int(options["COUNT"])
+        except ValueError:
+            raise InvalidArguments("COUNT must be a positive integer.")
+        if count <= 0:
+            raise InvalidArguments("COUNT must be a positive integer.")
+
+        if key is None:
+            total = self.dbsize()
+            batches = (
+                keys
+                for _, keys in self.scan_batches(
+                    options["MATCH"], count, key_type=options["TYPE"]
+                )
+            )
+        else:
+            total = self.execute(size_command, key)
+            batches = self.scan_key_batches(scan_command, key, options["MATCH"], count)
+        pages = self._scanall_pages(scan_command, batches, total, completer)
+        first_page = next(pages, None)
+        if first_page is None:
+            yield b"" if config.raw else renders.EMPTY_LIST
+            return
+        yield renders.stream_pages(chain([first_page], pages), config.raw)
+
+    def _scanall_pages(self, scan_command, batches, total, completer):
+        # pairs of field and value, or member and score
+        step = 2 if scan_command in ("HSCAN", "ZSCAN") else 1
+        index_width = len(str(total))
+        seen = RecentSet(SCANALL_DEDUP_SIZE)
+        shown = 0
+        for batch in batches:
+            elements = []
+            for start in range(0, len(batch), step):
+                if batch[start] in seen:
+                    continue
+                seen.add(batch[start])
+                elements.extend(batch[start : start + step])
+            if not elements:
+                continue
+            if completer:
+                # same as the response of one SCAN call, with members only
+                response = [b"0", elements[::2] if scan_command == "ZSCAN" else elements]
+                completer.update_completer_for_response(scan_command, None, response)
+            yield self._render_scanall_batch(scan_command, elements, shown, index_width)
+            shown += len(elements) // step
+
+    def _render_scanall_batch(self, scan_command, elements, start, index_width):
+        if config.raw:
+            return OutputRender.render_raw(elements)
+        if scan_command == "SCAN":
+            return OutputRender.render_list(elements, "class:key", start, index_width)
+        if scan_command == "HSCAN":
+            return OutputRender.render_hash_pairs(elements, start, index_width)
+        return OutputRender.render_members(
+            elements, scan_command == "ZSCAN", start, index_width
+        )
+
+    def scan_key_batches(self, scan_command, key, match=None, count=100):
+        """
+        Iterate elements of a key with ``scan_command`` (HSCAN, SSCAN or ZSCAN),
+        yield elements of every call.
+        """
+        cursor = 0
+        while True:
+            args = [scan_command, key, cursor]
+            if match:
+                args.extend(["MATCH", match])
+            args.extend(["COUNT", count])
+            cursor, elements = self.execute(*args)
+            yield elements
+            if int(cursor) == 0:
+                return
+
+    def dbsize(self):
+        """Number of keys, of all primaries on redis cluster."""
+        if not self.cluster_enabled:
+            return self.execute("DBSIZE") or 0
+        return sum(
+            self.execute_by_connection(self.get_node_connection(*node), "DBSIZE")
+            for node in self.cluster_primaries()
+        )
+
+    def _scan_batches(self, pattern, batch_size, limit=None):
+        """
+        SCAN keys matching ``pattern``, yield lists of ``batch_size`` keys,
+        stop after ``limit`` keys if given.
+        """
+        batch = []
+        scanned = 0
+        for _, keys in self.scan_batches(match=pattern, count=batch_size):
+            for key in keys:
+                batch.append(key)
+                scanned += 1
+                if scanned == limit:
+                    yield batch
+                    return
+                if len(batch) == batch_size:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+
+    def scan_batches(self, match=None, count=100, cursor=0, key_type=None):
+        """
+        Iterate the keyspace with SCAN, yield (cursor, keys) of every call,
+        the cursor is where to resume from after these keys.
+
+        On redis cluster, all primaries are scanned, the cursor is None since
+        there isn't a single cursor to resume from.
+        """
+        if self.cluster_enabled:
+            if cursor:
+                raise NotSupport("Can not resume a scan from cursor on redis cluster.")
+            for _, keys in self.scan_cluster_batches(match, count, key_type):
+                yield None, keys
+            return
+        while True:
+            cursor, keys = self.execute(
+                *self._scan_args(cursor, match, count, key_type)
+            )
+            cursor = int(cursor)
+            yield cursor, keys
+            if cursor == 0:
+                return
+
+    def scan_cluster_batches(self, match=None, count=100, key_type=None):
+        """
+        Scan all primaries of redis cluster, yield (node, keys) of every SCAN
+        call. With ``config.async_core`` on, primaries are scanned at the same
+        time, otherwise one by one.
+        """
+        nodes = self.cluster_primaries()
+        logger.info(f"[Cluster] scan primaries: {nodes}")
+        if config.async_core:
+            yield from self.get_async_core().scan_nodes(
+                nodes,
+                partial(self._scan_args, match=match, count=count, key_type=key_type),
+            )
+            return
+        for node in nodes:
+            connection = self.get_node_connection(*node)
+            cursor = 0
+            while True:
+                cursor, keys = self.execute_by_connection(
+                    connection, *self._scan_args(cursor, match, count, key_type)
+                )
+                yield node, keys
+                if int(cursor) == 0:
+                    break
+
+    def scan_first_keys(self, match, count=COMPLETION_SCAN_COUNT):
+        """
+        One ``SCAN 0 MATCH match COUNT count`` on the server, or every node
+        serving slots of redis cluster, return keys found, for completion.
+
+        Sent by the asyncio core, whose connections are apart from
+        ``self.connection``, so it can be called from the completion thread
+        while the REPL is using the client.
+        """
+        nodes = [None]
+        if self.cluster_enabled and self.cluster_slots:
+            nodes = sorted(set(self.cluster_slots.values()))
+        async_core = self.get_async_core()
+        responses_by_node = async_core.run(
+            async_core.execute_many(
+                {node: [self._scan_args(0, match, count)] for node in nodes}
+            )
+        )
+        keys = []
+        for node, (response,) in responses_by_node.items():
+            if isinstance(response, ResponseError):
+                logger.warning(f"[Completer] SCAN on {node}: {response}")
+                continue
+            keys.extend(response[1])
+        return keys
+
+    def _scan_args(self, cursor, match=None, count=100, key_type=None):
+        args = ["SCAN", cursor]
+        if match:
+            args.extend(["MATCH", match])
+        args.extend(["COUNT", count])
+        if key_type:
+            args.extend(["TYPE", key_type])
+        return args
+
+    def cluster_primaries(self):
+        """
+        Return (host, port) of all primaries serving slots, from
+        ``CLUSTER NODES``.
+        """
+        primaries = []
+        for line in nativestr(self.execute("CLUSTER NODES")).splitlines():
+            # <id> <ip:port@cport[,hostname]> <flags> <master> <ping-sent>
+            # <pong-recv> <config-epoch> <link-state> <slot> <slot> ... <slot>
+            fields = line.split()
+            if len(fields) < 9:
+                continue
+            flags = fields[2].split(",")
+            if "master" not in flags or {"fail", "noaddr", "handshake"} & set(flags):
+                continue
+            host, port = fields[1].split("@")[0].rsplit(":", 1)
+            # empty host means the node we are connected to
+            primaries.append((host or self.host, int(port)))
+        return primaries
+
+    def _peek_rows(self, keys, with_memory):
+        """
+        Return (key, type, encoding, size, memory, ttl) of keys, in two round
+        trips: metadata of all keys, then the size by their types.
+        """
+        metadata_commands = []
+        for key in keys:
+            metadata_commands.extend(
+                [("TYPE", key), ("OBJECT ENCODING", key), ("TTL", key)]
+            )
+            if with_memory:
+                metadata_commands.append(("MEMORY USAGE", key))
+        metadata = self.execute_many(metadata_commands)
+        per_key = len(metadata_commands) // len(keys)
+
+        rows = []
+        size_commands = []
+        for index, key in enumerate(keys):
+            key_type, encoding, ttl, *memory = metadata[
+                index * per_key : (index + 1) * per_key
+            ]
+            key_type = nativestr(key_type)
+            # deleted after scanned
+            if key_type == "none":
+                continue
+            size_command = PEEK_SIZE_COMMANDS.get(key_type)
+            if size_command:
+                size_commands.append((size_command, key))
+            rows.append(
+                [
+                    key,
+                    key_type,
+                    encoding,
+                    size_command,
+                    memory[0] if memory else None,
+                    ttl,
+                ]
+            )
+
+        sizes = iter(self.execute_many(size_commands))
+        for row in rows:
+            if row[3]:
+                row[3] = next(sizes)
+            for column in range(1, 6):
+                if row[column] is None or isinstance(row[column], ResponseError):
+                    row[column] = "-"
+                else:
+                    row[column] = ensure_str(row[column])
+        return rows
+
+    def _render_peek_rows(self, rows, with_header=False):
+        # key is the last column, columns are aligned between batches
+        row_format = "{:<8}{:<12}{:>10}{:>10}{:>8}  "
+        table = []
+        if with_header:
+            header = row_format.format("type", "encoding", "size", "memory", "ttl")
+            table.append(("class:dockey", header + "key"))
+        for key, *columns in rows:
+            if table:
+                table.append(renders.NEWLINE_TUPLE)
+            table.append(("", row_format.format(*columns)))
+            table.append(("class:key", ensure_str(key)))
+        return table
+
     def do_peek(self, key):
         """
         PEEK command implementation.
@@ -651,11 +1467,17 @@ class Client:
             string, list, set, zset, hash and stream.
         """
 
+        def _execute(*commands):
+            # error responses are raised like they are sent by ``execute``
+            responses = self.execute_many(commands)
+            for response in responses:
+                if isinstance(response, ResponseError):
+                    raise response
+            return responses
+
         def _string(key):
-            strlen = self.execute("strlen", key)
+            strlen, value = _execute(("STRLEN", key), ("GET", key))
             yield FormattedText([("class:dockey", "strlen: "), ("", str(strlen))])
-
-            value = self.execute("GET", key)
             yield FormattedText(
                 [
                     ("class:dockey", "value: "),
@@ -664,83 +1486,102 @@ class Client:
             )
 
         def _list(key):
-            llen = self.execute("llen", key)
+            llen, first_10, last_10 = _execute(
+                ("LLEN", key), ("LRANGE", key, 0, 9), ("LRANGE", key, -10, -1)
+            )
             yield FormattedText([("class:dockey", "llen: "), ("", str(llen))])
-            if llen <= 20:
-                contents = self.execute(f"LRANGE {key} 0 -1")
+            if llen <= 10:
+                contents = first_10
+            elif llen <= 20:
+                # elements after the first 10 are the tail of the last 10
+                contents = first_10 + last_10[20 - llen :]
             else:
-                first_10 = self.execute(f"LRANGE {key} 0 9")
-                last_10 = self.execute(f"LRANGE {key} -10 -1")
                 contents = first_10 + [f"{llen-20} elements was omitted ..."] + last_10
             yield FormattedText([("class:dockey", "elements: ")])
             yield renders.OutputRender.render_list(contents)
 
         def _set(key):
-            cardinality = self.execute("scard", key)
+            cardinality, (cursor, contents) = _execute(
+                ("SCARD", key), ("SSCAN", key, 0, "COUNT", 20)
+            )
             yield FormattedText(
                 [("class:dockey", "cardinality: "), ("", str(cardinality))]
             )
             if cardinality <= 20:
-                contents = self.execute("smembers", key)
+                # small sets are scanned in one call, unless they are encoded
+                # as hashtable by server settings
+                if int(cursor) != 0:
+                    contents = self.execute("smembers", key)
                 yield FormattedText([("class:dockey", "members: ")])
                 yield renders.OutputRender.render_list(contents)
             else:
-                _, contents = self.execute(f"sscan {key} 0 count 20")
                 first_n = len(contents)
                 yield FormattedText([("class:dockey", f"members (first {first_n}): ")])
                 yield renders.OutputRender.render_members(contents)
                 # TODO update completers
 
         def _zset(key):
-            count = self.execute(f"zcount {key} -inf +inf")
+            count, first_20, (_, scanned) = _execute(
+                ("ZCOUNT", key, "-inf", "+inf"),
+                ("ZRANGE", key, 0, 19, "WITHSCORES"),
+                ("ZSCAN", key, 0, "COUNT", 20),
+            )
             yield FormattedText([("class:dockey", "zcount: "), ("", str(count))])
             if count <= 20:
-                contents = self.execute(f"zrange {key} 0 -1 withscores")
                 yield FormattedText([("class:dockey", "members: ")])
-                yield renders.OutputRender.render_members(contents)
+                yield renders.OutputRender.render_members(first_20)
             else:
-                _, contents = self.execute(f"zscan {key} 0 count 20")
-                first_n = len(contents) // 2
+                first_n = len(scanned) // 2
                 yield FormattedText([("class:dockey", f"members (first {first_n}): ")])
                 config.withscores = True
-                output = renders.OutputRender.render_members(contents)
+                output = renders.OutputRender.render_members(scanned)
                 config.withscores = False
                 yield output
 
         def _hash(key):
-            hlen = self.execute(f"hlen {key}")
+            hlen, (cursor, contents) = _execute(
+                ("HLEN", key), ("HSCAN", key, 0, "COUNT", 20)
+            )
             yield FormattedText([("class:dockey", "hlen: "), ("", str(hlen))])
             if hlen <= 20:
-                contents = self.execute(f"hgetall {key}")
+                if int(cursor) != 0:
+                    contents = self.execute("hgetall", key)
                 yield FormattedText([("class:dockey", "fields: ")])
             else:
-                _, contents = self.execute(f"hscan {key} 0 count 20")
                 first_n = len(contents) // 2
                 yield FormattedText([("class:dockey", f"fields (first {first_n}): ")])
             yield renders.OutputRender.render_hash_pairs(contents)
 
         def _stream(key):
-            xinfo = self.execute("xinfo stream", key)
+            (xinfo,) = _execute(("XINFO STREAM", key))
             yield FormattedText([("class:dockey", "XINFO: ")])
             yield renders.OutputRender.render_list(xinfo)
 
+        # all the metadata in one round trip, then the details of its type in
+        # another one.
         # in case the result is too long, we yield only once so the outputer
         # can pager it.
         peek_response = []
-        key_type = nativestr(self.execute("type", key))
+        with_memory = self.support_memory_usage()
+        metadata_commands = [("TYPE", key), ("OBJECT ENCODING", key), ("TTL", key)]
+        if with_memory:
+            metadata_commands.append(("MEMORY USAGE", key))
+        key_type, *metadata = self.execute_many(metadata_commands)
+        if isinstance(key_type, ResponseError):
+            raise key_type
+        key_type = nativestr(key_type)
         if key_type == "none":
             yield f"{key} doesn't exist."
             return
+        for response in metadata:
+            if isinstance(response, ResponseError):
+                raise response
 
-        encoding = nativestr(self.execute("object encoding", key))
-
-        # use `memory usage` to get memory, this command available from redis4.0
+        encoding = nativestr(metadata[0])
+        ttl = str(metadata[1])
         mem = ""
-        if config.version and version_parse(config.version) >= version_parse("4.0.0"):
-            memory_usage_value = str(self.execute("memory usage", key))
-            mem = f"  mem: {memory_usage_value} bytes"
-
-        ttl = str(self.execute("ttl", key))
+        if with_memory:
+            mem = f"  mem: {metadata[2]} bytes"
 
         key_info = f"{key_type} ({encoding}){mem}, ttl: {ttl}"
 
@@ -3,7 +3,8 @@ import csv
 import json
 import logging
 import functools
-from importlib.resources import read_text, open_text
+from collections.abc import MutableMapping
+from importlib.resources import read_text, open_text, open_binary
 
 from .utils import timer, strip_quote_args
 from .exceptions import InvalidArguments, AmbiguousCommand
@@ -13,9 +14,78 @@ from . import data as project_data
 logger = logging.getLogger(__name__)
 
 
-def _load_command_summary():
-    commands_summary = json.loads(read_text(project_data, "commands.json"))
-    return commands_summary
+class CommandSummary(MutableMapping):
+    """
+    Commands' summary from redis-doc/commands.json, decoded lazily.
+
+    ``commands_index.json`` stores each command's byte range in
+    ``commands.json`` (built by scripts/build_commands_index.py), only the
+    commands accessed are read and decoded. If the index doesn't match
+    ``commands.json``, the whole file is decoded instead.
+    """
+
+    def __init__(self):
+        self._summaries = {}
+        self._offsets = None
+
+    def _load_offsets(self):
+        offsets = {}
+        try:
+            commands_index = json.loads(read_text(project_data, "commands_index.json"))
+            with open_binary(project_data, "commands.json") as commands_file:
+                if commands_file.seek(0, 2) == commands_index["size"]:
+                    offsets = commands_index["offsets"]
+        except (FileNotFoundError, ValueError, KeyError) as e:
+            logger.warning(f"[Loader] Can not load commands_index.json: {e}")
+        if not offsets:
+            logger.warning("[Loader] commands_index.json is outdated, load all.")
+            summaries = json.loads(read_text(project_data, "commands.json"))
+            summaries.update(self._summaries)
+            self._summaries = summaries
+        self._offsets = offsets
+        return offsets
+
+    def _read_summary(self, command):
+        start, end = self._offsets[command]
+        with open_binary(project_data, "commands.json") as commands_file:
+            commands_file.seek(start)
+            return json.loads(commands_file.read(end - start))
+
+    @property
+    def offsets(self):
+        if self._offsets is None:
+            return self._load_offsets()
+        return self._offsets
+
+    def __getitem__(self, command):
+        offsets = self.offsets
+        if command not in self._summaries:
+            if command not in offsets:
+                raise KeyError(command)
+            self._summaries[command] = self._read_summary(command)
+        return self._summaries[command]
+
+    def __setitem__(self, command, summary):
+        self._summaries[command] = summary
+
+    def __delitem__(self, command):
+        if command not in self:
+            raise KeyError(command)
+        self._summaries.pop(command, None)
+        self.offsets.pop(command, None)
+
+    def __contains__(self, command):
+        offsets = self.offsets
+        return command in self._summaries or command in offsets
+
+    def __iter__(self):
+        yield from self.offsets
+        yield from (
+            command for command in self._summaries if command not in self.offsets
+        )
+
+    def __len__(self):
+        return len(self.offsets.keys() | self._summaries.keys())
 
 
 def _load_command():
@@ -67,8 +137,8 @@ command2callback, command2syntax, groups = _load_command()
 all_commands = sorted(
     list(command2callback.keys()) + ["HELP"], key=lambda x: len(x), reverse=True
 )
-# load commands information from redis-doc/commands.json
-commands_summary = _load_command_summary()
+# load commands information from redis-doc/commands.json, lazily
+commands_summary = CommandSummary()
 # add dice' commands' summary
 commands_summary.update(
     {
@@ -92,50 +162,164 @@ commands_summary.update(
             "group": "dice",
         },
         "PEEK": {
-            "summary": "Get the key's type and value.",
-            "arguments": [{"name": "key", "type": "key"}],
+            "summary": (
+                "Get the key's type and value, or the type, size, memory and ttl"
+                " of keys matching a pattern."
+            ),
+            "arguments": [
+                {"name": "key", "type": "key"},
+                {
+                    "command": "COUNT",
+                    "name": "count",
+                    "type": "integer",
+                    "optional": True,
+                },
+            ],
             "complexity": "O(1).",
             "since": "1.0",
             "group": "dice",
         },
+        "SCANALL": {
+            "summary": (
+                "Iterate the whole keyspace, SCAN until the cursor returns to 0,"
+                " keys are shown as they arrive."
+            ),
+            "arguments": [
+                {
+                    "command": "MATCH",
+                    "name": "pattern",
+                    "type": "pattern",
+                    "optional": True,
+                },
+                {
+                    "command": "COUNT",
+                    "name": "count",
+                    "type": "integer",
+                    "optional": True,
+                },
+                {"command": "TYPE", "name": "type", "type": "string", "optional": True},
+            ],
+            "complexity": "O(N) where N is the number of keys.",
+            "since": "1.0",
+            "group": "dice",
+        },
     }
 )
+# HSCANALL, SSCANALL and ZSCANALL share the same arguments
+for _command, _elements in [
+    ("HSCANALL", "fields and values of a hash"),
+    ("SSCANALL", "members of a set"),
+    ("ZSCANALL", "members and scores of a sorted set"),
+]:
+    commands_summary[_command] = {
+        "summary": (
+            f"Iterate all {_elements}, {_command[:-3]} until the cursor returns"
+            " to 0, elements are shown as they arrive."
+        ),
+        "arguments": [
+            {"name": "key", "type": "key"},
+            {"command": "MATCH", "name": "pattern", "type": "pattern", "optional": True},
+            {"command": "COUNT", "name": "count", "type": "integer", "optional": True},
+        ],
+        "complexity": "O(N) where N is the number of elements.",
+        "since": "1.0",
+        "group": "dice",
+    }
 timer("[Loader] Finished loading commands.")
 dangerous_commands = _load_dangerous()
 
 
-@functools.lru_cache(maxsize=2048)
-def split_command_args(command):
+class _CommandTrieNode:
     """
-    Split Redis command text into command and args.
+    Node of the command words trie, one word per level.
 
-    :param command: redis command string, with args
+    ``ambiguous`` holds words that a command longer than the current path
+    starts with, a command input ends with those words is not finished yet.
+    """
+
+    __slots__ = ("children", "command", "ambiguous")
+
+    def __init__(self):
+        self.children = {}
+        self.command = None
+        self.ambiguous = set()
+
+
+def _build_command_trie(commands):
+    root = _CommandTrieNode()
+    for command_name in commands:
+        node = root
+        for word in command_name.split():
+            node = node.children.setdefault(word, _CommandTrieNode())
+        node.command = command_name
+
+    nodes = [root]
+    while nodes:
+        node = nodes.pop()
+        for word, child in node.children.items():
+            node.ambiguous.update(word[:end] for end in range(1, len(word)))
+            if child.children:
+                node.ambiguous.add(word)
+            nodes.append(child)
+    return root
+
+
+command_trie = _build_command_trie(all_commands)
+command_word = re.compile(r"[^ ]+")
+
+
+def _is_ambiguous(command):
+    """
+    For command that is partially input, like `command in`, we should
+    match with `command info`, otherwise, `command in` will result in
+    `command` with `args` is ('in') which is an invalid case.
+    """
+    words = command.upper().split()
+    if len(words) < 2:
+        return False
+    node = command_trie
+    for word in words[:-1]:
+        node = node.children.get(word)
+        if node is None:
+            return False
+    return words[-1] in node.ambiguous
+
+
+def split_command_name(command):
     """
-    global all_commands
+    Return the command name of Redis command text, args are not parsed.
 
+    Command name is matched word by word with ``command_trie``, the longest
+    command wins.
+    """
     command = command.strip()
-    for command_name in all_commands:
-        # for command that is partially input, like `command in`, we should
-        # match with `command info`, otherwise, `command in` will result in
-        # `command` with `args` is ('in') which is an invalid case.
-        normalized_input_command = " ".join(command.split()).upper()
-        if (
-            re.search(r"\s", command)
-            and command_name.startswith(normalized_input_command)
-            and command_name != normalized_input_command
-        ):
-            raise AmbiguousCommand("command is not finished")
-        # allow multiple space in user input command
-        command_allow_multi_spaces = "[ ]+".join(command_name.split())
-        matcher = re.match(rf"({command_allow_multi_spaces})( |$)", command.upper())
-        if matcher:
-            matched_command_len = len(matcher.group(1))
-            input_command = command[:matched_command_len]
-            input_args = command[matcher.end() :]
+    if _is_ambiguous(command):
+        raise AmbiguousCommand("command is not finished")
+
+    # allow multiple space in user input command
+    node = command_trie
+    matched_command_len = None
+    for word in command_word.finditer(command):
+        node = node.children.get(word.group().upper())
+        if node is None:
             break
-    else:
+        if node.command:
+            matched_command_len = word.end()
+    if matched_command_len is None:
         raise InvalidArguments(f"`{command}` is not a valid Redis Command")
+    return command[:matched_command_len]
+
 
+@functools.lru_cache(maxsize=2048)
+def split_command_args(command):
+    """
+    Split Redis command text into command and args.
+
+    :param command: redis command string, with args
+    """
+    command = command.strip()
+    input_command = split_command_name(command)
+    input_args = command[len(input_command) + 1 :]
     args = list(strip_quote_args(input_args))
 
     return input_command, args
@@ -148,3 +332,52 @@ def split_unknown_args(command):
     command = command.strip()
     input_command, *input_args = command.split(" ")
     return input_command, list(strip_quote_args(" ".join(input_args)))
+
+
+@functools.lru_cache(maxsize=None)
+def _first_key_spec(command_name):
+    """
+    Return (key index, numkeys index) of the first key_spec in commands.json,
+    indexes count the command name words, numkeys index is None if the
+    number of keys is not given by an argument. None if there is no key_spec
+    or the key can't be found by index.
+    """
+    try:
+        key_specs = commands_summary[command_name].get("key_specs")
+    except KeyError:
+        return None
+    if not key_specs:
+        return None
+    begin_search = key_specs[0]["begin_search"]
+    find_keys = key_specs[0]["find_keys"]
+    if begin_search["type"] != "index":
+        return None
+    index = begin_search["spec"]["index"]
+    if find_keys["type"] == "range":
+        return index, None
+    if find_keys["type"] == "keynum":
+        spec = find_keys["spec"]
+        return index + spec["firstkey"], index + spec["keynumidx"]
+    return None
+
+
+def first_key(command_name, args):
+    """
+    Return the first key in the args of a command, None if the command has
+    no keys or they can't be found by position (like keys after STREAMS).
+    """
+    command_words = command_name.upper().split()
+    key_spec = _first_key_spec(" ".join(command_words))
+    if key_spec is None:
+        return None
+    key_index, numkeys_index = key_spec
+    offset = len(command_words)
+    if numkeys_index is not None:
+        try:
+            if int(args[numkeys_index - offset]) <= 0:
+                return None
+        except (IndexError, ValueError):
+            return None
+    if offset <= key_index < offset + len(args):
+        return args[key_index - offset]
+    return None
@@ -1,4 +1,14 @@
+import os
+import re
+import json
+import time
 import logging
+import threading
+import itertools
+from array import array
+from collections import OrderedDict
+from collections.abc import Mapping
+from functools import lru_cache
 from typing import Iterable
 from datetime import datetime, timezone
 
@@ -13,15 +23,78 @@ from prompt_toolkit.completion import (
 from prompt_toolkit.contrib.regular_languages.completion import GrammarCompleter
 from prompt_toolkit.document import Document
 
-from .commands import split_command_args, commands_summary, all_commands
+from .commands import (
+    split_command_args,
+    split_command_name,
+    commands_summary,
+    all_commands,
+)
 from .config import config
 from .exceptions import InvalidArguments, AmbiguousCommand
-from .redis_grammar import CONST, command_grammar, get_command_grammar
-from .utils import strip_quote_args, ensure_str
+from .redis_grammar import (
+    CONST,
+    command_grammar,
+    get_command_grammar,
+    get_command_variables,
+)
+from .utils import strip_quote_args, ensure_str, escape_glob
 
 logger = logging.getLogger(__name__)
 
 
+# most completions an IndexedWordCompleter returns
+COMPLETION_LIMIT = 100
+# most recently used words checked one by one when the index can't narrow
+# candidates down, eg. inputs shorter than a trigram, or fuzzy matches
+SCAN_LIMIT = 5000
+# postings are compacted when more than half of their stamps are stale
+COMPACT_RATIO = 2
+# key completion asks the server when known keys have fewer matches
+SERVER_SCAN_THRESHOLD = 10
+# seconds before a prefix can be scanned again
+SERVER_SCAN_TTL = 30
+# seconds between two scans at least, not to SCAN on every keystroke
+SERVER_SCAN_INTERVAL = 0.2
+# expired prefixes are dropped when more are cached
+MAX_SCANNED_PREFIXES = 1024
+# completers whose words are saved across sessions, and how many words of
+# each are saved at most
+STORED_COMPLETERS = ["key", "member", "field", "group", "username"]
+STORE_MAX_WORDS = 10000
+
+
+class MostRecentlyUsedWords:
+    """
+    Words of an OrderedDict, most recently used first. A live view, iterate
+    it won't copy the words, changes are seen by the next iteration.
+    """
+
+    def __init__(self, words):
+        # word -> when it was used, least recently used first, so touch and
+        # evict are both O(1)
+        self._words = words
+
+    def __iter__(self):
+        try:
+            yield from reversed(self._words)
+        except RuntimeError:
+            # touched while iterating, eg. completing in a thread, the next
+            # completion will see the new words
+            return
+
+    def __len__(self):
+        return len(self._words)
+
+    def __contains__(self, word):
+        return word in self._words
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return f"MostRecentlyUsedWords({list(self)!r})"
+
+
 class MostRecentlyUsedFirstWordMixin:
     """
     A Mixin for WordCompleter, with a `touch()` method can make latest used
@@ -31,26 +104,66 @@ class MostRecentlyUsedFirstWordMixin:
     """
 
     def __init__(self, max_words, words, *args, **kwargs):
-        self.words = words
+        self._recent = OrderedDict()
+        self._clock = itertools.count()
+        self._words_view = MostRecentlyUsedWords(self._recent)
         self.max_words = max_words
-        super().__init__(words, *args, **kwargs)
+        super().__init__(self._words_view, *args, **kwargs)
+        self.words = words
+
+    @property
+    def words(self):
+        return self._words_view
+
+    @words.setter
+    def words(self, words):
+        # set by WordCompleter.__init__
+        if words is self._words_view:
+            return
+        # WordCompleter keeps the view, so update in place
+        words = list(words)
+        self._recent.clear()
+        self.words_cleared()
+        for word in reversed(words):
+            self.touch(word)
 
     def touch(self, word):
         """
         Make sure word is in the first place of the completer
         list.
         """
-        if word in self.words:
-            self.words.remove(word)
-        else:  # not in words
-            if len(self.words) == self.max_words:  # full
-                self.words.pop()
-        self.words.insert(0, word)
+        recent = self._recent
+        stamp = next(self._clock)
+        used = recent.get(word)
+        if used is not None:
+            recent.move_to_end(word)
+            recent[word] = stamp
+            self.word_removed(word, used)
+            self.word_added(word, stamp)
+            return
+        recent[word] = stamp
+        self.word_added(word, stamp)
+        # full, evict the least recently used
+        if self.max_words is not None and len(recent) > self.max_words:
+            evicted, used = recent.popitem(last=False)
+            self.word_removed(evicted, used)
 
     def touch_words(self, words):
         for word in words:
             self.touch(word)
 
+    # hooks for completers keeping their own index of words, ``stamp`` is
+    # when the word was used, it's larger for more recently used words
+
+    def word_added(self, word, stamp):
+        pass
+
+    def word_removed(self, word, stamp):
+        pass
+
+    def words_cleared(self):
+        pass
+
 
 class MostRecentlyUsedFirstWordCompleter(
     MostRecentlyUsedFirstWordMixin, FuzzyWordCompleter
@@ -58,6 +171,235 @@ class MostRecentlyUsedFirstWordCompleter(
     pass
 
 
+class TrigramIndex:
+    """
+    Stamps of words by trigrams of their lower cased text, for prefix and
+    substring search. Text of a word starts with ``\\0``, so its prefix has
+    grams of its own, the first letter is indexed as a bigram.
+
+    Postings are append only arrays, stamps of a word used again are left
+    stale until compacted, so every posting is in the order words were
+    used, and 8 bytes per gram.
+    """
+
+    def __init__(self):
+        # gram -> array of stamps
+        self.postings = {}
+        # stamp -> word, only the stamps still in use
+        self.words = {}
+        # stamps in postings, and those still in use
+        self.size = 0
+        self.live = 0
+
+    @staticmethod
+    def trigrams(text):
+        return {text[i : i + 3] for i in range(len(text) - 2)}
+
+    def grams_of(self, word):
+        text = "\0" + word.lower()
+        return self.trigrams(text) | {text[:2]}
+
+    def add(self, word, stamp):
+        grams = self.grams_of(word)
+        self.words[stamp] = word
+        for gram in grams:
+            posting = self.postings.get(gram)
+            if posting is None:
+                posting = self.postings[gram] = array("q")
+            posting.append(stamp)
+        self.size += len(grams)
+        self.live += len(grams)
+
+    def remove(self, word, stamp):
+        del self.words[stamp]
+        self.live -= len(self.grams_of(word))
+        if self.size > COMPACT_RATIO * self.live + 1024:
+            self.compact()
+
+    def compact(self):
+        words = self.words
+        postings = {}
+        for gram, posting in self.postings.items():
+            posting = array("q", (stamp for stamp in posting if stamp in words))
+            if posting:
+                postings[gram] = posting
+        self.postings = postings
+        self.size = self.live
+
+    def clear(self):
+        self.postings.clear()
+        self.words.clear()
+        self.size = self.live = 0
+
+    def candidates(self, text, prefix):
+        """
+        Yield words may start with (if ``prefix``) or contain lower cased
+        ``text``, most recently used first. Return None if ``text`` is too
+        short to narrow down.
+        """
+        if prefix:
+            text = "\0" + text
+            grams = self.trigrams(text) or {text}
+        else:
+            grams = self.trigrams(text)
+        if not grams or text == "\0":
+            return None
+        postings = [self.postings.get(gram, ()) for gram in grams]
+        return self._live_words(min(postings, key=len))
+
+    def _live_words(self, posting):
+        words = self.words
+        for stamp in reversed(posting):
+            word = words.get(stamp)
+            if word is not None:
+                yield word
+
+
+class IndexedCompleter(Completer):
+    """
+    Complete words of a trigram index instead of matching every word, for
+    large vocabularies like keys. Words start with the input come first,
+    then words contain it, then fuzzy matches (letters of the input in
+    order), most recently used first for each, at most ``limit`` of them.
+
+    Fuzzy matches, and inputs too short for trigrams, are only searched in
+    the ``SCAN_LIMIT`` most recently used words.
+    """
+
+    def __init__(self, words, limit=COMPLETION_LIMIT):
+        self.words = words
+        self.limit = limit
+        self.index = TrigramIndex()
+
+    def get_completions(
+        self, document: Document, complete_event: CompleteEvent
+    ) -> Iterable[Completion]:
+        text = document.text_before_cursor
+        for word in self.match(text):
+            yield Completion(word, start_position=-len(text))
+
+    def match(self, text):
+        lowered = text.lower()
+        fuzzy = re.compile(".*?".join(map(re.escape, text)), re.IGNORECASE)
+        tiers = [
+            (
+                self.index.candidates(lowered, prefix=True),
+                lambda word: word.lower().startswith(lowered),
+            ),
+            (
+                self.index.candidates(lowered, prefix=False),
+                lambda word: lowered in word.lower(),
+            ),
+            (None, fuzzy.search),
+        ]
+        if not lowered:
+            # every word is a prefix match
+            tiers = tiers[:1]
+
+        # dict as an ordered set
+        found = {}
+        for candidates, matches in tiers:
+            if candidates is None:
+                candidates = itertools.islice(self.words, SCAN_LIMIT)
+            for word in candidates:
+                if word not in found and matches(word):
+                    found[word] = None
+                    if len(found) == self.limit:
+                        return list(found)
+        return list(found)
+
+
+class IndexedWordCompleter(MostRecentlyUsedFirstWordMixin, IndexedCompleter):
+    """Most recently used words, completed with a trigram index."""
+
+    def word_added(self, word, stamp):
+        self.index.add(word, stamp)
+
+    def word_removed(self, word, stamp):
+        self.index.remove(word, stamp)
+
+    def words_cleared(self):
+        self.index.clear()
+
+
+class ServerKeyCompleter(IndexedWordCompleter):
+    """
+    Key completer asks the server too, when the known keys have fewer than
+    ``SERVER_SCAN_THRESHOLD`` matches: one ``SCAN 0 MATCH <input>* COUNT n``
+    by ``scan_keys``, keys found are touched and completed as well.
+
+    It blocks on the server, so completions should run in a thread,
+    ``complete_in_thread`` of the prompt session. A prefix is scanned at
+    most once in ``SERVER_SCAN_TTL`` seconds, and scans are at least
+    ``SERVER_SCAN_INTERVAL`` apart, only the latest input is scanned.
+    """
+
+    def __init__(self, max_words, words, limit=COMPLETION_LIMIT):
+        # touched by the completion thread and the REPL
+        self.lock = threading.RLock()
+        super().__init__(max_words, words, limit=limit)
+        # scan_keys(pattern) returns keys, set when connected to a server
+        self.scan_keys = None
+        # prefix -> when it was scanned
+        self.scanned = {}
+        self.last_scan = 0
+        self.latest_text = None
+
+    def touch(self, word):
+        with self.lock:
+            super().touch(word)
+
+    def match(self, text):
+        with self.lock:
+            return super().match(text)
+
+    def get_completions(
+        self, document: Document, complete_event: CompleteEvent
+    ) -> Iterable[Completion]:
+        text = document.text_before_cursor
+        self.latest_text = text
+        words = self.match(text)
+        for word in words:
+            yield Completion(word, start_position=-len(text))
+        if len(words) >= SERVER_SCAN_THRESHOLD or not self.scan(text):
+            return
+        for word in self.match(text):
+            if word not in words:
+                yield Completion(word, start_position=-len(text))
+
+    def scan(self, text):
+        """Scan keys start with ``text`` from server, return True if scanned."""
+        if self.scan_keys is None:
+            return False
+        now = time.monotonic()
+        scanned = self.scanned.get(text)
+        if scanned is not None and now - scanned < SERVER_SCAN_TTL:
+            return False
+        wait = self.last_scan + SERVER_SCAN_INTERVAL - now
+        if wait > 0:
+            time.sleep(wait)
+            # typed on, the next completion will scan its input
+            if self.latest_text != text:
+                return False
+        self.last_scan = now = time.monotonic()
+        if len(self.scanned) > MAX_SCANNED_PREFIXES:
+            self.scanned = {
+                prefix: scanned
+                for prefix, scanned in self.scanned.items()
+                if now - scanned < SERVER_SCAN_TTL
+            }
+        self.scanned[text] = now
+
+        try:
+            keys = self.scan_keys(escape_glob(text) + "*")
+        except Exception as e:
+            logger.warning(f"[Completer] scan keys start with {text!r}: {e}")
+            return False
+        logger.debug(f"[Completer] {len(keys)} keys start with {text!r} scanned.")
+        self.touch_words(ensure_str(keys))
+        return True
+
+
 class IntegerTypeCompleter(MostRecentlyUsedFirstWordMixin, WordCompleter):
     def __init__(self):
         words = []
@@ -143,6 +485,89 @@ class TimestampCompleter(Completer):
         yield from sorted(completions, key=lambda a: a.text)
 
 
+class CommandHint(Mapping):
+    """
+    Command summaries as completion meta in newbie mode, a summary is only
+    read when its command shows up in completions.
+    """
+
+    def __getitem__(self, command):
+        return commands_summary[command.upper()]["summary"]
+
+    def __iter__(self):
+        yield from all_commands
+        yield from (command.lower() for command in all_commands)
+
+    def __len__(self):
+        return len(all_commands) * 2
+
+
+class VocabularyStore:
+    """
+    Words of completers saved in a JSON file, one file for each server, so
+    completions are warm in the next session. Most recently used words
+    first, at most ``STORE_MAX_WORDS`` of each completer.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    @classmethod
+    def for_client(cls, client):
+        """Store of the server ``client`` connected to, None if disabled."""
+        if not config.completion_store_location:
+            return None
+        server = client.path or f"{client.host}:{client.port}"
+        name = re.sub(r"[^\w.-]", "_", server)
+        return cls(
+            os.path.join(
+                os.path.expanduser(config.completion_store_location), f"{name}.json"
+            )
+        )
+
+    def load(self):
+        """
+        Return {completer name: words}, empty if nothing saved. Words not
+        str in a broken or hand edited file are dropped.
+        """
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path) as f:
+                stored = json.load(f)
+            return {
+                name: [word for word in words if isinstance(word, str)][
+                    :STORE_MAX_WORDS
+                ]
+                for name, words in stored["words"].items()
+                if name in STORED_COMPLETERS and isinstance(words, list)
+            }
+        except Exception as e:
+            logger.warning(f"[Completer] can not load words from {self.path}: {e}")
+            return {}
+
+    def save(self, vocabularies):
+        """
+        Written to a temp file and renamed, so a half written file can never
+        be loaded, only readable by the user since keys may be sensitive.
+        """
+        stored = {
+            "words": {
+                name: list(itertools.islice(words, STORE_MAX_WORDS))
+                for name, words in vocabularies.items()
+            }
+        }
+        tmp_file = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            fd = os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with open(fd, "w") as f:
+                json.dump(stored, f, separators=(",", ":"))
+            os.replace(tmp_file, self.path)
+        except Exception as e:
+            logger.warning(f"[Completer] can not save words to {self.path}: {e}")
+
+
 class diceCompleter(Completer):
     """
     Completer class that can dynamically returns any Completer.
@@ -156,17 +581,30 @@ class diceCompleter(Completer):
         self.current_completer = self.root_completer = GrammarCompleter(
             command_grammar, self.completer_mapping
         )
+        # GrammarCompleter only holds the grammar and completer_mapping, so
+        # it's safe to reuse one for each command
+        self.get_grammar_completer = lru_cache(maxsize=256)(
+            self._create_grammar_completer
+        )
+        # compiled grammar -> tokens of completers learning words in it
+        self.learning_tokens = {}
+        # completers are updated by the REPL and seeded from history in a
+        # thread
+        self.update_lock = threading.RLock()
+        # words of last sessions, loaded on first completion
+        self.store = None
+        self.store_loaded = False
 
     @property
-    def key_completer(self) -> MostRecentlyUsedFirstWordCompleter:
+    def key_completer(self) -> ServerKeyCompleter:
         return self.completer_mapping["key"]
 
     @property
-    def member_completer(self) -> MostRecentlyUsedFirstWordCompleter:
+    def member_completer(self) -> IndexedWordCompleter:
         return self.completer_mapping["member"]
 
     @property
-    def field_completer(self) -> MostRecentlyUsedFirstWordCompleter:
+    def field_completer(self) -> IndexedWordCompleter:
         return self.completer_mapping["field"]
 
     @property
@@ -181,14 +619,17 @@ class diceCompleter(Completer):
     def username_completer(self) -> MostRecentlyUsedFirstWordCompleter:
         return self.completer_mapping["username"]
 
+    def _create_grammar_completer(self, command):
+        # here will compile grammar for this command
+        grammar = get_command_grammar(command)
+        return GrammarCompleter(
+            compiled_grammar=grammar, completers=self.completer_mapping
+        )
+
     def get_completer(self, input_text):
         try:
             command, _ = split_command_args(input_text)
-            # here will compile grammar for this command
-            grammar = get_command_grammar(command)
-            completer = GrammarCompleter(
-                compiled_grammar=grammar, completers=self.completer_mapping
-            )
+            completer = self.get_grammar_completer(command)
         except (InvalidArguments, AmbiguousCommand):
             completer = self.root_completer
 
@@ -197,34 +638,96 @@ class diceCompleter(Completer):
     def get_completions(
         self, document: Document, complete_event: CompleteEvent
     ) -> Iterable[Completion]:
+        self.load_vocabularies()
         input_text = document.text
         self.current_completer = self.get_completer(input_text)
         return self.current_completer.get_completions(document, complete_event)
 
-    def update_completer_for_input(self, command):
-        completer = self.get_completer(command)
-        grammar = completer.compiled_grammar
-        m = grammar.match(command)
-        if not m:
-            # invalid command!
+    def load_vocabularies(self):
+        """
+        Add words of last sessions to completers, once, after words used in
+        this session.
+        """
+        if self.store is None or self.store_loaded:
             return
-        variables = m.variables()
+        with self.update_lock:
+            if self.store_loaded:
+                return
+            for name, words in self.store.load().items():
+                completer = self.completer_mapping[name]
+                # least recently used ones are evicted if more than max_words
+                completer.words = itertools.chain(
+                    completer.words,
+                    (word for word in words if word not in completer.words),
+                )
+            self.store_loaded = True
+            logger.info(f"[Completer] words loaded from {self.store.path}.")
+
+    def save_vocabularies(self):
+        if self.store is None:
+            return
+        # words of last sessions are kept even no completion happened
+        self.load_vocabularies()
+        self.store.save(
+            {name: self.completer_mapping[name].words for name in STORED_COMPLETERS}
+        )
 
-        # auto update completion words, if it's LRU strategy.
-        for _token, _completer in self.completer_mapping.items():
-            if not isinstance(_completer, MostRecentlyUsedFirstWordMixin):
+    def extract_tokens(self, commands):
+        """
+        Yield (token, word) of tokens in ``commands`` for completers learning
+        words, like key, member and field, in the order of commands.
+
+        Tokens of every grammar are looked up once, commands without any of
+        them (like PING, INFO) are skipped without matching the grammar.
+        """
+        for command in commands:
+            # args are parsed by the grammar, no need to split them here
+            try:
+                command_name = split_command_name(command)
+                completer = self.get_grammar_completer(command_name)
+            except (InvalidArguments, AmbiguousCommand):
+                command_name = None
+                completer = self.root_completer
+            grammar = completer.compiled_grammar
+            tokens = self.learning_tokens.get(grammar)
+            if tokens is None:
+                variables = get_command_variables(command_name)
+                tokens = self.learning_tokens[grammar] = [
+                    token
+                    for token, completer in self.completer_mapping.items()
+                    if isinstance(completer, MostRecentlyUsedFirstWordMixin)
+                    and token in variables
+                ]
+            if not tokens:
                 continue
+            m = grammar.match(command)
+            if not m:
+                # invalid command!
+                continue
+            variables = m.variables()
+            for token in tokens:
+                # getall always returns a []
+                for value in variables.getall(token):
+                    # prompt_toolkit didn't support multi tokens
+                    # like DEL key1 key2 key3
+                    # so we have to split them manually
+                    for word in strip_quote_args(value):
+                        yield token, word
+
+    def update_completer_for_inputs(self, commands):
+        """Touch words in ``commands`` into completers, latest command last."""
+        with self.update_lock:
+            for token, word in self.extract_tokens(commands):
+                self.completer_mapping[token].touch(word)
 
-            # getall always returns a []
-            tokens_in_command = variables.getall(_token)
-            for _token_in_command in tokens_in_command:
-                # prompt_toolkit didn't support multi tokens
-                # like DEL key1 key2 key3
-                # so we have to split them manually
-                for single_token in strip_quote_args(_token_in_command):
-                    _completer.touch(single_token)
+    def update_completer_for_input(self, command):
+        self.update_completer_for_inputs([command])
 
     def update_completer_for_response(self, command_name, args, response):
+        with self.update_lock:
+            self._update_completer_for_response(command_name, args, response)
+
+    def _update_completer_for_response(self, command_name, args, response):
         command_name = " ".join(command_name.split()).upper()
         logger.info(
             f"Try update completer using response... command_name is {command_name}"
@@ -303,9 +806,9 @@ class diceCompleter(Completer):
                 for key, tokens in CONST.items()
             }
         )
-        key_completer = MostRecentlyUsedFirstWordCompleter(config.completer_max, [])
-        member_completer = MostRecentlyUsedFirstWordCompleter(config.completer_max, [])
-        field_completer = MostRecentlyUsedFirstWordCompleter(config.completer_max, [])
+        key_completer = ServerKeyCompleter(config.completer_max, [])
+        member_completer = IndexedWordCompleter(config.completer_max, [])
+        field_completer = IndexedWordCompleter(config.completer_max, [])
         group_completer = MostRecentlyUsedFirstWordCompleter(config.completer_max, [])
         username_completer = MostRecentlyUsedFirstWordCompleter(
             config.completer_max, []
@@ -352,18 +855,7 @@ class diceCompleter(Completer):
 
         # command completer
         if hint_on:
-            command_hint = {
-                key: info["summary"] for key, info in commands_summary.items()
-            }
-            hint = {
-                command: command_hint.get(command.upper()) for command in all_commands
-            }
-            hint.update(
-                {
-                    command.lower(): command_hint.get(command.upper())
-                    for command in all_commands
-                }
-            )
+            hint = CommandHint()
         else:
             hint = {}
 
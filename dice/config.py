@@ -28,10 +28,13 @@ class Config:
     def __init__(self):
         self.raw = None
         self.completer_max = None
+        self.server_key_completion = None
         # show command hint?
         self.newbie_mode = None
         self.rainbow = None
         self.retry_times = 2
+        self.pipeline_window = 100
+        self.async_core = None
         self.socket_keepalive = None
         self.decode = None
         self.no_info = None
@@ -46,6 +49,8 @@ class Config:
         self.no_version_reason = None
         self.log_location = None
         self.history_location = None
+        self.grammar_cache_location = None
+        self.completion_store_location = None
         self.completion_casing = None
         self.alias_dsn = None
 
@@ -115,7 +120,10 @@ def load_config_files(dicerc):
 
     config.raw = config_obj["main"].as_bool("raw")
     config.completer_max = config_obj["main"].as_int("completer_max")
+    config.server_key_completion = config_obj["main"].as_bool("server_key_completion")
     config.retry_times = config_obj["main"].as_int("retry_times")
+    config.pipeline_window = config_obj["main"].as_int("pipeline_window")
+    config.async_core = config_obj["main"].as_bool("async_core")
     config.newbie_mode = config_obj["main"].as_bool("newbie_mode")
     config.rainbow = config_obj["main"].as_bool("rainbow")
     config.socket_keepalive = config_obj["main"].as_bool("socket_keepalive")
@@ -126,6 +134,10 @@ def load_config_files(dicerc):
     config.log_location = config_obj["main"]["log_location"]
     config.completion_casing = config_obj["main"]["completion_casing"]
     config.history_location = config_obj["main"]["history_location"]
+    config.grammar_cache_location = config_obj["main"].get("grammar_cache_location")
+    config.completion_store_location = config_obj["main"].get(
+        "completion_store_location"
+    )
     config.alias_dsn = config_obj["alias_dsn"]
     config.shell = config_obj["main"].as_bool("shell")
     config.pager = config_obj["main"].get("pager")
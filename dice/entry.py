@@ -1,42 +1,27 @@
+import io
 import os
+import codecs
 import logging
 import sys
 import time
-from pathlib import Path
 import platform
 
 import click
-from prompt_toolkit import PromptSession
-from prompt_toolkit.history import FileHistory
-from prompt_toolkit.auto_suggest import AutoSuggestFromHistory
-from prompt_toolkit import print_formatted_text
-from prompt_toolkit.formatted_text import FormattedText
-from prompt_toolkit.key_binding.bindings.named_commands import (
-    register as prompt_register,
-)
 
 from .client import Client
-from .key_bindings import kb as key_bindings
-from .style import STYLE
+from .bigkeys import BigKeys
+from .latency import DIST_INTERVAL, HISTORY_INTERVAL, LatencyMonitor
 from .config import config, load_config_files
-from .processors import UserInputCommand, UpdateBottomProcessor, PasswordProcessor
-from .bottom import BottomToolbar
-from .utils import timer, exit, convert_formatted_text_to_bytes, parse_url
-from .completers import diceCompleter
-from .lexer import diceLexer
+from .exceptions import NotSupport
+from .renders import RawStream, StreamedRaw, StreamedText
+from .utils import log_preview, parse_url
 from . import __version__
 
 logger = logging.getLogger(__name__)
-
-
-class SkipAuthFileHistory(FileHistory):
-    """Exactlly like FileHistory, but won't save `AUTH` command into history
-    file."""
-
-    def append_string(self, string: str) -> None:
-        if string.lstrip().upper().startswith("AUTH"):
-            return
-        super().append_string(string)
+# size of str chunks written to pager
+PAGER_CHUNK_SIZE = 64 * 1024
+# size of blocks raw output is flushed in
+RAW_BLOCK_SIZE = 1024 * 1024
 
 
 def setup_log():
@@ -74,23 +59,71 @@ def print_help_msg(command):
 
 
 def is_too_tall(text, max_height):
-    if isinstance(text, FormattedText):
-        text = convert_formatted_text_to_bytes(text)
-    lines = len(text.split(b"\n"))
-    return lines > max_height
+    """
+    Whether text has more than ``max_height`` lines, stop counting as soon as
+    it has.
+    """
+    if isinstance(text, StreamedText):
+        return text.is_taller_than(max_height)
+    if isinstance(text, RawStream):
+        lines = 1
+        for block in text:
+            lines += block.count(b"\n")
+            if lines > max_height:
+                return True
+        return False
+    if isinstance(text, bytes):
+        newline = -1
+        for _ in range(max_height):
+            newline = text.find(b"\n", newline + 1)
+            if newline == -1:
+                return False
+        return True
+    lines = 1
+    for _, fragment in text:
+        lines += fragment.count("\n")
+        if lines > max_height:
+            return True
+    return False
+
+
+def pager_chunks(text, chunk_size=PAGER_CHUNK_SIZE):
+    """
+    Yield text as str chunks without colors, for ``click.echo_via_pager``
+    to write them to pager as they come.
+    """
+    if isinstance(text, bytes):
+        decoder = codecs.getincrementaldecoder(config.decode or "utf-8")()
+        view = memoryview(text)
+        for start in range(0, len(view), chunk_size):
+            yield decoder.decode(view[start : start + chunk_size])
+        yield decoder.decode(b"", final=True)
+    elif isinstance(text, (RawStream, StreamedRaw)):
+        decoder = codecs.getincrementaldecoder(config.decode or "utf-8")()
+        for block in text:
+            yield decoder.decode(block)
+        yield decoder.decode(b"", final=True)
+    elif isinstance(text, StreamedText):
+        for chunk in text:
+            yield "".join(fragment for _, fragment in chunk)
+    else:
+        # fragments are small, join them for fewer writes to pager
+        for start in range(0, len(text), 1024):
+            yield "".join(fragment for _, fragment in text[start : start + 1024])
 
 
 def write_result(text, max_height=None):
     """
-    When config.raw set to True, write text(must be bytes in that case)
-    directly to stdout, same if text is bytes.
+    When config.raw set to True, write text(must be bytes, RawStream or
+    StreamedRaw in that case) directly to stdout, same if text is bytes.
 
-    :param text: is_raw: bytes or str, not raw: FormattedText
+    :param text: is_raw: bytes, str, RawStream or StreamedRaw, not raw:
+        FormattedText or StreamedText
     :is_raw: bool
     """
-    logger.info(f"Print result {type(text)}: {text}"[:200])
+    logger.info(f"Print result {type(text)}: {log_preview(text)}")
 
-    # this function only handle bytes or FormattedText
+    # this function only handle bytes, FormattedText or StreamedText
     # if it's str, convert to bytes
     if isinstance(text, str):
         if config.decode:
@@ -100,24 +133,54 @@ def write_result(text, max_height=None):
 
     # using pager if too tall
     if max_height and config.enable_pager and is_too_tall(text, max_height):
-        if isinstance(text, FormattedText):
-            text = convert_formatted_text_to_bytes(text)
+        if not isinstance(text, (bytes, RawStream, StreamedRaw)):
             os.environ["LESS"] = "-SRX"
-        # click.echo_via_pager only accepts str
-        if config.decode:
-            text = text.decode(config.decode)
-        else:
-            text = text.decode()
         # TODO current pager doesn't support colors
-        click.echo_via_pager(text)
+        click.echo_via_pager(pager_chunks(text))
         return
 
     if isinstance(text, bytes):
         sys.stdout.buffer.write(text)
         sys.stdout.write("\n")
+        return
+    if isinstance(text, (RawStream, StreamedRaw)):
+        write_raw_stream(text)
+        return
+
+    # only formatted output needs prompt_toolkit, don't import it for raw
+    from prompt_toolkit import print_formatted_text
+    from .style import STYLE
+
+    if isinstance(text, StreamedText):
+        for chunk in text:
+            print_formatted_text(chunk, end="", style=STYLE)
     else:
         print_formatted_text(text, end="", style=STYLE)
-        print_formatted_text()
+    print_formatted_text()
+
+
+def write_raw_stream(text):
+    """
+    Write blocks of a RawStream as they are rendered, with no joining of the
+    whole reply, flushed in blocks of RAW_BLOCK_SIZE.
+    """
+    sys.stdout.flush()
+    stdout = sys.stdout.buffer
+    raw = getattr(stdout, "raw", None)
+    if raw is None:
+        # not a file, eg. captured
+        stdout.writelines(text)
+        stdout.write(b"\n")
+        return
+    stdout.flush()
+    # a bigger buffer on the same file, detached after, not to close stdout
+    writer = io.BufferedWriter(raw, buffer_size=RAW_BLOCK_SIZE)
+    try:
+        writer.writelines(text)
+        writer.write(b"\n")
+        writer.flush()
+    finally:
+        writer.detach()
 
 
 class Rainbow:
@@ -165,56 +228,6 @@ def prompt_message(client):
     return text
 
 
-def repl(client, session, start_time):
-    command_holder = UserInputCommand()
-    timer(f"First REPL command enter, time cost: {time.time() - start_time}")
-
-    while True:
-        logger.info("↓↓↓↓" * 10)
-        logger.info("REPL waiting for command...")
-
-        try:
-            command = session.prompt(
-                prompt_message(client),
-                bottom_toolbar=(
-                    BottomToolbar(command_holder).render if config.bottom_bar else None
-                ),
-                input_processors=[
-                    UpdateBottomProcessor(command_holder, session),
-                    PasswordProcessor(),
-                ],
-                rprompt=lambda: "<transaction>" if config.transaction else None,
-                key_bindings=key_bindings,
-                enable_suspend=True,
-            )
-
-        except KeyboardInterrupt:
-            logger.warning("KeyboardInterrupt!")
-            continue
-        except EOFError:
-            exit()
-        command = command.strip()
-        logger.info(f"[Command] {command}")
-
-        # blank input
-        if not command:
-            continue
-
-        try:
-            answers = client.send_command(command, session.completer)
-            for answer in answers:
-                write_result(
-                    answer,
-                    # -1 is because 127.0.0.1:6379> takes one line
-                    session.output.get_size().rows - session.reserve_space_for_menu - 1,
-                )
-        # Error with previous command or exception
-        except Exception as e:
-            logger.exception(e)
-            # TODO red error color
-            print("(error)", str(e))
-
-
 RAW_HELP = """
 Use raw formatting for replies (default when STDOUT is not a tty). \
 However, you can use --no-raw to force formatted output even \
@@ -237,6 +250,40 @@ Use Redis URL to indicate connection(Can set with env `dice_URL`), Example:
 SHELL = """Allow to run shell commands, default to True."""
 PAGER_HELP = """Using pager when output is too tall for your window, default to True."""
 VERIFY_SSL_HELP = """Set the TLS certificate verification strategy"""
+PIPE_HELP = """
+Transfer raw Redis protocol (RESP or inline commands) from stdin to server, \
+like `redis-cli --pipe`, for mass insertion.
+"""
+BIGKEYS_HELP = """
+Sample Redis keys looking for keys with many elements (complexity).
+"""
+MEMKEYS_HELP = """
+Sample Redis keys looking for keys consuming a lot of memory.
+"""
+TOP_HELP = """
+Number of biggest keys of every type reported by --bigkeys/--memkeys, default to 5.
+"""
+INTERVAL_HELP = """
+Seconds to sleep after every SCAN batch of --bigkeys/--memkeys, to reduce the load of the server. \
+Seconds of every line of --latency-history (default 15) and --latency-dist (default 1).
+"""
+CURSOR_HELP = """
+SCAN cursor --bigkeys/--memkeys starts from, to resume an interrupted scan.
+"""
+LATENCY_HELP = """
+Enter a special mode continuously sampling latency with PING, show min, max, \
+avg and percentiles in milliseconds.
+"""
+LATENCY_HISTORY_HELP = """
+Like --latency but tracking latency changes over time, a line every -i seconds.
+"""
+LATENCY_DIST_HELP = """
+Show latency as a spectrum, a row every -i seconds, requires a color terminal.
+"""
+PIPELINE_WINDOW_HELP = """
+When stdin is not a tty, send commands in windows of this size before reading \
+the responses, default to 100.
+"""
 
 
 # command line entry here...
@@ -285,6 +332,25 @@ VERIFY_SSL_HELP = """Set the TLS certificate verification strategy"""
     type=click.Choice(["none", "optional", "required"]),
     help=VERIFY_SSL_HELP,
 )
+@click.option("--pipe", default=False, is_flag=True, help=PIPE_HELP)
+@click.option("--bigkeys", default=False, is_flag=True, help=BIGKEYS_HELP)
+@click.option("--memkeys", default=False, is_flag=True, help=MEMKEYS_HELP)
+@click.option("--top", default=5, type=click.IntRange(min=1), help=TOP_HELP)
+@click.option(
+    "-i", "--interval", default=0.0, type=click.FloatRange(min=0), help=INTERVAL_HELP
+)
+@click.option("--cursor", default=0, type=click.IntRange(min=0), help=CURSOR_HELP)
+@click.option("--latency", default=False, is_flag=True, help=LATENCY_HELP)
+@click.option(
+    "--latency-history", default=False, is_flag=True, help=LATENCY_HISTORY_HELP
+)
+@click.option("--latency-dist", default=False, is_flag=True, help=LATENCY_DIST_HELP)
+@click.option(
+    "--pipeline-window",
+    default=None,
+    type=click.IntRange(min=1),
+    help=PIPELINE_WINDOW_HELP,
+)
 @click.option(
     "--prompt",
     default=None,
@@ -316,6 +382,16 @@ def gather_args(
     pager,
     greetings,
     verify_ssl,
+    pipe,
+    bigkeys,
+    memkeys,
+    top,
+    interval,
+    cursor,
+    latency,
+    latency_history,
+    latency_dist,
+    pipeline_window,
     prompt,
 ):
     """
@@ -362,19 +438,12 @@ def gather_args(
         config.verify_ssl = verify_ssl
     if greetings is not None:
         config.greetings = greetings
+    if pipeline_window is not None:
+        config.pipeline_window = pipeline_window
 
     return ctx
 
 
-@prompt_register("edit-and-execute-command")
-def edit_and_execute(event):
-    """Different from the prompt-toolkit default, we want to have a choice not
-    to execute a query after editing, hence validate_and_handle=False."""
-    buff = event.current_buffer
-    # this will prevent running command immediately when exit editor.
-    buff.open_in_editor(validate_and_handle=False)
-
-
 def resolve_dsn(dsn):
     try:
         dsn_uri = config.alias_dsn[dsn]
@@ -449,6 +518,49 @@ def create_client(params):
     )
 
 
+def scan_bigkeys(client, params):
+    scanner = BigKeys(
+        client,
+        memkeys=params["memkeys"],
+        top=params["top"],
+        interval=params["interval"],
+    )
+    try:
+        for progress in scanner.scan(params["cursor"]):
+            write_result(progress)
+    except KeyboardInterrupt:
+        if scanner.cursor is None:
+            print("\nInterrupted.", file=sys.stderr)
+        else:
+            print(
+                f"\nInterrupted, resume with --cursor {scanner.cursor}",
+                file=sys.stderr,
+            )
+    except NotSupport as e:
+        print(str(e), file=sys.stderr)
+        sys.exit(1)
+    write_result(scanner.stats.report())
+
+
+def monitor_latency(client, params):
+    monitor = LatencyMonitor(client)
+    try:
+        if params["latency_dist"]:
+            for row in monitor.latency_dist(params["interval"] or DIST_INTERVAL):
+                write_result(row)
+        elif params["latency_history"]:
+            for line in monitor.latency_history(params["interval"] or HISTORY_INTERVAL):
+                write_result(line)
+        else:
+            for line in monitor.latency():
+                # keep updating the same line
+                sys.stdout.write(f"\r\x1b[2K{line}")
+                sys.stdout.flush()
+    except KeyboardInterrupt:
+        print(file=sys.stderr)
+    write_result(monitor.histogram.report())
+
+
 def main():
     enter_main_time = time.time()  # just for logs
 
@@ -470,11 +582,31 @@ def main():
     # redis client
     client = create_client(ctx.params)
 
+    if ctx.params["pipe"]:
+        try:
+            errors, replies = client.pipe(sys.stdin.buffer)
+        except Exception as e:
+            logger.exception(e)
+            print(str(e), file=sys.stderr)
+            sys.exit(1)
+        print(f"errors: {errors}, replies: {replies}")
+        sys.exit(1 if errors else 0)
+
+    if ctx.params["bigkeys"] or ctx.params["memkeys"]:
+        scan_bigkeys(client, ctx.params)
+        return
+
+    if (
+        ctx.params["latency"]
+        or ctx.params["latency_history"]
+        or ctx.params["latency_dist"]
+    ):
+        monitor_latency(client, ctx.params)
+        return
+
     if not sys.stdin.isatty():
-        for line in sys.stdin.readlines():
-            logger.debug(f"[Command stdin] {line}")
-            for answer in client.send_command(line, None):
-                write_result(answer)
+        for answer in client.send_commands(sys.stdin):
+            write_result(answer)
         return
 
     # no interactive mode, directly run a command
@@ -485,19 +617,10 @@ def main():
         logger.warning("[OVER] command executed, exit...")
         return
 
-    # prompt session
-    session = PromptSession(
-        history=SkipAuthFileHistory(Path(os.path.expanduser(config.history_location))),
-        style=STYLE,
-        auto_suggest=AutoSuggestFromHistory(),
-        complete_while_typing=True,
-        lexer=diceLexer(),
-        completer=diceCompleter(
-            hint=config.newbie_mode, completion_casing=config.completion_casing
-        ),
-        enable_open_in_editor=True,
-        tempfile_suffix=".redis",
-    )
+    # prompt_toolkit, pygments and friends are only imported from here on
+    from .repl import create_session, repl
+
+    session = create_session(client)
 
     # print hello message
     if config.greetings:
@@ -0,0 +1,221 @@
+"""
+Latency monitor, like ``redis-cli --latency``, ``--latency-history`` and
+``--latency-dist``.
+
+PINGs are sent one by one on the client's connection, latencies are recorded
+in an HDR-style histogram: constant memory however long it runs, percentiles
+are precise to about 1%.
+"""
+
+import time
+import logging
+
+from .config import config
+from .utils import FormattedText, convert_formatted_text_to_bytes
+
+logger = logging.getLogger(__name__)
+
+# seconds to sleep between two PINGs, same as redis-cli
+SAMPLE_INTERVAL = 0.01
+# default seconds of every line of --latency-history and --latency-dist
+HISTORY_INTERVAL = 15
+DIST_INTERVAL = 1
+REPORT_PERCENTILES = [50, 75, 90, 95, 99, 99.9, 99.99, 100]
+# upper bounds (milliseconds) of the columns of --latency-dist spectrum
+DIST_RANGES = [0.1, 0.2, 0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, float("inf")]
+# shades of a spectrum cell, by the percentage of samples in its range
+DIST_SHADES = [
+    (0, ".", "bg:#222222"),
+    (5, ":", "bg:#444444"),
+    (10, "-", "bg:#666666"),
+    (25, "=", "bg:#888888"),
+    (50, "#", "bg:#aaaaaa"),
+    (75, "@", "bg:#dddddd #000000"),
+]
+
+
+class LatencyHistogram:
+    """
+    Latencies in microseconds, values are grouped by their power of two, every
+    power is split into ``2 ** SUB_BUCKET_BITS`` linear sub-buckets.
+    """
+
+    SUB_BUCKET_BITS = 7
+
+    def __init__(self):
+        # lowest value of a bucket -> number of values in it
+        self.buckets = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def bucket_of(self, value):
+        shift = max(value.bit_length() - self.SUB_BUCKET_BITS, 0)
+        return (value >> shift) << shift, shift
+
+    def record(self, value, count=1):
+        """Record ``count`` times of ``value``."""
+        value = int(value)
+        bucket, _ = self.bucket_of(value)
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + count
+        self.count += count
+        self.total += value * count
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        """Add values of another histogram, eg. from another process."""
+        for bucket, count in other.buckets.items():
+            self.buckets[bucket] = self.buckets.get(bucket, 0) + count
+        self.count += other.count
+        self.total += other.total
+        for value in (other.min, other.max):
+            if value is not None:
+                self.min = value if self.min is None else min(self.min, value)
+                self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, percentile):
+        """Highest value of the bucket the ``percentile`` falls in."""
+        if not self.count:
+            return 0
+        rank = max(percentile / 100 * self.count, 1)
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                _, shift = self.bucket_of(bucket)
+                return min(bucket + (1 << shift) - 1, self.max)
+        return self.max
+
+    @property
+    def avg(self):
+        return self.total / self.count if self.count else 0
+
+    def summary(self):
+        """One line summary in milliseconds, like redis-cli."""
+        return (
+            f"min: {ms(self.min or 0)}, max: {ms(self.max or 0)},"
+            f" avg: {ms(self.avg)}, p50: {ms(self.percentile(50))},"
+            f" p99: {ms(self.percentile(99))}, p99.9: {ms(self.percentile(99.9))}"
+            f" ({self.count} samples)"
+        )
+
+    def report(self):
+        lines = [
+            [("class:dockey", "-------- latency (ms) --------")],
+            [("", self.summary())],
+            [("class:dockey", f"{'percentile':>10}  {'latency':>10}  {'samples':>10}")],
+        ]
+        for percentile in REPORT_PERCENTILES:
+            lines.append(
+                [
+                    (
+                        "",
+                        f"{percentile:>10}  {ms(self.percentile(percentile)):>10}"
+                        f"  {round(percentile / 100 * self.count):>10}",
+                    )
+                ]
+            )
+        report = []
+        for index, line in enumerate(lines):
+            if index:
+                report.append(("", "\n"))
+            report.extend(line)
+        if config.raw:
+            return convert_formatted_text_to_bytes(report)
+        return FormattedText(report)
+
+
+def ms(microseconds):
+    return f"{microseconds / 1000:.2f}"
+
+
+class LatencyMonitor:
+    def __init__(self, client, sample_interval=SAMPLE_INTERVAL):
+        self.client = client
+        self.sample_interval = sample_interval
+        # all samples since started
+        self.histogram = LatencyHistogram()
+
+    def ping(self):
+        """PING once on the client's connection, return latency in microseconds."""
+        connection = self.client.connection
+        start = time.perf_counter()
+        connection.send_command("PING")
+        connection.read_response()
+        return (time.perf_counter() - start) * 1e6
+
+    def samples(self, duration=None):
+        """
+        PING for ``duration`` seconds, forever if None, yield every latency,
+        they are recorded in ``self.histogram`` too.
+        """
+        end = None if duration is None else time.monotonic() + duration
+        while end is None or time.monotonic() < end:
+            latency = self.ping()
+            self.histogram.record(latency)
+            yield latency
+            time.sleep(self.sample_interval)
+
+    def latency(self):
+        """``--latency``, yield the summary of all samples after every PING."""
+        for _ in self.samples():
+            yield self.histogram.summary()
+
+    def latency_history(self, interval=HISTORY_INTERVAL):
+        """``--latency-history``, yield the summary of every ``interval`` seconds."""
+        while True:
+            histogram = LatencyHistogram()
+            for latency in self.samples(interval):
+                histogram.record(latency)
+            yield f"{histogram.summary()} -- {interval:.2f} seconds range"
+
+    def latency_dist(self, interval=DIST_INTERVAL):
+        """
+        ``--latency-dist``, yield a row of spectrum every ``interval`` seconds,
+        the header with ranges of columns first.
+        """
+        yield self.dist_header()
+        while True:
+            counts = [0] * len(DIST_RANGES)
+            total = 0
+            for latency in self.samples(interval):
+                for column, upper in enumerate(DIST_RANGES):
+                    if latency / 1000 <= upper:
+                        counts[column] += 1
+                        break
+                total += 1
+            yield self.dist_row(counts, total)
+
+    def dist_header(self):
+        labels = [f"<{upper:g}" for upper in DIST_RANGES[:-1]] + [">"]
+        text = [
+            ("class:dockey", "latency (ms) of every column, from left to right: "),
+            ("", " ".join(labels)),
+            ("", "\n"),
+            ("class:dockey", "percentage of samples: "),
+        ]
+        for percentage, char, style in DIST_SHADES:
+            text.extend([(style, char), ("", f" >{percentage}% ")])
+        return self._formatted(text)
+
+    def dist_row(self, counts, total):
+        text = [("class:time", time.strftime("%H:%M:%S ")), ("", "|")]
+        for count in counts:
+            percentage = count * 100 / total if total else 0
+            char, style = " ", ""
+            for lowest, shade_char, shade_style in DIST_SHADES:
+                if count and percentage > lowest:
+                    char, style = shade_char, shade_style
+            # two chars wide, easier to see
+            text.append((style, char * 2))
+        text.extend([("", "|"), ("", f" {total} samples")])
+        return self._formatted(text)
+
+    def _formatted(self, text):
+        if config.raw:
+            return convert_formatted_text_to_bytes(text)
+        return FormattedText(text)
@@ -1,3 +1,4 @@
+from functools import lru_cache
 from typing import Callable, Hashable
 
 from prompt_toolkit.contrib.regular_languages.lexer import GrammarLexer
@@ -82,20 +83,25 @@ class diceLexer(Lexer):
 
     def __init__(self) -> None:
         self._current_lexer = self._dummy = SimpleLexer()
+        self.lexer_mapping = get_lexer_mapping()
+        # GrammarLexer is stateless, cache one for each command
+        self.get_grammar_lexer = lru_cache(maxsize=256)(self._create_grammar_lexer)
+
+    def _create_grammar_lexer(self, command):
+        # compile grammar for this command
+        grammar = get_command_grammar(command)
+        return GrammarLexer(grammar, lexers=self.lexer_mapping)
 
     def lex_document(self, document: Document) -> Callable[[int], StyleAndTextTuples]:
         input_text = document.text
 
         try:
             command, _ = split_command_args(input_text)
-            # compile grammar for this command
-            grammar = get_command_grammar(command)
-            self._current_lexer = GrammarLexer(grammar, lexers=get_lexer_mapping())
+            self._current_lexer = self.get_grammar_lexer(command)
         except (InvalidArguments, AmbiguousCommand):
             self._current_lexer = self._dummy
 
         return self._current_lexer.lex_document(document)
 
     def invalidation_hash(self) -> Hashable:
-        lexer = self.get_lexer() or self._dummy
-        return id(lexer)
+        return id(self._current_lexer)
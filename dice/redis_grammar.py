@@ -6,11 +6,29 @@ regex.
 command_nodex: x means node?
 command_keys: ends with s means there can be multiple <key>
 """
+import os
+import re
+import json
+import hashlib
 import logging
 from functools import lru_cache
 
-from prompt_toolkit.contrib.regular_languages.compiler import compile
+import prompt_toolkit
+from prompt_toolkit.contrib.regular_languages.compiler import Match, compile
+from prompt_toolkit.contrib.regular_languages.regex_parser import (
+    AnyNode,
+    Lookahead,
+    NodeSequence,
+    Regex,
+    Repeat,
+    Variable,
+    parse_regex,
+    tokenize_regex,
+)
+from . import __version__
 from .commands import command2syntax
+from .config import config
+from .utils import timer
 
 logger = logging.getLogger(__name__)
 CONST = {
@@ -366,6 +384,7 @@ EXAT_CONST = rf"(?P<exat_const>{c('exat_const')})"
 WITHVALUES_CONST = rf"(?P<withvalues_const>{c('withvalues_const')})"
 
 command_grammar = compile(COMMAND)
+timer("[Grammar] command_grammar compiled.")
 
 # Here are the core grammars, those are tokens after ``command``.
 # E.g. SET command's syntax is "SET key value"
@@ -464,6 +483,7 @@ GRAMMAR = {
     "command_key_key_any": rf"\s+ {KEY} \s+ {KEY} \s+ {ANY} \s*",
     "command_key_newkey_member": rf"\s+ {KEY} \s+ {NEWKEY} \s+ {MEMBER} \s*",
     "command_key_count_x": rf"\s+ {KEY} (\s+ {COUNT})? \s*",
+    "command_key_countx": rf"\s+ {KEY} (\s+ {COUNT_CONST} \s+ {COUNT})? \s*",
     "command_key_min_max": rf"\s+ {KEY} \s+ {MIN} \s+ {MAX} \s*",
     "command_key_condition_changed_incr_score_members": rf"""
         \s+ {KEY} (\s+ {CONDITION})?
@@ -485,6 +505,11 @@ GRAMMAR = {
         (\s+ {COUNT_CONST} \s+ {COUNT})? (\s+ {TYPE_CONST} \s+ {TYPE})? \s*""",
     "command_key_cursor_match_pattern_count": rf"""\s+ {KEY}
         \s+ {CURSOR} (\s+ {MATCH} \s+ {PATTERN})? (\s+ {COUNT_CONST} \s+ {COUNT})? \s*""",
+    "command_match_pattern_count_type": rf"""
+        (\s+ {MATCH} \s+ {PATTERN})?
+        (\s+ {COUNT_CONST} \s+ {COUNT})? (\s+ {TYPE_CONST} \s+ {TYPE})? \s*""",
+    "command_key_match_pattern_count": rf"""\s+ {KEY}
+        (\s+ {MATCH} \s+ {PATTERN})? (\s+ {COUNT_CONST} \s+ {COUNT})? \s*""",
     "command_key_fields": rf"\s+ {KEY} \s+ {FIELDS} \s*",
     "command_key_field": rf"\s+ {KEY} \s+ {FIELD} \s*",
     "command_key_field_delta": rf"\s+ {KEY} \s+ {FIELD} \s+ {DELTA} \s*",
@@ -671,6 +696,254 @@ GRAMMAR = {
 pipeline = r"(?P<shellcommand>\|.*)?"
 
 
+# prompt_toolkit's Match takes the input unmatched by a prefix pattern from
+# the group with this name
+INVALID_TRAILING_GROUP = "invalid_trailing"
+# written in grammar cache directories, only those are removed as stale caches
+GRAMMAR_CACHE_MARK = "dice-grammar-cache"
+
+
+class GrammarRegexes:
+    """
+    Regex sources of a grammar syntax, built from its parse tree the way
+    prompt_toolkit's ``compile`` does: ``pattern`` for full input,
+    ``prefix_patterns`` for partial input, and ``groups`` maps named groups
+    to variable names. They are plain strings, to be saved in grammar cache.
+    """
+
+    def __init__(self, syntax):
+        root_node = parse_regex(tokenize_regex(syntax))
+        self.groups = {}
+        self.pattern = f"^{self.transform(root_node)}$"
+        self.prefix_patterns = [
+            f"^(?:{regex})$" for regex in self.transform_prefix(root_node)
+        ]
+
+    def group_name(self, node):
+        name = f"n{len(self.groups)}"
+        self.groups[name] = node.varname
+        return name
+
+    def transform(self, node):
+        if isinstance(node, AnyNode):
+            return "(?:{})".format("|".join(self.transform(c) for c in node.children))
+        if isinstance(node, NodeSequence):
+            return "".join(self.transform(c) for c in node.children)
+        if isinstance(node, Regex):
+            return node.regex
+        if isinstance(node, Lookahead):
+            before = "(?!" if node.negative else "(="
+            return before + self.transform(node.childnode) + ")"
+        if isinstance(node, Variable):
+            return f"(?P<{self.group_name(node)}>{self.transform(node.childnode)})"
+        if isinstance(node, Repeat):
+            if node.max_repeat is None:
+                repeat_sign = "*" if node.min_repeat == 0 else "+"
+            else:
+                repeat_sign = f"{{{node.min_repeat},{node.max_repeat}}}"
+            lazy = "" if node.greedy else "?"
+            return f"(?:{self.transform(node.childnode)}){repeat_sign}{lazy}"
+        raise TypeError(f"Got {node!r}")
+
+    def transform_prefix(self, node):
+        """
+        Yield patterns matching prefixes of ``node``, one for each path ends
+        with a variable, so completions are found for all of them.
+        """
+        if isinstance(node, AnyNode):
+            plain = []
+            for child in node.children:
+                if has_variable(child):
+                    yield from self.transform_prefix(child)
+                else:
+                    plain.extend(self.transform_prefix(child))
+            if plain:
+                yield "|".join(plain)
+        elif isinstance(node, NodeSequence):
+            complete = [self.transform(c) for c in node.children]
+            prefixes = [list(self.transform_prefix(c)) for c in node.children]
+            with_variable = [has_variable(c) for c in node.children]
+            # prefixes end with a variable
+            for index, child_prefixes in enumerate(prefixes):
+                if with_variable[index]:
+                    for regex in child_prefixes:
+                        yield "".join(complete[:index]) + regex
+            # (complete1 (complete2 (complete3 | partial3) | partial2) | partial1)
+            if not all(with_variable):
+                result = []
+                for regex in complete:
+                    result.append(f"(?:{regex}")
+                for index in reversed(range(len(node.children))):
+                    if with_variable[index]:
+                        result.append(")")
+                    else:
+                        (regex,) = prefixes[index]
+                        result.append(f"|(?:{regex}))")
+                yield "".join(result)
+        elif isinstance(node, Regex):
+            yield f"(?:{node.regex})?"
+        elif isinstance(node, Lookahead):
+            if not node.negative:
+                raise TypeError("Positive lookahead is not supported.")
+            yield f"(?!{self.transform(node.childnode)})"
+        elif isinstance(node, Variable):
+            for regex in self.transform_prefix(node.childnode):
+                yield f"(?P<{self.group_name(node)}>{regex})"
+        elif isinstance(node, Repeat):
+            complete = self.transform(node.childnode)
+            if node.max_repeat == 1:
+                yield from self.transform_prefix(node.childnode)
+                return
+            repeat_sign = "*" if not node.max_repeat else f"{{,{node.max_repeat - 1}}}"
+            lazy = "" if node.greedy else "?"
+            for regex in self.transform_prefix(node.childnode):
+                yield f"(?:{complete}){repeat_sign}{lazy}{regex}"
+        else:
+            raise TypeError(f"Got {node!r}")
+
+
+def has_variable(node):
+    if isinstance(node, Variable):
+        return True
+    if isinstance(node, (Lookahead, Repeat)):
+        return has_variable(node.childnode)
+    if isinstance(node, (NodeSequence, AnyNode)):
+        return any(has_variable(child) for child in node.children)
+    return False
+
+
+class CachedGrammar:
+    """
+    A grammar rebuilt from the ``GrammarRegexes`` saved in grammar cache,
+    skips parsing and expanding the grammar, only compiles the regexes.
+    Matches like prompt_toolkit's compiled grammar, returns its ``Match``.
+    """
+
+    def __init__(self, pattern, prefix_patterns, groups):
+        flags = re.DOTALL
+        self.groups = groups
+        self.regex = re.compile(pattern, flags)
+        self.prefix_regexes = [re.compile(p, flags) for p in prefix_patterns]
+        # input can't be matched is captured at the end, for highlighting
+        self.trailing_input_regexes = [
+            re.compile(rf"(?:{p.rstrip('$')})(?P<{INVALID_TRAILING_GROUP}>.*?)$", flags)
+            for p in prefix_patterns
+        ]
+
+    def escape(self, varname, value):
+        return value
+
+    def unescape(self, varname, value):
+        return value
+
+    def match(self, string):
+        m = self.regex.match(string)
+        if m:
+            return Match(string, [(self.regex, m)], self.groups, {})
+        return None
+
+    def match_prefix(self, string):
+        for regexes in (self.prefix_regexes, self.trailing_input_regexes):
+            matches = [(r, m) for r in regexes for m in [r.match(string)] if m]
+            if matches:
+                return Match(string, matches, self.groups, {})
+        return None
+
+
+@lru_cache(maxsize=1)
+def grammar_cache_dir():
+    """
+    Grammar cache directory, versioned by dice version and the digest of
+    grammars, return None if the cache is disabled.
+    """
+    if not config.grammar_cache_location:
+        return None
+    grammars = json.dumps(
+        [GRAMMAR, COMMAND, pipeline, prompt_toolkit.__version__], sort_keys=True
+    )
+    digest = hashlib.sha1(grammars.encode()).hexdigest()[:12]
+    return os.path.join(
+        os.path.expanduser(config.grammar_cache_location),
+        f"grammar-{__version__}-{digest}",
+    )
+
+
+def _grammar_cache_file(syntax):
+    cache_dir = grammar_cache_dir()
+    if cache_dir is None:
+        return None
+    return os.path.join(cache_dir, hashlib.sha1(syntax.encode()).hexdigest())
+
+
+def load_cached_grammar(syntax):
+    cache_file = _grammar_cache_file(syntax)
+    if cache_file is None or not os.path.exists(cache_file):
+        return None
+    try:
+        with open(cache_file) as f:
+            cached = json.load(f)
+        return CachedGrammar(
+            cached["pattern"], cached["prefix_patterns"], cached["groups"]
+        )
+    except Exception as e:
+        logger.warning(f"[Grammar] can not load grammar cache {cache_file}: {e}")
+        return None
+
+
+def _remove_stale_grammar_caches(cache_dir):
+    """
+    Remove grammar caches of other versions next to ``cache_dir``, only
+    directories marked by dice, and only the files dice wrote in them.
+    """
+    parent = os.path.dirname(cache_dir)
+    if not os.path.isdir(parent):
+        return
+    for name in os.listdir(parent):
+        stale_dir = os.path.join(parent, name)
+        if not re.fullmatch(r"grammar-.+-[0-9a-f]{12}", name) or not os.path.isfile(
+            os.path.join(stale_dir, GRAMMAR_CACHE_MARK)
+        ):
+            continue
+        for file_name in os.listdir(stale_dir):
+            if file_name == GRAMMAR_CACHE_MARK or re.fullmatch(
+                r"[0-9a-f]{40}", file_name
+            ):
+                os.remove(os.path.join(stale_dir, file_name))
+        try:
+            os.rmdir(stale_dir)
+        except OSError as e:
+            logger.warning(f"[Grammar] can not remove grammar cache {stale_dir}: {e}")
+
+
+def save_cached_grammar(syntax):
+    """
+    Save the regex sources of the syntax, written to a temp file and
+    renamed, so a half written cache file can never be loaded.
+    Grammar caches of other versions are removed.
+    """
+    cache_file = _grammar_cache_file(syntax)
+    if cache_file is None:
+        return
+    cache_dir = os.path.dirname(cache_file)
+    try:
+        if not os.path.isdir(cache_dir):
+            _remove_stale_grammar_caches(cache_dir)
+            os.makedirs(cache_dir, exist_ok=True)
+            open(os.path.join(cache_dir, GRAMMAR_CACHE_MARK), "w").close()
+        regexes = GrammarRegexes(syntax)
+        cached = {
+            "pattern": regexes.pattern,
+            "prefix_patterns": regexes.prefix_patterns,
+            "groups": regexes.groups,
+        }
+        tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(cached, f)
+        os.replace(tmp_file, cache_file)
+    except Exception as e:
+        logger.warning(f"[Grammar] can not save grammar cache {cache_file}: {e}")
+
+
 @lru_cache(maxsize=256)
 def get_command_grammar(command):
     """
@@ -693,4 +966,35 @@ def get_command_grammar(command):
 
     logger.info(f"syxtax: {syntax}")
 
-    return compile(syntax)
+    timer(f"[Grammar] Start compiling grammar for {command}...")
+    grammar = load_cached_grammar(syntax)
+    if grammar is not None:
+        timer(f"[Grammar] {command} grammar loaded from cache.")
+        return grammar
+
+    grammar = compile(syntax)
+    timer(f"[Grammar] {command} grammar compiled.")
+    save_cached_grammar(syntax)
+    return grammar
+
+
+@lru_cache(maxsize=None)
+def _syntax_variables(syntax):
+    return frozenset(re.findall(r"\(\?P<(\w+)>", syntax))
+
+
+def get_command_variables(command):
+    """
+    Variable names in the grammar of ``command``, like key and member, read
+    from the grammar definitions, the grammar is not compiled.
+
+    :param command: command name like ``get_command_grammar``, or None for
+        the grammar of input not a command.
+    """
+    syntax = None
+    if command is not None:
+        syntax = GRAMMAR.get(command2syntax[" ".join(command.split()).upper()])
+    # same as get_command_grammar, commands without syntax use command_grammar
+    if syntax is None:
+        return _syntax_variables(COMMAND)
+    return _syntax_variables(syntax + pipeline) | {"command"}
@@ -7,19 +7,92 @@ func(redis-response) -> formatted result(str)
 
 import logging
 import time
+from itertools import chain
 from packaging.version import parse as version_parse
 
-from prompt_toolkit.formatted_text import FormattedText
-
 from .commands import command2callback
 from .config import config
-from .utils import double_quotes, ensure_str, nativestr
+from .utils import FormattedText, double_quotes, ensure_str, nativestr
 
 logger = logging.getLogger(__name__)
 NEWLINE_TUPLE = ("", "\n")
 NIL_TUPLE = ("class:type", "(nil)")
 NIL = FormattedText([NIL_TUPLE])
 EMPTY_LIST = FormattedText([("class:type", "(empty list or set)")])
+# arrays longer than this are rendered lazily, STREAM_CHUNK_SIZE items a time
+STREAM_THRESHOLD = 10000
+STREAM_CHUNK_SIZE = 1000
+# raw mode joins items of long arrays in blocks of this size
+RAW_BLOCK_ITEMS = 4096
+
+
+class StreamedText:
+    """
+    A rendered reply too big to be held at once, iterate it to get the
+    FormattedText chunks, they are rendered on demand and can be iterated only
+    once. ``height`` is the number of lines, known before rendering, or None
+    if it's only known once rendered, see ``is_taller_than``.
+    """
+
+    def __init__(self, chunks, height=None):
+        self.chunks = iter(chunks)
+        self.height = height
+        # chunks rendered ahead by ``is_taller_than``
+        self.rendered = []
+
+    def __iter__(self):
+        return chain(self.rendered, self.chunks)
+
+    @staticmethod
+    def count_newlines(chunk):
+        return sum(fragment.count("\n") for _, fragment in chunk)
+
+    def is_taller_than(self, max_height):
+        """
+        Whether it has more than ``max_height`` lines, if the height is not
+        known, chunks are rendered ahead until it has, and kept to be iterated.
+        """
+        if self.height is not None:
+            return self.height > max_height
+        lines = 1 + sum(self.count_newlines(chunk) for chunk in self.rendered)
+        for chunk in self.chunks:
+            self.rendered.append(chunk)
+            lines += self.count_newlines(chunk)
+            if lines > max_height:
+                return True
+        self.height = lines
+        return False
+
+    def __repr__(self):
+        return f"<{type(self).__name__} height={self.height}>"
+
+
+class StreamedRaw(StreamedText):
+    """
+    Like StreamedText, in raw mode, its chunks are bytes blocks to be written
+    as they are rendered.
+    """
+
+    @staticmethod
+    def count_newlines(chunk):
+        return chunk.count(b"\n")
+
+
+class RawStream:
+    """
+    A long array reply in raw mode, iterate it to get its bytes in blocks, to
+    be written with ``writelines`` instead of being joined into one bytes.
+    Can be iterated more than once.
+    """
+
+    def __init__(self, items):
+        self.items = items
+
+    def __iter__(self):
+        return _iter_raw_list(self.items)
+
+    def __repr__(self):
+        return f"<RawStream items={len(self.items)}>"
 
 
 class OutputRender:
@@ -60,6 +133,8 @@ class OutputRender:
         if isinstance(value, str):
             return value.encode()
         if isinstance(value, list):
+            if len(value) > STREAM_THRESHOLD:
+                return RawStream(value)
             return _render_raw_list(value)
 
     @staticmethod
@@ -127,11 +202,15 @@ class OutputRender:
         return FormattedText(rendered)
 
     @staticmethod
-    def render_list(text, style="class:string"):
+    def render_list(text, style="class:string", start=0, index_width=None):
         """
         Render callback for redis Array Reply
         Note: Cloud be null in it.
+
+        ``start`` and ``index_width`` are for rendering a part of a long list.
         """
+        if len(text) > STREAM_THRESHOLD:
+            return _stream_list(text, style, start, index_width)
         str_items = []
         for item in text:
             if item is None:
@@ -140,7 +219,9 @@ class OutputRender:
                 str_item = ensure_str(item)
                 double_quoted = double_quotes(str_item)
                 str_items.append(double_quoted)
-        rendered = _render_list(text, str_items, style)
+        rendered = _render_list(
+            text, str_items, style, start=start, index_width=index_width
+        )
         return FormattedText(rendered)
 
     @staticmethod
@@ -192,9 +273,15 @@ class OutputRender:
         return FormattedText([("class:queued", text)])
 
     @staticmethod
-    def render_members(items):
-        if not config.withscores:
-            return OutputRender.render_list(items, "class:member")
+    def render_members(items, withscores=None, start=0, index_width=None):
+        """
+        ``withscores`` defaults to ``config.withscores``, ``start`` and
+        ``index_width`` are for rendering a part of a long list.
+        """
+        if withscores is None:
+            withscores = config.withscores
+        if not withscores:
+            return OutputRender.render_list(items, "class:member", start, index_width)
 
         if not items:
             return EMPTY_LIST
@@ -206,16 +293,17 @@ class OutputRender:
         logger.debug(f"[SCORES] {scores}")
         # render display
         double_quoted = double_quotes(members)
-        index_width = len(str(len(double_quoted)))
+        index_width = index_width or len(str(len(double_quoted)))
         score_width = max(len(score) for score in scores)
         rendered = []
-        for index, item in enumerate(double_quoted):
+        for offset, item in enumerate(double_quoted):
+            index = start + offset
             index_const_width = f"{index+1:{index_width}})"
             rendered.append(("", index_const_width))
             # add a space between index and member
             rendered.append(("", " "))
             # add score
-            rendered.append(("class:integer", f"{scores[index]:{score_width}} "))
+            rendered.append(("class:integer", f"{scores[offset]:{score_width}} "))
             # add member
             if item is None:
                 rendered.append(NIL_TUPLE)
@@ -223,38 +311,38 @@ class OutputRender:
                 rendered.append(("class:member", item))
 
             # add a newline for eachline
-            if index + 1 < len(double_quoted):
+            if offset + 1 < len(double_quoted):
                 rendered.append(NEWLINE_TUPLE)
         return FormattedText(rendered)
 
     @staticmethod
-    def render_hash_pairs(response):
-        # render hash pairs
+    def render_hash_pairs(response, start=0, index_width=None):
+        # render hash pairs, from the ``start`` th field of a long hash
         if not response:
             return EMPTY_LIST
         str_items = ensure_str(response)
         fields = str_items[0::2]
         values = str_items[1::2]
         # render display
-        index_width = len(str(len(fields)))
+        index_width = index_width or len(str(len(fields)))
         values_quoted = double_quotes(values)
         fields_quoted = double_quotes(fields)
         rendered = []
-        for index, item in enumerate(fields_quoted):
-            index_const_width = f"{index+1:{index_width}})"
+        for offset, item in enumerate(fields_quoted):
+            index_const_width = f"{start+offset+1:{index_width}})"
             rendered.append(("", index_const_width))
             rendered.append(("", " "))
             rendered.append(("class:field", item))
             rendered.append(NEWLINE_TUPLE)
             rendered.append(("", " " * (len(index_const_width) + 1)))
-            value = values_quoted[index]
+            value = values_quoted[offset]
             if value is None:
                 rendered.append(NIL_TUPLE)
             else:
                 rendered.append(("class:string", value))
 
             # add a newline for eachline
-            if index + 1 < len(fields):
+            if offset + 1 < len(fields):
                 rendered.append(NEWLINE_TUPLE)
         return FormattedText(rendered)
 
@@ -349,6 +437,9 @@ class OutputRender:
 
 
 def _render_raw_list(bytes_items):
+    if set(map(type, bytes_items)) == {bytes}:
+        # the common case, joined in C without checking items one by one
+        return b"\n".join(bytes_items)
     flatten_items = []
     for item in bytes_items:
         if item is None:
@@ -364,16 +455,32 @@ def _render_raw_list(bytes_items):
     return b"\n".join(flatten_items)
 
 
-def _render_list(byte_items, str_items, style=None, pre_space=0):
+def _iter_raw_list(items):
+    """
+    Yield ``_render_raw_list(items)`` in blocks of RAW_BLOCK_ITEMS items, only
+    one block is held at a time.
+    """
+    for start in range(0, len(items), RAW_BLOCK_ITEMS):
+        if start:
+            yield b"\n"
+        yield _render_raw_list(items[start : start + RAW_BLOCK_ITEMS])
+
+
+def _render_list(
+    byte_items, str_items, style=None, pre_space=0, start=0, index_width=None
+):
     """Complute the newline/number-width/lineno,
     render list to FormattedText
+
+    ``start`` and ``index_width`` are for rendering a part of a long list.
     """
     if not str_items:
         return EMPTY_LIST
 
-    index_width = len(str(len(str_items)))
+    index_width = index_width or len(str(len(str_items)))
+    end = start + len(str_items)
     rendered = []
-    for index, item in enumerate(str_items):
+    for index, item in enumerate(str_items, start):
         indent_spaces = (index + 1 != 1) * pre_space * " "
         if indent_spaces:
             rendered.append(("", indent_spaces))  # add a space before item
@@ -392,11 +499,47 @@ def _render_list(byte_items, str_items, style=None, pre_space=0):
             rendered.extend(sublist)
 
         # add a newline for eachline
-        if index + 1 < len(str_items):
+        if index + 1 < end:
             rendered.append(NEWLINE_TUPLE)
     return rendered
 
 
+def _list_height(items):
+    """Number of lines of a rendered list, without rendering it."""
+    height = 0
+    for item in items:
+        if isinstance(item, list) and item:
+            height += _list_height(item)
+        else:
+            height += 1
+    return height
+
+
+def _stream_list(items, style, start=0, index_width=None):
+    if index_width is None:
+        index_width = len(str(start + len(items)))
+
+    def chunks():
+        for offset in range(0, len(items), STREAM_CHUNK_SIZE):
+            chunk = items[offset : offset + STREAM_CHUNK_SIZE]
+            str_items = [
+                None if item is None else double_quotes(ensure_str(item))
+                for item in chunk
+            ]
+            rendered = _render_list(
+                chunk,
+                str_items,
+                style,
+                start=start + offset,
+                index_width=index_width,
+            )
+            if offset + STREAM_CHUNK_SIZE < len(items):
+                rendered.append(NEWLINE_TUPLE)
+            yield FormattedText(rendered)
+
+    return StreamedText(chunks(), _list_height(items))
+
+
 def _render_scan(render_response, response):
     cursor, responses = response
 
@@ -406,6 +549,10 @@ def _render_scan(render_response, response):
         ("", "\n"),
     ]
     rendered_keys = render_response(responses)
+    if isinstance(rendered_keys, StreamedText):
+        return StreamedText(
+            chain([FormattedText(rendered)], rendered_keys), rendered_keys.height + 1
+        )
     return FormattedText(rendered + rendered_keys)
 
 
@@ -428,3 +575,22 @@ def _render_pair(pairs, indent):
 
 # TODO
 # special list render, bzpopmax, key-value pair
+
+
+def stream_pages(pages, raw=False):
+    """
+    Join rendered pages of one reply, separated by newlines, into one
+    StreamedRaw in raw mode or one StreamedText. Pages are rendered as it is
+    iterated, so a long reply is written, or paged, as a whole.
+    """
+
+    def chunks():
+        for index, page in enumerate(pages):
+            if index:
+                yield b"\n" if raw else FormattedText([NEWLINE_TUPLE])
+            if isinstance(page, (StreamedText, RawStream)):
+                yield from page
+            else:
+                yield page
+
+    return StreamedRaw(chunks()) if raw else StreamedText(chunks())
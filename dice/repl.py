@@ -0,0 +1,170 @@
+"""
+Interactive mode.
+
+Everything here needs prompt_toolkit, so it lives apart from `dice.entry`,
+which should stay cheap to import for one-shot commands and piped stdin.
+"""
+
+import os
+import time
+import atexit
+import logging
+import itertools
+import threading
+from functools import partial
+from pathlib import Path
+
+from prompt_toolkit import PromptSession
+from prompt_toolkit.history import FileHistory
+from prompt_toolkit.auto_suggest import AutoSuggestFromHistory
+from prompt_toolkit.key_binding.bindings.named_commands import (
+    register as prompt_register,
+)
+
+from .key_bindings import kb as key_bindings
+from .style import STYLE
+from .config import config
+from .processors import UserInputCommand, UpdateBottomProcessor, PasswordProcessor
+from .bottom import BottomToolbar
+from .utils import timer, exit
+from .completers import diceCompleter, VocabularyStore
+from .lexer import diceLexer
+from .entry import prompt_message, write_result
+
+logger = logging.getLogger(__name__)
+
+# completers are seeded from this many latest history entries
+HISTORY_SEED_LIMIT = 5000
+# history entries matched at once, the REPL can update completers between
+HISTORY_SEED_BATCH = 200
+
+
+class SkipAuthFileHistory(FileHistory):
+    """Exactlly like FileHistory, but won't save `AUTH` command into history
+    file."""
+
+    def append_string(self, string: str) -> None:
+        if string.lstrip().upper().startswith("AUTH"):
+            return
+        super().append_string(string)
+
+
+@prompt_register("edit-and-execute-command")
+def edit_and_execute(event):
+    """Different from the prompt-toolkit default, we want to have a choice not
+    to execute a query after editing, hence validate_and_handle=False."""
+    buff = event.current_buffer
+    # this will prevent running command immediately when exit editor.
+    buff.open_in_editor(validate_and_handle=False)
+
+
+def seed_completer(completer, history, limit=HISTORY_SEED_LIMIT):
+    """
+    Touch keys, members and fields of the latest ``limit`` history entries
+    into ``completer``, oldest first, so the latest one is the most recently
+    used, in batches of ``HISTORY_SEED_BATCH``.
+    """
+    start = time.time()
+    try:
+        commands = list(itertools.islice(history.load_history_strings(), limit))
+        commands.reverse()
+        for index in range(0, len(commands), HISTORY_SEED_BATCH):
+            completer.update_completer_for_inputs(
+                commands[index : index + HISTORY_SEED_BATCH]
+            )
+    except Exception as e:
+        # in a thread, don't mess up the prompt
+        logger.exception(e)
+        return
+    logger.info(
+        f"[Completer] seeded from {len(commands)} history entries,"
+        f" time cost: {time.time() - start:.3f}"
+    )
+
+
+def start_seeding_completer(session):
+    """Seed completers from history in a thread, not to delay the prompt."""
+    threading.Thread(
+        target=seed_completer,
+        args=(session.completer, session.history),
+        name="dice-seed-completer",
+        daemon=True,
+    ).start()
+
+
+def create_session(client=None):
+    completer = diceCompleter(
+        hint=config.newbie_mode, completion_casing=config.completion_casing
+    )
+    if client is not None:
+        if config.server_key_completion:
+            completer.key_completer.scan_keys = client.scan_first_keys
+        completer.store = VocabularyStore.for_client(client)
+    return PromptSession(
+        history=SkipAuthFileHistory(Path(os.path.expanduser(config.history_location))),
+        style=STYLE,
+        auto_suggest=AutoSuggestFromHistory(),
+        complete_while_typing=True,
+        lexer=diceLexer(),
+        completer=completer,
+        # key completion may wait for the server
+        complete_in_thread=True,
+        enable_open_in_editor=True,
+        tempfile_suffix=".redis",
+    )
+
+
+def repl(client, session, start_time):
+    command_holder = UserInputCommand()
+    timer(f"First REPL command enter, time cost: {time.time() - start_time}")
+    # REPL exits by sys.exit() from many places
+    atexit.register(session.completer.save_vocabularies)
+    # seed completers after the first prompt shows up
+    seed_on_prompt = partial(start_seeding_completer, session)
+
+    while True:
+        logger.info("↓↓↓↓" * 10)
+        logger.info("REPL waiting for command...")
+
+        pre_run, seed_on_prompt = seed_on_prompt, None
+        try:
+            command = session.prompt(
+                prompt_message(client),
+                bottom_toolbar=(
+                    BottomToolbar(command_holder).render if config.bottom_bar else None
+                ),
+                input_processors=[
+                    UpdateBottomProcessor(command_holder, session),
+                    PasswordProcessor(),
+                ],
+                rprompt=lambda: "<transaction>" if config.transaction else None,
+                key_bindings=key_bindings,
+                enable_suspend=True,
+                pre_run=pre_run,
+            )
+
+        except KeyboardInterrupt:
+            logger.warning("KeyboardInterrupt!")
+            continue
+        except EOFError:
+            exit()
+        command = command.strip()
+        logger.info(f"[Command] {command}")
+
+        # blank input
+        if not command:
+            continue
+
+        try:
+            answers = client.send_command(command, session.completer)
+            for answer in answers:
+                write_result(
+                    answer,
+                    # -1 is because 127.0.0.1:6379> takes one line
+                    session.output.get_size().rows - session.reserve_space_for_menu - 1,
+                )
+        # Error with previous command or exception
+        except Exception as e:
+            logger.exception(e)
+            # TODO red error color
+            print("(error)", str(e))
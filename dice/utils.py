@@ -2,11 +2,9 @@ import re
 import sys
 import time
 import logging
-from collections import namedtuple
+from collections import deque, namedtuple
 from urllib.parse import parse_qs, unquote, urlparse
 
-from prompt_toolkit.formatted_text import FormattedText
-
 from dice.exceptions import InvalidArguments
 
 logger = logging.getLogger(__name__)
@@ -17,6 +15,22 @@ separator = re.compile(r"\s")
 logger.debug(f"[timer] start on {_last_timer}")
 
 
+class FormattedText(list):
+    """
+    A list of (style, text) tuples, same as prompt_toolkit's FormattedText.
+
+    Renders use this one so that dice can run a command and print raw
+    output without importing prompt_toolkit, which is slow to import.
+    prompt_toolkit accepts it anywhere it accepts formatted text.
+    """
+
+    def __pt_formatted_text__(self):
+        return self
+
+    def __repr__(self):
+        return f"FormattedText({super().__repr__()})"
+
+
 def timer(title):
     global _last_timer
     global _timer_counter
@@ -232,6 +246,11 @@ def ensure_str(origin, decode=None):
         raise Exception(f"Unknown type: {type(origin)}, origin: {origin}")
 
 
+def escape_glob(text):
+    """Escape glob-style special chars of text, for ``SCAN``'s MATCH."""
+    return re.sub(r"([*?\[\]\\])", r"\\\1", text)
+
+
 def double_quotes(unquoted):
     """
     Display String like redis-cli.
@@ -256,6 +275,42 @@ def exit():
     sys.exit()
 
 
+class RecentSet:
+    """
+    A set remembering only the last ``size`` items added, memory is bounded
+    no matter how many items pass through it.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.items = set()
+        self.order = deque()
+
+    def __contains__(self, item):
+        return item in self.items
+
+    def __len__(self):
+        return len(self.items)
+
+    def add(self, item):
+        if item in self.items:
+            return
+        self.items.add(item)
+        self.order.append(item)
+        if len(self.order) > self.size:
+            self.items.discard(self.order.popleft())
+
+
+def log_preview(value, limit=200):
+    """
+    Cut long bytes, str or list before formatting them for logs, formatting
+    a huge reply is slow even when logging is disabled.
+    """
+    if isinstance(value, (bytes, str, list)) and len(value) > limit:
+        return f"{value[:limit]}...({len(value)} in total)"
+    return value
+
+
 def convert_formatted_text_to_bytes(formatted_text):
     to_render = [text for style, text in formatted_text]
     return "".join(to_render).encode()
@@ -0,0 +1,62 @@
+#!python3
+
+"""
+Build dice/data/commands_index.json from dice/data/commands.json.
+
+The index maps every command to the byte range of its summary in
+commands.json, so dice can decode only the summaries it needs.
+Run this after commands.json is updated.
+"""
+import json
+import os
+
+DATA_DIR = os.path.normpath(
+    os.path.join(os.path.dirname(__file__), "..", "dice", "data")
+)
+COMMANDS_FILE = os.path.join(DATA_DIR, "commands.json")
+INDEX_FILE = os.path.join(DATA_DIR, "commands_index.json")
+
+
+def skip_whitespace(text, index):
+    while text[index] in " \t\r\n":
+        index += 1
+    return index
+
+
+def build_index(raw):
+    text = raw.decode()
+    decoder = json.JSONDecoder()
+    offsets = {}
+    # char offset to byte offset, commands.json may have non-ascii chars
+    byte_offset = 0
+    last_char_offset = 0
+
+    def to_byte_offset(char_offset):
+        nonlocal byte_offset, last_char_offset
+        byte_offset += len(text[last_char_offset:char_offset].encode())
+        last_char_offset = char_offset
+        return byte_offset
+
+    index = skip_whitespace(text, 0)
+    assert text[index] == "{"
+    index = skip_whitespace(text, index + 1)
+    while text[index] != "}":
+        command, index = decoder.raw_decode(text, index)
+        index = skip_whitespace(text, index)
+        assert text[index] == ":"
+        start = skip_whitespace(text, index + 1)
+        _, end = decoder.raw_decode(text, start)
+        offsets[command] = [to_byte_offset(start), to_byte_offset(end)]
+        index = skip_whitespace(text, end)
+        if text[index] == ",":
+            index = skip_whitespace(text, index + 1)
+    return {"size": len(raw), "offsets": offsets}
+
+
+if __name__ == "__main__":
+    with open(COMMANDS_FILE, "rb") as commands_file:
+        commands_index = build_index(commands_file.read())
+    with open(INDEX_FILE, "w") as index_file:
+        json.dump(commands_index, index_file, separators=(",", ":"))
+        index_file.write("\n")
+    print(f"{len(commands_index['offsets'])} commands indexed to {INDEX_FILE}")
@@ -12,6 +12,7 @@ from dice.commands import split_command_args
 from dice.redis_grammar import get_command_grammar
 from dice.exceptions import InvalidArguments
 from dice.config import Config, config as global_config
+from .helpers import StandInRedis
 
 
 TIMEOUT = 2
@@ -79,6 +80,16 @@ def dice_client():
     return Client("127.0.0.1", "6379", db=15)
 
 
+@pytest.fixture
+def stand_in_redis():
+    """
+    A local stand-in redis-server, see ``helpers.StandInRedis``.
+    """
+    server = StandInRedis()
+    yield server
+    server.close()
+
+
 @pytest.fixture
 def config():
     newconfig = Config()
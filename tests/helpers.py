@@ -1,4 +1,10 @@
 import re
+import time
+import fnmatch
+import threading
+import socketserver
+
+from redis.exceptions import ResponseError
 
 
 def formatted_text_rematch(value_to_test, expected_formatted_text):
@@ -9,3 +15,150 @@ def formatted_text_rematch(value_to_test, expected_formatted_text):
         assert value[0] == expected[0]
         print(expected[1], value[1])
         assert re.match(expected[1], value[1])
+
+
+class StandInRedisHandler(socketserver.StreamRequestHandler):
+    # TCP_NODELAY like redis-server
+    disable_nagle_algorithm = True
+
+    def read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            return line.split()
+        args = []
+        for _ in range(int(line[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def handle(self):
+        while True:
+            args = self.read_command()
+            if args is None:
+                return
+            if not args:
+                continue
+            self.wfile.write(encode_resp(self.server.execute(args)))
+
+
+def encode_resp(value):
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, Exception):
+        return b"-" + str(value).encode() + b"\r\n"
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, str):
+        return b"+" + value.encode() + b"\r\n"
+    if isinstance(value, bytes):
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+    return b"*%d\r\n" % len(value) + b"".join(encode_resp(item) for item in value)
+
+
+def spans_overlap(spans, other_spans):
+    """If any span of ``spans`` overlaps with one of ``other_spans``."""
+    return any(
+        start < other_end and other_start < end
+        for start, end in spans
+        for other_start, other_end in other_spans
+    )
+
+
+class StandInRedis(socketserver.ThreadingTCPServer):
+    """
+    A tiny redis-server stand-in for tests which don't need a real server,
+    speaks RESP2 and supports SCAN, a few string and list commands. Every
+    command received is recorded in ``self.commands``, set ``self.latency`` to
+    make commands on keys slow, and their (start, end) times are recorded in
+    ``self.spans``, set ``self.cluster_nodes`` to the reply of
+    ``CLUSTER NODES`` to play a cluster node.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+    KEY_COMMANDS = {"SET", "GET", "INCR", "DEL", "TYPE", "RPUSH", "LRANGE", "SCAN"}
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StandInRedisHandler)
+        self.host, self.port = self.server_address
+        self.data = {}
+        self.commands = []
+        self.latency = 0
+        self.spans = []
+        self.cluster_nodes = None
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.shutdown()
+        self.server_close()
+
+    def execute(self, args):
+        command = args[0].decode().upper()
+        self.commands.append([command] + args[1:])
+        if self.latency and command in self.KEY_COMMANDS:
+            start = time.monotonic()
+            time.sleep(self.latency)
+            self.spans.append((start, time.monotonic()))
+        with self.lock:
+            return self.execute_command(command, args[1:])
+
+    def execute_command(self, command, args):
+        if command == "PING":
+            return "PONG"
+        if command in ("SELECT", "ASKING", "CLIENT"):
+            return "OK"
+        if command == "SET":
+            self.data[args[0]] = args[1]
+            return "OK"
+        value = self.data.get(args[0]) if args else None
+        if command == "GET":
+            return value
+        if command == "STRLEN":
+            return len(value or b"")
+        if command == "INCR":
+            value = self.data.get(args[0], b"0")
+            if not isinstance(value, bytes) or not value.isdigit():
+                return ResponseError("ERR value is not an integer or out of range")
+            self.data[args[0]] = str(int(value) + 1).encode()
+            return int(self.data[args[0]])
+        if command == "EXISTS":
+            return sum(key in self.data for key in args)
+        if command == "DEL":
+            return sum(self.data.pop(key, None) is not None for key in args)
+        if command == "TYPE":
+            return {bytes: "string", list: "list"}.get(type(value), "none")
+        if command == "CLUSTER" and args[0].upper() == b"NODES" and self.cluster_nodes:
+            return self.cluster_nodes.encode()
+        if command == "DBSIZE":
+            return len(self.data)
+        if command == "SCAN":
+            cursor, options = int(args[0]), dict(zip(args[1::2], args[2::2]))
+            count = int(options.get(b"COUNT", 10))
+            pattern = options.get(b"MATCH", b"*").decode()
+            keys = sorted(self.data)[cursor : cursor + count]
+            cursor = 0 if cursor + count >= len(self.data) else cursor + count
+            matched = [key for key in keys if fnmatch.fnmatchcase(key.decode(), pattern)]
+            return [str(cursor).encode(), matched]
+        if command == "TTL":
+            return -2 if value is None else -1
+        if command == "OBJECT":
+            value = self.data.get(args[1])
+            return {bytes: b"embstr", list: b"listpack"}.get(type(value))
+        if command == "MEMORY":
+            return len(self.data.get(args[1])) + 50
+        if command == "RPUSH":
+            self.data.setdefault(args[0], []).extend(args[1:])
+            return len(self.data[args[0]])
+        if command == "LLEN":
+            return len(value or [])
+        if command == "LRANGE":
+            value = value or []
+            start, stop = int(args[1]), int(args[2])
+            start = max(start + len(value) if start < 0 else start, 0)
+            stop = stop + len(value) if stop < 0 else stop
+            return value[start : stop + 1]
+        return ResponseError(f"ERR unknown command '{command}'")
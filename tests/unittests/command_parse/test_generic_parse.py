@@ -216,3 +216,33 @@ def test_getex(judge_command):
         {"command": "GETEX", "key": "bar", "exat_const": "exat", "timestamp": "5"},
     )
     judge_command("GETEX bar ex 5 exat 5", None)
+
+
+def test_peek(judge_command):
+    judge_command("PEEK foo", {"command": "PEEK", "key": "foo"})
+    judge_command(
+        "PEEK user:* COUNT 10",
+        {"command": "PEEK", "key": "user:*", "count_const": "COUNT", "count": "10"},
+    )
+    judge_command("PEEK user:* COUNT", None)
+
+
+def test_scanall(judge_command):
+    judge_command("SCANALL", {"command": "SCANALL"})
+    judge_command(
+        "SCANALL MATCH user:* COUNT 10 TYPE hash",
+        {
+            "command": "SCANALL",
+            "match": "MATCH",
+            "pattern": "user:*",
+            "count_const": "COUNT",
+            "count": "10",
+            "type_const": "TYPE",
+            "type": "hash",
+        },
+    )
+    judge_command(
+        "HSCANALL myhash MATCH f*",
+        {"command": "HSCANALL", "key": "myhash", "match": "MATCH", "pattern": "f*"},
+    )
+    judge_command("SSCANALL", None)
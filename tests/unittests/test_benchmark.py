@@ -0,0 +1,59 @@
+import asyncio
+
+from click.testing import CliRunner
+
+from dice.benchmark import WORKLOADS, main, run_clients, split_clients
+from dice.client import Client
+
+
+def test_split_clients():
+    assert split_clients(10, 4) == [3, 3, 2, 2]
+    assert split_clients(2, 8) == [1, 1]
+
+
+def test_run_clients(config, stand_in_redis):
+    config.no_info = True
+    client = Client(stand_in_redis.host, stand_in_redis.port)
+
+    result = asyncio.run(
+        run_clients(client, WORKLOADS["set"], 3, 4, 10, b"xyz", duration=0.2)
+    )
+
+    assert result.errors == 0
+    assert result.histogram.count > 0
+    assert result.histogram.count % 4 == 0
+    assert set(stand_in_redis.data) <= {f"key:{key}".encode() for key in range(10)}
+    assert set(stand_in_redis.data.values()) == {b"xyz"}
+
+
+def test_benchmark_command(stand_in_redis, tmp_path):
+    runner = CliRunner()
+    result = runner.invoke(
+        main,
+        [
+            "-p",
+            str(stand_in_redis.port),
+            "--dicerc",
+            str(tmp_path / "dicerc"),
+            "-c",
+            "2",
+            "--processes",
+            "2",
+            "--duration",
+            "0.2",
+            "-t",
+            "get,incr",
+        ],
+    )
+
+    assert result.exit_code == 0, result.output
+    assert "====== GET ======" in result.output
+    assert "====== INCR ======" in result.output
+    assert "2 parallel clients in 2 processes" in result.output
+    assert result.output.count("requests per second") == 2
+
+
+def test_benchmark_unknown_workload():
+    result = CliRunner().invoke(main, ["-t", "get,foo"])
+    assert result.exit_code != 0
+    assert "unknown workloads: foo" in result.output
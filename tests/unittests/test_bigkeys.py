@@ -0,0 +1,67 @@
+import pytest
+
+from dice.bigkeys import BigKeys, KeyspaceStats
+from dice.client import Client
+
+
+@pytest.fixture
+def stand_in_client(config, stand_in_redis):
+    config.no_info = True
+    config.raw = True
+    for index in range(30):
+        stand_in_redis.data[f"str:{index:02}".encode()] = b"x" * index
+    for index in range(5):
+        stand_in_redis.data[f"list:{index}".encode()] = [b"a"] * (index + 1)
+    return Client(stand_in_redis.host, stand_in_redis.port)
+
+
+def test_keyspace_stats_keep_top_keys():
+    stats = KeyspaceStats(top=2)
+    assert stats.add(b"a", "string", 3)
+    assert not stats.add(b"b", "string", 1)
+    assert stats.add(b"c", "string", 10)
+    assert not stats.add(b"d", "string", 5)
+
+    string_stats = stats.types["string"]
+    assert sorted(string_stats.top, reverse=True) == [(10, b"c"), (5, b"d")]
+    assert (string_stats.count, string_stats.total) == (4, 19)
+    # 1 | 2~3 | 4~7 | 8~15
+    assert string_stats.distribution == {1: 1, 2: 1, 3: 1, 4: 1}
+
+
+def test_bigkeys(stand_in_client):
+    scanner = BigKeys(stand_in_client, top=3, count=10)
+    progress = list(scanner.scan())
+
+    assert progress[0] == '[  2.86%] Biggest list   found so far "list:0" with 1 items'
+    assert progress[-1].endswith('Biggest string found so far "str:29" with 29 bytes')
+    report = scanner.stats.report().decode()
+    assert "Sampled 35 keys in the keyspace!" in report
+    assert "string: 30 keys with 435 bytes (85.71% of keys, avg size 14.50)" in report
+    assert '1) "str:29" 29 bytes' in report
+    assert '3) "str:27" 27 bytes' in report
+    assert '1) "list:4" 5 items' in report
+    assert "16~31 bytes: 14" in report
+
+
+def test_memkeys(stand_in_client):
+    scanner = BigKeys(stand_in_client, memkeys=True, top=1)
+    list(scanner.scan())
+    report = scanner.stats.report().decode()
+    assert '1) "str:29" 79 bytes' in report
+    assert "list: 5 keys with 265 bytes" in report
+
+
+def test_bigkeys_resume_from_cursor(stand_in_client, stand_in_redis):
+    scanner = BigKeys(stand_in_client, count=10, interval=0.01)
+    for _ in scanner.scan():
+        # interrupted in the second batch
+        if scanner.cursor:
+            break
+    assert scanner.cursor == 10
+
+    resumed = BigKeys(stand_in_client, count=10)
+    list(resumed.scan(scanner.cursor))
+    assert resumed.stats.keys == 25
+    scans = [command[1] for command in stand_in_redis.commands if command[0] == "SCAN"]
+    assert scans == [b"0", b"10", b"10", b"20", b"30"]
@@ -1,7 +1,9 @@
+import io
 import os
 import re
+import threading
 from textwrap import dedent
-from unittest.mock import MagicMock, patch
+from unittest.mock import MagicMock, call, patch
 
 from packaging.version import parse as version_parse
 from prompt_toolkit.formatted_text import FormattedText
@@ -12,10 +14,11 @@ from dice.client import Client
 from dice.commands import command2syntax
 from dice.completers import diceCompleter
 from dice.config import config, load_config_files
-from dice.entry import Rainbow, prompt_message
-from dice.exceptions import NotSupport
+from dice.entry import Rainbow, prompt_message, write_result
+from dice.exceptions import InvalidArguments, NotSupport
+from dice.renders import StreamedRaw, StreamedText
 
-from ..helpers import formatted_text_rematch
+from ..helpers import formatted_text_rematch, spans_overlap, StandInRedis
 
 
 @pytest.fixture
@@ -613,3 +616,473 @@ def test_prompt():
     assert re.match(r"^\d+ aabc$", str(c))
     c = Client(prompt="{client_addr} >")
     assert re.match(r"^127.0.0.1:\d+ >$", str(c))
+
+
+@pytest.fixture
+def offline_client(config):
+    config.no_info = True
+    config.raw = True
+    config.retry_times = 1
+    with patch("redis.connection.Connection.connect"):
+        client = Client("127.0.0.1", "6379")
+    client.connection = MagicMock()
+    return client
+
+
+def test_send_commands_in_pipeline_windows(offline_client):
+    offline_client.connection.read_response.side_effect = [
+        b"OK",
+        redis.exceptions.ResponseError("WRONGTYPE wrong kind of value"),
+        b"bar",
+    ]
+    answers = list(
+        offline_client.send_commands(
+            ["set foo bar\n", "lpush foo a\n", "get foo\n"], window=2
+        )
+    )
+
+    assert answers == [b"OK", b"ERROR WRONGTYPE wrong kind of value", b"bar"]
+    pack_calls = offline_client.connection.pack_commands.call_args_list
+    assert [c[0][0] for c in pack_calls] == [
+        [("set", "foo", "bar"), ("lpush", "foo", "a")],
+        [("get", "foo")],
+    ]
+    assert offline_client.connection.send_packed_command.call_count == 2
+
+
+def test_send_commands_flush_window_before_barrier_command(offline_client):
+    offline_client.connection.read_response.side_effect = [b"OK", b"OK", b"1"]
+    answers = list(
+        offline_client.send_commands(["set foo bar", "select 2", "exists foo"])
+    )
+
+    assert answers == [b"OK", b"OK", b"1"]
+    assert offline_client.db == 2
+    # select is sent alone, not packed with others
+    offline_client.connection.send_command.assert_called_once_with("select", "2")
+    assert offline_client.connection.pack_commands.call_count == 2
+
+
+def test_send_commands_retry_one_by_one_when_send_fails(offline_client):
+    offline_client.connection.send_packed_command.side_effect = (
+        redis.exceptions.ConnectionError("Connection reset by peer")
+    )
+    offline_client.connection.read_response.side_effect = [b"OK", b"bar"]
+    answers = list(offline_client.send_commands(["set foo bar", "get foo"]))
+
+    assert answers == [b"OK", b"bar"]
+    assert offline_client.connection.send_command.call_args_list == [
+        call("set", "foo", "bar"),
+        call("get", "foo"),
+    ]
+
+
+def test_send_commands_not_rerun_after_connection_error(offline_client):
+    offline_client.connection.read_response.side_effect = [
+        b"OK",
+        redis.exceptions.ConnectionError("Connection reset by peer"),
+    ]
+    answers = list(offline_client.send_commands(["set foo bar", "incr counter"]))
+
+    assert answers == [
+        b"OK",
+        b"ERROR Connection lost before the reply,"
+        b" the command may or may not have run.",
+    ]
+    # incr may have been applied by the server, not sent again
+    offline_client.connection.send_command.assert_not_called()
+
+
+def test_pipe_counts_replies_and_errors(offline_client, capfd):
+    offline_client.connection.read_response.side_effect = [
+        b"OK",
+        redis.exceptions.ResponseError("WRONGTYPE wrong kind of value"),
+        1,
+        b"eofmark",
+    ]
+    stream = io.BytesIO(b"SET foo bar\r\nLPUSH foo a\r\nINCR counter\r\n")
+    with patch("secrets.token_hex", return_value="eofmark"):
+        errors, replies = offline_client.pipe(stream, chunk_size=8)
+
+    assert (errors, replies) == (1, 3)
+    sent = [
+        c[0][0][0] for c in offline_client.connection.send_packed_command.call_args_list
+    ]
+    assert b"".join(sent[:-1]) == stream.getvalue()
+    offline_client.connection.pack_command.assert_called_once_with("ECHO", "eofmark")
+    _, err = capfd.readouterr()
+    assert "WRONGTYPE wrong kind of value" in err
+
+
+def test_pipe_ends_unterminated_inline_command(offline_client):
+    offline_client.connection.read_response.side_effect = [b"OK", b"eofmark"]
+    stream = io.BytesIO(b"SET a 1")
+    with patch("secrets.token_hex", return_value="eofmark"):
+        errors, replies = offline_client.pipe(stream)
+
+    assert (errors, replies) == (0, 1)
+    sent = [
+        c[0][0] for c in offline_client.connection.send_packed_command.call_args_list
+    ]
+    # ECHO is not appended to `SET a 1`
+    assert sent[:2] == [[b"SET a 1"], [b"\r\n"]]
+    assert sent[2] is offline_client.connection.pack_command.return_value
+
+
+def test_pipe_timeout_without_replies(offline_client):
+    no_reply = threading.Event()
+    offline_client.connection.read_response.side_effect = lambda: no_reply.wait()
+    try:
+        with pytest.raises(redis.exceptions.TimeoutError, match="No replies"):
+            offline_client.pipe(io.BytesIO(b"SET a 1\r\n"), timeout=0.1)
+    finally:
+        offline_client.connection.read_response.side_effect = [b"eofmark"]
+        no_reply.set()
+
+
+def test_redirect_reuse_node_connection(offline_client):
+    offline_client.connection.read_response.side_effect = [
+        redis.exceptions.ResponseError("MOVED 12182 127.0.0.1:7002"),
+        [[0, 16383, [b"127.0.0.1", 7001, b"id1"]]],
+        redis.exceptions.ResponseError("MOVED 12182 127.0.0.1:7002"),
+        [[0, 16383, [b"127.0.0.1", 7001, b"id1"]]],
+    ]
+    node_connection = MagicMock()
+    node_connection.read_response.side_effect = [b"OK", b"bar"]
+    offline_client.create_connection = MagicMock(return_value=node_connection)
+
+    assert offline_client.execute("set", "foo", "bar") == b"OK"
+    # the key is routed to a wrong node by a stale slot table
+    offline_client.cluster_slots[12182] = ("127.0.0.1", 7001)
+    offline_client.node_connections[("127.0.0.1", 7001)] = offline_client.connection
+    assert offline_client.execute("get", "foo") == b"bar"
+
+    offline_client.create_connection.assert_called_once()
+    node_connection.connect.assert_called_once()
+    assert offline_client.cluster_slots[12182] == ("127.0.0.1", 7002)
+    assert offline_client.cluster_slots[0] == ("127.0.0.1", 7001)
+
+
+def test_route_command_to_node_of_key_slot(offline_client):
+    offline_client.cluster_slots = {slot: ("127.0.0.1", 7001) for slot in range(16384)}
+    # foo is in slot 12182, {foo}bar too because of the hash tag
+    offline_client.cluster_slots[12182] = ("127.0.0.1", 7002)
+    node_connection = MagicMock()
+    node_connection.read_response.side_effect = [b"1", b"2"]
+    offline_client.node_connections[("127.0.0.1", 7002)] = node_connection
+    offline_client.node_connections[("127.0.0.1", 7001)] = offline_client.connection
+    offline_client.connection.read_response.side_effect = [b"info"]
+
+    assert offline_client.execute("incr", "foo") == b"1"
+    assert offline_client.execute("INCR", "{foo}bar") == b"2"
+    # no key, sent to the connected node
+    assert offline_client.execute("INFO") == b"info"
+    offline_client.connection.send_command.assert_called_once_with("INFO")
+
+
+def test_ask_redirect_send_asking_first(offline_client):
+    offline_client.cluster_slots = {12182: ("127.0.0.1", 7001)}
+    offline_client.node_connections[("127.0.0.1", 7001)] = offline_client.connection
+    offline_client.connection.read_response.side_effect = [
+        redis.exceptions.ResponseError("ASK 12182 127.0.0.1:7002"),
+    ]
+    node_connection = MagicMock()
+    node_connection.read_response.side_effect = [b"OK", b"bar"]
+    offline_client.create_connection = MagicMock(return_value=node_connection)
+
+    assert offline_client.execute("get", "foo") == b"bar"
+    assert node_connection.send_command.call_args_list == [
+        (("ASKING",),),
+        (("get", "foo"),),
+    ]
+    # ASK doesn't change the slot owner
+    assert offline_client.cluster_slots[12182] == ("127.0.0.1", 7001)
+
+
+@pytest.fixture
+def stand_in_client(config, stand_in_redis):
+    config.no_info = True
+    config.raw = True
+    client = Client(stand_in_redis.host, stand_in_redis.port)
+    yield client
+    if client.async_core:
+        client.async_core.close()
+
+
+@pytest.mark.parametrize("async_core", [True, False])
+def test_execute_many_in_one_pipeline(config, stand_in_client, async_core):
+    config.async_core = async_core
+    responses = stand_in_client.execute_many(
+        [("SET", "foo", "1"), ("INCR", "foo"), ("GET", "foo"), ("INCR", "bar")]
+    )
+    assert responses[:3] == [b"OK", 2, b"2"]
+    assert responses[3] == 1
+
+    responses = stand_in_client.execute_many([("GET", "foo"), ("NOSUCH", "foo")])
+    assert responses[0] == b"2"
+    assert isinstance(responses[1], redis.exceptions.ResponseError)
+
+
+@pytest.mark.parametrize("async_core", [True, False])
+def test_execute_many_on_cluster_nodes(
+    config, stand_in_client, stand_in_redis, async_core
+):
+    config.async_core = async_core
+    other_node = StandInRedis()
+    stand_in_client.cluster_slots = {
+        slot: (stand_in_redis.host, stand_in_redis.port) for slot in range(16384)
+    }
+    # foo is in slot 12182
+    stand_in_client.cluster_slots[12182] = (other_node.host, other_node.port)
+    stand_in_redis.latency = other_node.latency = 0.2
+    try:
+        responses = stand_in_client.execute_many(
+            [("SET", "foo", "a"), ("SET", "bar", "b")]
+        )
+    finally:
+        other_node.close()
+
+    assert responses == [b"OK", b"OK"]
+    assert other_node.data == {b"foo": b"a"}
+    assert stand_in_redis.data == {b"bar": b"b"}
+    # nodes are queried at the same time with asyncio core
+    assert spans_overlap(stand_in_redis.spans, other_node.spans) == async_core
+
+
+@pytest.mark.parametrize("async_core", [True, False])
+def test_scan_cluster_primaries(config, stand_in_client, stand_in_redis, async_core):
+    config.async_core = async_core
+    other_node = StandInRedis()
+    stand_in_client.cluster_enabled = True
+    stand_in_redis.cluster_nodes = "\n".join(
+        [
+            f"a1 :{stand_in_redis.port}@1 myself,master - 0 0 1 connected 0-8191",
+            f"b1 127.0.0.1:{other_node.port}@1 master - 0 0 2 connected 8192-16383",
+            f"c1 127.0.0.1:{other_node.port + 1}@1 slave b1 0 0 2 connected",
+            "d1 127.0.0.1:1@1 master,fail - 0 0 3 connected",
+        ]
+    )
+    for index in range(30):
+        stand_in_redis.data[f"a:{index}".encode()] = b"v"
+        other_node.data[f"b:{index}".encode()] = b"v"
+    stand_in_redis.latency = other_node.latency = 0.1
+    try:
+        batches = list(stand_in_client.scan_batches(count=10))
+    finally:
+        other_node.close()
+
+    assert stand_in_client.cluster_primaries() == [
+        (stand_in_redis.host, stand_in_redis.port),
+        ("127.0.0.1", other_node.port),
+    ]
+    assert len(batches) == 6
+    assert {cursor for cursor, _ in batches} == {None}
+    keys = [key for _, batch in batches for key in batch]
+    assert sorted(keys) == sorted(set(stand_in_redis.data) | set(other_node.data))
+    # every node has 3 batches, scanned at the same time with asyncio core
+    assert len(stand_in_redis.spans) == len(other_node.spans) == 3
+    assert spans_overlap(stand_in_redis.spans, other_node.spans) == async_core
+
+
+def test_scan_cluster_can_not_resume(stand_in_client):
+    stand_in_client.cluster_enabled = True
+    with pytest.raises(NotSupport):
+        next(stand_in_client.scan_batches(cursor=10))
+
+
+def test_scan_first_keys_for_completion(stand_in_client, stand_in_redis):
+    for index in range(20):
+        stand_in_redis.data[f"user:{index}".encode()] = b"v"
+    stand_in_redis.data[b"order:1"] = b"v"
+
+    keys = stand_in_client.scan_first_keys("user:1*", count=1000)
+
+    assert sorted(keys) == [b"user:1"] + [f"user:{i}".encode() for i in range(10, 20)]
+    # not on the REPL's connection
+    assert stand_in_client.async_core.connections
+
+
+def test_async_core_created_once_by_threads(stand_in_client):
+    def slow_core(create_connection):
+        # the other thread calls get_async_core in the meantime
+        threading.Event().wait(0.05)
+        return MagicMock()
+
+    with patch("dice.client.AsyncCore", side_effect=slow_core) as async_core:
+        threads = [
+            threading.Thread(target=stand_in_client.get_async_core) for _ in range(2)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    assert async_core.call_count == 1
+
+
+@pytest.mark.parametrize("length", [5, 15, 30])
+def test_peek_in_two_round_trips(config, stand_in_client, stand_in_redis, length):
+    config.version = "7.0.0"
+    elements = [f"e{index}".encode() for index in range(length)]
+    stand_in_redis.data[b"mylist"] = list(elements)
+    stand_in_client.execute_many = MagicMock(wraps=stand_in_client.execute_many)
+
+    peek_result = list(stand_in_client.do_peek("mylist"))
+
+    assert stand_in_client.execute_many.call_count == 2
+    assert len(peek_result) == 1
+    output = peek_result[0].decode()
+    assert f"list (listpack)  mem: {length + 50} bytes, ttl: -1" in output
+    if length <= 20:
+        shown = elements
+    else:
+        shown = elements[:10] + elements[-10:]
+        assert f"{length - 20} elements was omitted" in output
+    for index, element in enumerate(shown):
+        assert element.decode() in output
+    assert output.count("\n") == 2 + len(shown) + (length > 20)
+
+
+def test_peek_string_in_two_round_trips(config, stand_in_client, stand_in_redis):
+    config.version = None
+    stand_in_redis.data[b"foo"] = b"bar"
+    stand_in_client.execute_many = MagicMock(wraps=stand_in_client.execute_many)
+
+    peek_result = list(stand_in_client.do_peek("foo"))
+
+    assert stand_in_client.execute_many.call_count == 2
+    assert peek_result == [
+        b'key: string (embstr), ttl: -1\nstrlen: 3\nvalue: "bar"'
+    ]
+    assert "MEMORY" not in [command[0] for command in stand_in_redis.commands]
+
+
+def test_peek_pattern_in_batches(config, stand_in_client, stand_in_redis):
+    config.version = "7.0.0"
+    for index in range(250):
+        stand_in_redis.data[f"user:{index:03}".encode()] = b"x" * index
+    stand_in_redis.data[b"user:list"] = [b"a", b"b"]
+    stand_in_redis.data[b"other"] = b"value"
+    stand_in_client.execute_many = MagicMock(wraps=stand_in_client.execute_many)
+
+    (tables,) = list(stand_in_client.client_execute_command("PEEK", "user:*"))
+
+    # batches are queried as the tables are written
+    assert isinstance(tables, StreamedRaw)
+    assert stand_in_client.execute_many.call_count == 2
+    lines = b"".join(tables).decode().splitlines()
+    assert stand_in_client.execute_many.call_count == 6
+    assert lines[0].split() == ["type", "encoding", "size", "memory", "ttl", "key"]
+    assert len(lines) == 252
+    assert lines[3].split() == ["string", "embstr", "2", "52", "-1", "user:002"]
+    assert lines[-1].split() == ["list", "listpack", "2", "52", "-1", "user:list"]
+    assert "other" not in lines
+
+
+def test_peek_pattern_with_count(config, stand_in_client, stand_in_redis):
+    for index in range(20):
+        stand_in_redis.data[f"user:{index:03}".encode()] = b"x"
+
+    (tables,) = stand_in_client.client_execute_command("PEEK", "user:*", "count", 5)
+    assert len(b"".join(tables).decode().splitlines()) == 6
+
+    tables = list(stand_in_client.client_execute_command("PEEK", "nouser:*"))
+    assert tables == ["No keys match nouser:*."]
+
+
+def test_peek_key_named_like_pattern(config, stand_in_client, stand_in_redis):
+    config.version = "7.0.0"
+    stand_in_redis.data[b"a[1]"] = b"bar"
+    stand_in_redis.data[b"a1"] = b"baz"
+
+    peek_result = list(stand_in_client.client_execute_command("PEEK", "a[1]"))
+    assert peek_result == [
+        b'key: string (embstr)  mem: 53 bytes, ttl: -1\nstrlen: 3\nvalue: "bar"'
+    ]
+
+    (tables,) = stand_in_client.client_execute_command("PEEK", "a[0-9]")
+    assert b"a1" in b"".join(tables)
+
+
+def test_scanall_drives_cursor_to_the_end(config, stand_in_client, stand_in_redis):
+    config.raw = False
+    for index in range(25):
+        stand_in_redis.data[f"user:{index:02}".encode()] = b"x"
+    completer = MagicMock()
+
+    (result,) = stand_in_client.client_execute_command(
+        "SCANALL", "MATCH", "user:1*", "COUNT", "10", completer=completer
+    )
+    text = "".join(text for chunk in result for _, text in chunk)
+
+    scan_calls = [command for command in stand_in_redis.commands if command[0] == "SCAN"]
+    assert len(scan_calls) == 3
+    assert text.splitlines() == [f'{index + 1:2}) "user:1{index}"' for index in range(10)]
+    # completers are touched page by page, only one page matches
+    assert completer.update_completer_for_response.call_count == 1
+
+
+def test_scanall_numbers_streamed_pages(config, stand_in_client, stand_in_redis):
+    config.raw = False
+    for index in range(21000):
+        stand_in_redis.data[f"user:{index:05}".encode()] = b"x"
+
+    (result,) = stand_in_client.client_execute_command("SCANALL", "COUNT", "10500")
+
+    # pages longer than STREAM_THRESHOLD are rendered in chunks too
+    assert isinstance(result, StreamedText)
+    lines = "".join(text for chunk in result for _, text in chunk).splitlines()
+    assert len(lines) == 21000
+    assert lines[0].startswith("    1) ")
+    assert lines[10500].startswith("10501) ")
+    assert lines[-1].startswith("21000) ")
+
+
+def test_scanall_drop_duplicates(config, stand_in_client):
+    config.raw = True
+    pages = [
+        [b"5", [b"f1", b"v1", b"f2", b"v2"]],
+        [b"9", [b"f2", b"v2", b"f3", b"v3"]],
+        [b"0", [b"f1", b"v1"]],
+    ]
+    stand_in_client.execute = MagicMock(side_effect=[3] + pages)
+
+    (output,) = stand_in_client.client_execute_command("HSCANALL", "myhash")
+
+    assert b"".join(output) == b"f1\nv1\nf2\nv2\nf3\nv3"
+    assert stand_in_client.execute.call_args_list[1][0] == (
+        "HSCAN",
+        "myhash",
+        0,
+        "COUNT",
+        100,
+    )
+
+
+@pytest.mark.parametrize("raw", [True, False])
+@pytest.mark.parametrize(
+    "command", [["SCANALL", "COUNT", "10"], ["PEEK", "user:*", "COUNT", "250"]]
+)
+def test_multi_page_reply_paged_once(config, stand_in_client, stand_in_redis, raw, command):
+    config.raw = raw
+    config.enable_pager = True
+    config.version = "7.0.0"
+    for index in range(250):
+        stand_in_redis.data[f"user:{index:03}".encode()] = b"x"
+
+    with patch("click.echo_via_pager") as echo_via_pager:
+        for answer in stand_in_client.client_execute_command(*command):
+            write_result(answer, max_height=5)
+
+    echo_via_pager.assert_called_once()
+    text = "".join(echo_via_pager.call_args[0][0])
+    assert text.count("user:") == 250
+    assert "user:249" in text.splitlines()[-1]
+
+
+def test_scanall_invalid_arguments(stand_in_client):
+    with pytest.raises(InvalidArguments):
+        list(stand_in_client.client_execute_command("SCANALL", "MATCH"))
+    with pytest.raises(InvalidArguments):
+        list(stand_in_client.client_execute_command("ZSCANALL"))
+    with pytest.raises(InvalidArguments):
+        list(stand_in_client.client_execute_command("SCANALL", "COUNT", "0"))
@@ -1,11 +1,22 @@
+import json
+import os
+import time
 from unittest.mock import MagicMock
 
 from freezegun import freeze_time
 from prompt_toolkit.formatted_text import FormattedText
-from prompt_toolkit.completion import Completion
-
-from dice.completers import MostRecentlyUsedFirstWordCompleter
+from prompt_toolkit.completion import CompleteEvent, Completion
+from prompt_toolkit.document import Document
+
+from dice.completers import (
+    IndexedWordCompleter,
+    MostRecentlyUsedFirstWordCompleter,
+    STORE_MAX_WORDS,
+    ServerKeyCompleter,
+    VocabularyStore,
+)
 from dice.completers import diceCompleter, TimestampCompleter, IntegerTypeCompleter
+from dice.repl import SkipAuthFileHistory, seed_completer
 
 
 def test_LUF_completer_touch():
@@ -29,6 +40,209 @@ def test_LUF_completer_touch_words():
     assert c.words == ["two", "one", "bar"]
 
 
+def test_LUF_completer_touch_many_words():
+    c = MostRecentlyUsedFirstWordCompleter(50000, [])
+    words = [f"key:{i}" for i in range(100000)]
+    c.touch_words(words)
+    c.touch_words(words[-10:])
+    assert len(c.words) == 50000
+    assert list(c.words)[:3] == ["key:99999", "key:99998", "key:99997"]
+    assert "key:49999" not in c.words
+
+    # completer iterates the same words, not a copy
+    assert c.word_completer.words is c.words
+    c.touch("key:50000")
+    completions = c.get_completions(Document("50000"), CompleteEvent())
+    assert next(iter(completions)).text == "key:50000"
+
+
+def test_indexed_completer_ranks_prefix_substring_fuzzy():
+    c = IndexedWordCompleter(10, ["user:1", "my-user", "u-s-e-r", "foo", "User:2"])
+    # prefix first, then substring, then fuzzy, most recent first for each
+    assert c.match("user") == ["user:1", "User:2", "my-user", "u-s-e-r"]
+    c.touch("user:1")
+    assert c.match("USER") == ["user:1", "User:2", "my-user", "u-s-e-r"]
+    assert c.match("") == ["user:1", "my-user", "u-s-e-r", "foo", "User:2"]
+    assert c.match("f") == ["foo"]
+    assert c.match("bar") == []
+
+    completions = list(c.get_completions(Document("my"), CompleteEvent()))
+    assert [(item.text, item.start_position) for item in completions] == [("my-user", -2)]
+
+
+def test_indexed_completer_evicts_and_limits():
+    c = IndexedWordCompleter(1000, [], limit=5)
+    c.touch_words([f"key:{i}" for i in range(3000)])
+    assert c.match("key:2") == [
+        "key:2999",
+        "key:2998",
+        "key:2997",
+        "key:2996",
+        "key:2995",
+    ]
+    assert c.match("key:20") == [
+        "key:2099",
+        "key:2098",
+        "key:2097",
+        "key:2096",
+        "key:2095",
+    ]
+    # evicted words can't be completed
+    assert c.match("key:1999") == []
+
+    # stale stamps are compacted, results don't change
+    c.touch_words([f"key:{i}" for i in range(2000, 3000)] * 3)
+    assert c.index.size <= 2 * c.index.live + 1024
+    assert c.match("key:2999") == ["key:2999"]
+    assert c.match(":25") == [
+        "key:2599",
+        "key:2598",
+        "key:2597",
+        "key:2596",
+        "key:2595",
+    ]
+
+
+def test_server_key_completer_scans_when_few_matches(monkeypatch):
+    monkeypatch.setattr("dice.completers.SERVER_SCAN_INTERVAL", 0)
+    c = ServerKeyCompleter(100, ["user:1", "order:1"])
+    c.scan_keys = MagicMock(return_value=[b"user:[2]", b"user:3"])
+
+    completions = c.get_completions(Document("user:["), CompleteEvent())
+    assert [completion.text for completion in completions] == ["user:[2]"]
+    c.scan_keys.assert_called_once_with("user:\\[*")
+    # merged into known keys
+    assert c.words == ["user:3", "user:[2]", "user:1", "order:1"]
+
+    # same prefix is cached
+    list(c.get_completions(Document("user:["), CompleteEvent()))
+    assert c.scan_keys.call_count == 1
+
+    # enough known keys match
+    c.touch_words([f"user:{index}" for index in range(10, 20)])
+    list(c.get_completions(Document("user"), CompleteEvent()))
+    assert c.scan_keys.call_count == 1
+
+
+def test_server_key_completer_scan_error_and_stale_input():
+    c = ServerKeyCompleter(100, [])
+    c.scan_keys = MagicMock(side_effect=ConnectionError("gone"))
+    assert list(c.get_completions(Document("a"), CompleteEvent())) == []
+
+    # typed on while waiting for the interval, stale input isn't scanned
+    c.scan_keys.reset_mock()
+    c.latest_text = "ab"
+    c.last_scan = time.monotonic()
+    assert not c.scan("a2")
+    c.scan_keys.assert_not_called()
+
+
+def test_vocabulary_store_per_server(config, tmp_path):
+    config.completion_store_location = str(tmp_path / "store")
+    client = MagicMock(host="127.0.0.1", port=7379, path=None)
+    store = VocabularyStore.for_client(client)
+    assert store.path == str(tmp_path / "store" / "127.0.0.1_7379.json")
+
+    store.save({"key": (f"key:{i}" for i in range(20000)), "member": ["m"]})
+    assert os.listdir(tmp_path / "store") == ["127.0.0.1_7379.json"]
+    assert os.stat(store.path).st_mode & 0o777 == 0o600
+    words = store.load()
+    assert len(words["key"]) == STORE_MAX_WORDS
+    assert words["key"][0] == "key:0"
+    assert words["member"] == ["m"]
+
+    config.completion_store_location = ""
+    assert VocabularyStore.for_client(client) is None
+
+
+def test_completer_loads_words_lazily(config, tmp_path, monkeypatch):
+    # other tests share the config
+    monkeypatch.setattr(config, "completer_max", 3)
+    store = VocabularyStore(str(tmp_path / "words.json"))
+    store.save({"key": ["old1", "old2", "new"], "field": ["f"]})
+
+    c = diceCompleter()
+    c.store = store
+    c.update_completer_for_input("GET new")
+    # not loaded until completing
+    assert c.key_completer.words == ["new"]
+
+    completions = c.get_completions(Document("GET ol"), CompleteEvent())
+    assert [completion.text for completion in completions] == ["old1", "old2"]
+    # words of this session first, then saved ones, at most completer_max
+    assert c.key_completer.words == ["new", "old1", "old2"]
+    assert c.field_completer.words == ["f"]
+
+    c.update_completer_for_input("GET foo")
+    c.save_vocabularies()
+    assert store.load()["key"] == ["foo", "new", "old1"]
+
+
+def test_completer_save_keeps_unloaded_words(tmp_path):
+    store = VocabularyStore(str(tmp_path / "words.json"))
+    store.save({"key": ["old"]})
+    c = diceCompleter()
+    c.store = store
+    c.update_completer_for_input("GET new")
+    c.save_vocabularies()
+    assert store.load()["key"] == ["new", "old"]
+
+
+def test_vocabulary_store_drops_broken_words(tmp_path):
+    path = tmp_path / "words.json"
+    words = ["a", 1, None, ["b"], "c"] + [f"k{i}" for i in range(STORE_MAX_WORDS)]
+    path.write_text(json.dumps({"words": {"key": words, "field": "f"}}))
+
+    loaded = VocabularyStore(str(path)).load()
+
+    assert loaded == {"key": ["a", "c"] + [f"k{i}" for i in range(STORE_MAX_WORDS - 2)]}
+
+
+def test_extract_tokens_from_commands():
+    c = diceCompleter()
+    commands = [
+        "GET foo",
+        "PING",
+        "not a command",
+        "HSET hash f1 v1",
+        'DEL a "b c"',
+        "SADD s m1 m2",
+    ]
+    assert list(c.extract_tokens(commands)) == [
+        ("key", "foo"),
+        ("key", "hash"),
+        ("field", "f1"),
+        ("keys", "a"),
+        ("keys", "b c"),
+        ("key", "s"),
+        ("members", "m1"),
+        ("members", "m2"),
+    ]
+    # tokens of a grammar are looked up once, PING has none
+    assert [] in c.learning_tokens.values()
+
+    c.update_completer_for_inputs(commands)
+    assert c.key_completer.words == ["s", "b c", "a", "hash", "foo"]
+    assert c.field_completer.words == ["f1"]
+
+
+def test_seed_completer_from_history(tmp_path, monkeypatch):
+    monkeypatch.setattr("dice.repl.HISTORY_SEED_BATCH", 2)
+    history = SkipAuthFileHistory(tmp_path / "history")
+    for index in range(10):
+        history.append_string(f"GET key{index}")
+    history.append_string("HGET hash field")
+
+    c = diceCompleter()
+    c.update_completer_for_inputs = MagicMock(wraps=c.update_completer_for_inputs)
+    seed_completer(c, history, limit=5)
+
+    # latest entries, oldest first, in batches
+    assert c.update_completer_for_inputs.call_count == 3
+    assert c.key_completer.words == ["hash", "key9", "key8", "key7", "key6"]
+    assert c.field_completer.words == ["field"]
+
+
 def test_newbie_mode_complete_without_meta_dict():
     fake_document = MagicMock()
     fake_document.text_before_cursor = fake_document.text = "GEOR"
@@ -436,3 +650,12 @@ def test_username_touch_for_response():
         "hello",
         "world",
     ]
+
+
+def test_grammar_completer_is_cached_for_command():
+    completer = diceCompleter()
+    zadd_completer = completer.get_completer("ZADD myzset 1 one")
+    assert completer.get_completer("ZADD myzset 2 two") is zadd_completer
+    assert zadd_completer.completers is completer.completer_mapping
+    assert completer.get_completer("GET foo") is not zadd_completer
+    assert completer.get_completer("NOTACOMMAND") is completer.root_completer
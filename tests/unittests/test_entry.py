@@ -1,15 +1,21 @@
+import sys
 import pytest
 import tempfile
+import subprocess
 from unittest.mock import patch
 from prompt_toolkit.formatted_text import FormattedText
 
 from dice.entry import (
     gather_args,
     parse_url,
-    SkipAuthFileHistory,
     write_result,
     is_too_tall,
+    pager_chunks,
+    scan_bigkeys,
 )
+from dice.exceptions import NotSupport
+from dice.renders import RawStream, StreamedRaw, StreamedText
+from dice.repl import SkipAuthFileHistory
 
 from dice.utils import DSN
 
@@ -289,12 +295,54 @@ def test_write_result_for_bytes(capsys):
     assert captured.out == "hello\n"
 
 
+def test_write_result_for_raw_stream(capsysbinary):
+    write_result(RawStream([b"foo", b"bar"] * 3))
+    captured = capsysbinary.readouterr()
+    assert captured.out == b"foo\nbar\nfoo\nbar\nfoo\nbar\n"
+
+
 def test_write_result_for_formatted_text():
     ft = FormattedText([("class:keyword", "set"), ("class:string", "hello world")])
     # just this test not raise means ok
     write_result(ft)
 
 
+def test_write_result_for_streamed_text():
+    chunks = [FormattedText([("class:string", f"line {index}\n")]) for index in range(3)]
+    with patch("prompt_toolkit.print_formatted_text") as print_formatted_text:
+        write_result(StreamedText(iter(chunks), 4), max_height=10)
+    printed = [call.args[0] for call in print_formatted_text.call_args_list[:3]]
+    assert printed == chunks
+
+
+def test_write_streamed_text_to_pager(config):
+    config.enable_pager = True
+    chunks = (FormattedText([("class:string", f"line {index}\n")]) for index in range(3))
+    with patch("click.echo_via_pager") as echo_via_pager:
+        write_result(StreamedText(chunks, 4), max_height=2)
+    assert "".join(echo_via_pager.call_args[0][0]) == "line 0\nline 1\nline 2\n"
+
+
+def test_streamed_text_of_unknown_height(config):
+    config.enable_pager = True
+    chunks = (FormattedText([("class:string", f"line {index}\n")]) for index in range(3))
+    text = StreamedText(chunks)
+    with patch("prompt_toolkit.print_formatted_text") as print_formatted_text:
+        write_result(text, max_height=10)
+    # chunks rendered to count lines are printed too
+    printed = [call.args[0] for call in print_formatted_text.call_args_list[:3]]
+    assert printed == [[("class:string", f"line {index}\n")] for index in range(3)]
+    assert text.height == 4
+
+
+def test_streamed_raw_to_pager(config):
+    config.enable_pager = True
+    blocks = (f"line {index}\n".encode() for index in range(3))
+    with patch("click.echo_via_pager") as echo_via_pager:
+        write_result(StreamedRaw(blocks), max_height=2)
+    assert "".join(echo_via_pager.call_args[0][0]) == "line 0\nline 1\nline 2\n"
+
+
 def test_is_too_tall_for_formatted_text():
     ft = FormattedText([("class:key", f"key-{index}\n") for index in range(21)])
     assert is_too_tall(ft, 20)
@@ -304,4 +352,55 @@ def test_is_too_tall_for_formatted_text():
 def test_is_too_tall_for_bytes():
     byte_text = b"".join([b"key\n" for index in range(21)])
     assert is_too_tall(byte_text, 20)
+    assert is_too_tall(byte_text, 21)
+    assert not is_too_tall(byte_text, 22)
     assert not is_too_tall(byte_text, 23)
+
+
+def test_pager_chunks_for_bytes():
+    text = "键值\n".encode() * 10
+    # chunks split in the middle of utf-8 characters
+    chunks = list(pager_chunks(text, chunk_size=4))
+    assert all(isinstance(chunk, str) for chunk in chunks)
+    assert "".join(chunks) == "键值\n" * 10
+
+
+def test_write_formatted_text_to_pager_lazily(config):
+    config.enable_pager = True
+    ft = FormattedText([("class:key", f"key-{index}\n") for index in range(3000)])
+    with patch("click.echo_via_pager") as echo_via_pager:
+        write_result(ft, max_height=20)
+    chunks = echo_via_pager.call_args[0][0]
+    assert not isinstance(chunks, str)
+    assert next(chunks).startswith("key-0\nkey-1\n")
+    assert "".join(chunks).endswith("key-2999\n")
+
+
+def test_bigkeys_cursor_not_support(capsys):
+    params = {"memkeys": False, "top": 1, "interval": 0, "cursor": 10}
+    with patch("dice.entry.BigKeys") as bigkeys:
+        bigkeys.return_value.scan.side_effect = NotSupport("No cursor on cluster.")
+        with pytest.raises(SystemExit) as exit_info:
+            scan_bigkeys(None, params)
+    assert exit_info.value.code == 1
+    assert capsys.readouterr().err == "No cursor on cluster.\n"
+
+
+# modules only the interactive REPL needs
+REPL_ONLY_MODULES = ["prompt_toolkit", "pygments", "mistune", "dice.repl", "dice.lexer"]
+# generous, import dice.entry takes ~0.2s on a laptop, the REPL stack doubles it
+ENTRY_IMPORT_BUDGET = 1.0
+
+
+def test_non_interactive_path_skip_repl_imports():
+    script = (
+        "import sys, time\n"
+        "start = time.perf_counter()\n"
+        "import dice.entry\n"
+        "print(time.perf_counter() - start)\n"
+        f"print(' '.join(m for m in {REPL_ONLY_MODULES!r} if m in sys.modules))\n"
+    )
+    output = subprocess.check_output([sys.executable, "-c", script], text=True)
+    cost, loaded = output.split("\n")[:2]
+    assert loaded == ""
+    assert float(cost) < ENTRY_IMPORT_BUDGET
@@ -0,0 +1,69 @@
+import random
+
+import pytest
+
+from dice.client import Client
+from dice.latency import DIST_RANGES, LatencyHistogram, LatencyMonitor
+
+
+@pytest.fixture
+def monitor(config, stand_in_redis):
+    config.no_info = True
+    config.raw = True
+    client = Client(stand_in_redis.host, stand_in_redis.port)
+    return LatencyMonitor(client, sample_interval=0)
+
+
+def test_latency_histogram_percentiles():
+    histogram = LatencyHistogram()
+    values = list(range(1, 100001))
+    random.shuffle(values)
+    for value in values:
+        histogram.record(value)
+
+    assert (histogram.min, histogram.max, histogram.count) == (1, 100000, 100000)
+    assert histogram.avg == 50000.5
+    for percentile in [50, 90, 99, 99.9]:
+        expected = percentile * 1000
+        # bucket precision is 1/128
+        assert expected <= histogram.percentile(percentile) <= expected * 1.01
+    assert histogram.percentile(100) == 100000
+    # small values are exact
+    assert len(histogram.buckets) < 1000
+
+
+def test_latency_histogram_report(config):
+    config.raw = True
+    histogram = LatencyHistogram()
+    for value in [100, 200, 300, 4000]:
+        histogram.record(value)
+    assert histogram.summary() == (
+        "min: 0.10, max: 4.00, avg: 1.15, p50: 0.20, p99: 4.00, p99.9: 4.00"
+        " (4 samples)"
+    )
+    report = histogram.report().decode().splitlines()
+    assert report[-1].split() == ["100", "4.00", "4"]
+
+
+def test_latency_history(monitor, stand_in_redis):
+    history = monitor.latency_history(interval=0.05)
+    line = next(history)
+    assert line.endswith("-- 0.05 seconds range")
+    assert stand_in_redis.commands.count(["PING"]) >= monitor.histogram.count > 0
+
+
+def test_latency_dist(monitor):
+    dist = monitor.latency_dist(interval=0.05)
+    assert b"<0.1 <0.2" in next(dist)
+    row = next(dist).decode()
+    cells = row[row.index("|") + 1 : row.rindex("|")]
+    assert len(cells) == 2 * len(DIST_RANGES)
+    # a local PING is far below 1 second
+    assert cells.strip() and cells[-2:] == "  "
+
+
+def test_latency_dist_row_shades(monitor):
+    row = monitor.dist_row([0, 1, 9, 90] + [0] * (len(DIST_RANGES) - 4), 100)
+    cells = row.decode().split("|")[1]
+    # 0%, 1%, 9%, 90%
+    assert cells.startswith("  ..::@@  ")
@@ -0,0 +1,33 @@
+from unittest.mock import patch
+
+from prompt_toolkit.document import Document
+
+from dice.lexer import diceLexer
+
+
+def test_grammar_lexer_is_cached_for_command():
+    lexer = diceLexer()
+    with patch("dice.lexer.get_lexer_mapping") as mock_get_lexer_mapping:
+        lexer.lex_document(Document("XADD stream * foo bar"))
+        xadd_lexer = lexer._current_lexer
+        lexer.lex_document(Document("XADD stream * foo bar hello world"))
+        assert lexer._current_lexer is xadd_lexer
+        mock_get_lexer_mapping.assert_not_called()
+
+    lexer.lex_document(Document("NOTACOMMAND foo"))
+    assert lexer._current_lexer is lexer._dummy
+
+
+def test_lex_document_with_cached_lexer():
+    lexer = diceLexer()
+    lexer.lex_document(Document("SET foo bar"))
+    fragments = lexer.lex_document(Document("SET hello world"))(0)
+    texts = {}
+    for style, text in fragments:
+        texts[style] = texts.get(style, "") + text
+    assert texts == {
+        "class:command": "SET",
+        "": "  ",
+        "class:key": "hello",
+        "class:string": "world",
+    }
@@ -0,0 +1,100 @@
+import os
+from unittest.mock import patch
+
+import pytest
+
+from dice.redis_grammar import (
+    GRAMMAR_CACHE_MARK,
+    CachedGrammar,
+    get_command_grammar,
+    get_command_variables,
+    grammar_cache_dir,
+)
+
+
+@pytest.fixture
+def grammar_cache(tmp_path, config):
+    config.grammar_cache_location = str(tmp_path)
+    get_command_grammar.cache_clear()
+    grammar_cache_dir.cache_clear()
+    yield tmp_path
+    get_command_grammar.cache_clear()
+    grammar_cache_dir.cache_clear()
+
+
+def cache_files():
+    return [name for name in os.listdir(grammar_cache_dir()) if name != GRAMMAR_CACHE_MARK]
+
+
+def match_variables(grammar, text):
+    return sorted((v.varname, v.value) for v in grammar.match(text).variables())
+
+
+def test_grammar_loaded_from_cache(grammar_cache):
+    compiled = get_command_grammar("ZADD")
+    assert not isinstance(compiled, CachedGrammar)
+    assert len(cache_files()) == 1
+
+    get_command_grammar.cache_clear()
+    with patch("dice.redis_grammar.compile") as mock_compile:
+        cached = get_command_grammar("ZADD")
+        mock_compile.assert_not_called()
+    assert isinstance(cached, CachedGrammar)
+
+    command = "ZADD myzset NX CH 1 one 2 two"
+    assert match_variables(cached, command) == match_variables(compiled, command)
+    prefix = "ZADD myzset N"
+    assert [(v.varname, v.value) for v in cached.match_prefix(prefix).variables()] == [
+        (v.varname, v.value) for v in compiled.match_prefix(prefix).variables()
+    ]
+    invalid = "ZADD myzset 1 one !"
+    assert cached.match_prefix(invalid).trailing_input().value == "!"
+    assert compiled.match_prefix(invalid).trailing_input().value == "!"
+
+
+def test_grammar_cache_of_other_version_removed(grammar_cache):
+    old_cache = grammar_cache / "grammar-0.0.1-000000000000"
+    old_cache.mkdir()
+    (old_cache / GRAMMAR_CACHE_MARK).touch()
+    (old_cache / ("0" * 40)).write_text("{}")
+    get_command_grammar("GET")
+    assert os.listdir(grammar_cache) == [os.path.basename(grammar_cache_dir())]
+
+
+def test_grammar_cache_keep_directories_not_created_by_dice(grammar_cache):
+    unmarked = grammar_cache / "grammar-0.0.1-000000000000"
+    unmarked.mkdir()
+    marked = grammar_cache / "grammar-0.0.2-000000000000"
+    marked.mkdir()
+    (marked / GRAMMAR_CACHE_MARK).touch()
+    (marked / "notes.txt").write_text("mine")
+    get_command_grammar("GET")
+    assert sorted(os.listdir(grammar_cache)) == sorted(
+        [unmarked.name, marked.name, os.path.basename(grammar_cache_dir())]
+    )
+    assert os.listdir(marked) == ["notes.txt"]
+
+
+def test_broken_grammar_cache_ignored(grammar_cache):
+    get_command_grammar("GET")
+    (cache_file,) = cache_files()
+    with open(os.path.join(grammar_cache_dir(), cache_file), "w") as f:
+        f.write("{broken")
+
+    get_command_grammar.cache_clear()
+    grammar = get_command_grammar("GET")
+    assert not isinstance(grammar, CachedGrammar)
+    assert match_variables(grammar, "GET foo") == [("command", "GET"), ("key", "foo")]
+
+
+def test_grammar_cache_disabled(config):
+    config.grammar_cache_location = ""
+    grammar_cache_dir.cache_clear()
+    assert grammar_cache_dir() is None
+
+
+def test_command_variables_from_grammar_definitions():
+    assert {"command", "key", "member", "score"} <= get_command_variables("ZADD")
+    assert "member" not in get_command_variables("GET")
+    # commands without syntax use the grammar of command names
+    assert get_command_variables(None) == {"command"}
@@ -1,5 +1,6 @@
 import os
 import time
+from itertools import chain
 from prompt_toolkit.formatted_text import FormattedText
 from dice import renders
 from dice.config import config
@@ -61,12 +62,53 @@ def test_render_list_index_const_width():
     assert "\n10)" in out
 
 
+def test_render_long_list_streamed(monkeypatch):
+    raw = [f"item-{index}".encode() for index in range(25)]
+    raw[3] = None
+    raw[7] = [b"nested", b"list"]
+    expected = strip_formatted_text(renders.OutputRender.render_list(raw))
+    monkeypatch.setattr(renders, "STREAM_THRESHOLD", 20)
+    monkeypatch.setattr(renders, "STREAM_CHUNK_SIZE", 10)
+
+    out = renders.OutputRender.render_list(raw)
+
+    assert isinstance(out, renders.StreamedText)
+    assert out.height == 26
+    chunks = [strip_formatted_text(chunk) for chunk in out]
+    assert len(chunks) == 3
+    assert "".join(chunks) == expected
+    assert expected.count("\n") + 1 == 26
+    assert chunks[0].startswith(' 1) "item-0"\n')
+    assert chunks[2].startswith('21) "item-20"')
+
+
+def test_render_scan_of_long_list_streamed(monkeypatch):
+    monkeypatch.setattr(renders, "STREAM_THRESHOLD", 5)
+    out = renders.OutputRender.command_scan([b"0", [b"foo"] * 6])
+    assert out.height == 7
+    assert strip_formatted_text(list(chain.from_iterable(out))).startswith(
+        '(cursor) 0\n1) "foo"\n2) "foo"'
+    )
+
+
 def test_render_list_using_raw_render():
     raw = ["hello", "world", "foo"]
     out = renders.OutputRender.render_raw([item.encode() for item in raw])
     assert b"hello\nworld\nfoo" == out
 
 
+def test_render_long_list_raw_in_blocks(monkeypatch):
+    monkeypatch.setattr(renders, "STREAM_THRESHOLD", 5)
+    monkeypatch.setattr(renders, "RAW_BLOCK_ITEMS", 3)
+    raw = [b"a", None, 1, "b", [b"c", b"d"], b"e", b"f"]
+
+    out = renders.OutputRender.render_raw(raw)
+
+    assert isinstance(out, renders.RawStream)
+    assert list(out) == [b"a\n\n1", b"\n", b"b\nc\nd\ne", b"\n", b"f"]
+    assert b"".join(out) == renders._render_raw_list(raw)
+
+
 def test_render_list_with_nil_init():
     raw = [b"hello", None, b"world"]
     out = renders.OutputRender.render_list(raw)
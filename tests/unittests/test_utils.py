@@ -1,27 +1,32 @@
 import re
+import json
 import time
 import pytest
+from importlib.resources import read_text
 from unittest.mock import patch
 
+from dice import utils
 from dice.utils import timer, strip_quote_args
-from dice.commands import split_command_args, split_unknown_args
+from dice.commands import split_command_args, split_unknown_args, first_key
 from dice.utils import command_syntax
 from dice.style import STYLE
 from dice.exceptions import InvalidArguments, AmbiguousCommand
-from dice.commands import commands_summary
+from dice import data as project_data
+from dice.commands import commands_summary, CommandSummary
 from prompt_toolkit import print_formatted_text
 
 
 def test_timer():
+    start_counter = utils._timer_counter
     with patch("dice.utils.logger") as mock_logger:
         timer("foo")
         time.sleep(0.1)
         timer("bar")
         mock_logger.debug.assert_called()
         args, kwargs = mock_logger.debug.call_args
-        matched = re.match(r"\[timer (\d)\] (0\.\d+) -> bar", args[0])
+        matched = re.match(r"\[timer\s*(\d+)\] (0\.\d+) -> bar", args[0])
 
-        assert matched.group(1) == str(3)
+        assert matched.group(1) == str(start_counter + 1)
         assert 0.1 <= float(matched.group(2)) <= 0.2
 
         # --- test again ---
@@ -30,9 +35,9 @@ def test_timer():
         timer("bar")
         mock_logger.debug.assert_called()
         args, kwargs = mock_logger.debug.call_args
-        matched = re.match(r"\[timer (\d)\] (0\.\d+) -> bar", args[0])
+        matched = re.match(r"\[timer\s*(\d+)\] (0\.\d+) -> bar", args[0])
 
-        assert matched.group(1) == str(5)
+        assert matched.group(1) == str(start_counter + 3)
         assert 0.2 <= float(matched.group(2)) <= 0.3
 
 
@@ -67,6 +72,8 @@ def test_stripe_quote_escape_in_quote(test_input, expected):
     [
         ("GET a", "GET", ["a"]),
         ("cluster info", "cluster info", []),
+        ("command info get", "command info", ["get"]),
+        ("command foo", "command", ["foo"]),
         ("getbit foo 17", "getbit", ["foo", "17"]),
         ("command ", "command", []),
         (" command count  ", "command count", []),
@@ -100,6 +107,72 @@ def test_split_commands_fail_on_unfinished_command():
         split_command_args("setn")
 
 
+@pytest.mark.parametrize("command", ["", " ", "QXWATCH foo", "get\tfoo"])
+def test_split_commands_fail_on_invalid_command(command):
+    with pytest.raises(InvalidArguments):
+        split_command_args(command)
+
+
+@pytest.mark.parametrize(
+    "command,expected,args",
+    [
+        ("q.watch foo", "q.watch", ["foo"]),
+        ("client   list  id 1", "client   list", ["id", "1"]),
+        ("cluster info", "cluster info", []),
+    ],
+)
+def test_split_commands_match_longest_command(command, expected, args):
+    assert split_command_args(command) == (expected, args)
+
+
+@pytest.mark.parametrize(
+    "command,args,key",
+    [
+        ("get", ["foo"], "foo"),
+        ("XINFO STREAM", ["s", "FULL"], "s"),
+        ("eval", ["script", "2", "a", "b"], "a"),
+        ("eval", ["script", "0"], None),
+        ("xread", ["STREAMS", "s", "0"], None),
+        ("info", [], None),
+        ("get", [], None),
+    ],
+)
+def test_first_key(command, args, key):
+    assert first_key(command, args) == key
+
+
+def test_commands_index_is_up_to_date():
+    all_summary = json.loads(read_text(project_data, "commands.json"))
+    lazy_summary = CommandSummary()
+    assert list(lazy_summary) == list(all_summary)
+    for command, summary in all_summary.items():
+        assert lazy_summary[command] == summary
+
+
+def test_command_summary_only_decode_accessed_commands():
+    summary = CommandSummary()
+    summary["HELP"] = {"summary": "Show documents for a Redis command."}
+    assert summary["GET"]["summary"] == "Get the value of a key"
+    assert "SET" in summary
+    assert list(summary._summaries) == ["HELP", "GET"]
+    assert len(summary) == len(summary.offsets) + 1
+    with pytest.raises(KeyError):
+        summary["NOT-A-COMMAND"]
+
+
+def test_command_summary_load_all_when_index_outdated():
+    summary = CommandSummary()
+    summary["HELP"] = {"summary": "Show documents for a Redis command."}
+    with patch("dice.commands.read_text") as mock_read_text:
+        mock_read_text.side_effect = [
+            '{"size": 1, "offsets": {"GET": [0, 1]}}',
+            '{"GET": {"summary": "Get the value of a key"}}',
+        ]
+        assert summary["GET"] == {"summary": "Get the value of a key"}
+    assert summary.offsets == {}
+    assert list(summary) == ["GET", "HELP"]
+
+
 def test_render_bottom_with_command_json():
     for command, info in commands_summary.items():
         print_formatted_text(command_syntax(command, info), style=STYLE)